@@ -1,39 +1,82 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+import json
 import traceback
 from langchain_core.messages import HumanMessage
 from typing import List, Optional
-from app.core.agent import run_agent, safe_convert_to_string
-from app.tools.qdrant_retrieval import retrieve, retrieve_with_filters, enhanced_retrieval, extract_filters_from_query
-from app.core.memory import get_conversation_history, clear_conversation_history
-from app.core.agent import run_agent
+from app.core.agent import run_agent_async, run_agent_batch, run_agent_stream, safe_convert_to_string
+from app.tools.qdrant_retrieval import (
+    retrieve, aenhanced_retrieval, extract_filters_from_query, format_enhanced_results, format_filtered_results,
+    tool_args_to_filters,
+)
+from app.core.memory import get_conversation_history, get_conversation_summary, clear_conversation_history
+from app.services.registry import registry
+from app.services.cache import retrieval_cache
+from app.services.context_packing import context_packing_stats
+from app.services.answer_cache import answer_cache
+from app.services.filter_extraction import YEAR_PATTERN, filter_extractor
+from app.services.latency import stage_timings
+from app.services.relaxation import relaxation_stats
+from app.services.qdrant_store import build_search_params, request_search_params
+from app.services.speculation import speculative_retrieval
+from app.services.single_flight import generation_flight, retrieval_flight
+from config.settings import BATCH_MAX_CONCURRENCY
 
 router = APIRouter()
 
 class ChatRequest(BaseModel):
     message: str
     thread_id: str = "default"
+    bypass_cache: bool = False  # Always run the agent instead of reusing a cached answer
+    latency_budget_ms: Optional[float] = None  # Defaults to REQUEST_LATENCY_BUDGET_MS
+    hnsw_ef: Optional[int] = None  # Retrieval search precision for this request; defaults to QDRANT_SEARCH_HNSW_EF
+    exact: Optional[bool] = None  # Full scan instead of the HNSW graph
+
+    def search_params(self):
+        """Search params overriding the defaults, or None to keep them."""
+        if self.hnsw_ef is None and self.exact is None:
+            return None
+        return build_search_params(hnsw_ef=self.hnsw_ef, exact=self.exact)
 
 class ChatResponse(BaseModel):
     response: str
 
+class BatchChatRequest(BaseModel):
+    items: List[ChatRequest]
+    max_concurrency: Optional[int] = None
+
 class RetrievalRequest(BaseModel):
     query: str
     department: Optional[str] = None
     doc_type: Optional[str] = None
     year: Optional[int] = None
+    hnsw_ef: Optional[int] = None  # Per-query search precision; defaults to QDRANT_SEARCH_HNSW_EF
+    exact: Optional[bool] = None  # Full scan instead of the HNSW graph
+
+    def search_params(self):
+        """Search params overriding the defaults, or None to keep them."""
+        if self.hnsw_ef is None and self.exact is None:
+            return None
+        return build_search_params(hnsw_ef=self.hnsw_ef, exact=self.exact)
 
 class FilteredRetrievalRequest(BaseModel):
     query: str
     department: Optional[str] = None
     doc_type: Optional[str] = None
+    security_level: Optional[str] = None
+    project: Optional[str] = None
     year: Optional[int] = None
+    year_from: Optional[int] = None  # Inclusive year range
+    year_to: Optional[int] = None
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     try:
         human_message = HumanMessage(content=request.message)
-        ai_message = run_agent(human_message, thread_id=request.thread_id)
+        ai_message = await run_agent_async(human_message, thread_id=request.thread_id, bypass_cache=request.bypass_cache,
+                                           latency_budget_ms=request.latency_budget_ms,
+                                           search_params=request.search_params())
 
         if ai_message is None:
             raise HTTPException(status_code=500, detail="No response from agent")
@@ -56,12 +99,56 @@ async def chat_endpoint(request: ChatRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
     
+def format_sse(event: dict) -> str:
+    """Serialize an agent stream event as a Server-Sent-Events frame."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """Stream the agent answer token by token as Server-Sent Events."""
+    human_message = HumanMessage(content=request.message)
+
+    async def event_source():
+        async for event in run_agent_stream(human_message, thread_id=request.thread_id, bypass_cache=request.bypass_cache,
+                                          latency_budget_ms=request.latency_budget_ms,
+                                          search_params=request.search_params()):
+            yield format_sse(event)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering so tokens flush immediately
+        }
+    )
+
+@router.post("/chat/batch")
+async def chat_batch_endpoint(request: BatchChatRequest):
+    """Run many chat requests concurrently and stream results back as NDJSON."""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one item")
+
+    # Callers may lower the concurrency limit but not exceed the configured one
+    max_concurrency = min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    items = [
+        (HumanMessage(content=item.message), item.thread_id, item.bypass_cache, item.latency_budget_ms, item.search_params())
+        for item in request.items
+    ]
+
+    async def ndjson_lines():
+        async for result in run_agent_batch(items, max_concurrency=max_concurrency):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
 @router.post("/retrieval")
 async def test_retrieval(request: RetrievalRequest):
     """Test if Qdrant retrieval is working properly."""
     try:
-        # Use the retrieve tool from your qdrant_retrieval.py
-        results = retrieve.invoke(request.query)
+        # Use the retrieve tool from your qdrant_retrieval.py, with the same per-request search params as /chat
+        with request_search_params(request.search_params()):
+            results = await retrieve.ainvoke(request.query)
         
         return {
             "success": True,
@@ -81,21 +168,17 @@ async def test_retrieval(request: RetrievalRequest):
 async def test_filtered_retrieval(request: FilteredRetrievalRequest):
     """Test Qdrant retrieval with metadata filtering."""
     try:
-        # Use the retrieve_with_filters tool
-        results = retrieve_with_filters.invoke({
-            "query": request.query,
-            "department": request.department,
-            "doc_type": request.doc_type
-        })
+        # Same filters and search as the retrieve_with_filters tool, keeping the relaxation apart from the text
+        filters = tool_args_to_filters(**request.model_dump(exclude={"query"}))
+        retrieved = await aenhanced_retrieval(request.query, filters=filters, k=3)
+        documents = retrieved["documents"]
         
         return {
             "success": True,
             "query": request.query,
-            "filters": {
-                "department": request.department,
-                "doc_type": request.doc_type
-            },
-            "results": results,
+            "filters": request.model_dump(exclude={"query"}, exclude_none=True),
+            "results": format_filtered_results(documents) if documents else "No relevant information found with the specified filters.",
+            "relaxation": retrieved["relaxation"],
             "retrieval_type": "qdrant_filtered"
         }
     except Exception as e:
@@ -103,10 +186,7 @@ async def test_filtered_retrieval(request: FilteredRetrievalRequest):
             "success": False,
             "error": str(e),
             "query": request.query,
-            "filters": {
-                "department": request.department,
-                "doc_type": request.doc_type
-            },
+            "filters": request.model_dump(exclude={"query"}, exclude_none=True),
             "retrieval_type": "qdrant_filtered"
         }
 
@@ -118,14 +198,17 @@ async def test_enhanced_retrieval(request: RetrievalRequest):
         filters = extract_filters_from_query(request.query)
         
         # Use enhanced retrieval
-        results = enhanced_retrieval(request.query, filters=filters, k=5, return_formatted=True)
+        search_params = build_search_params(request.hnsw_ef, request.exact)
+        retrieved = await aenhanced_retrieval(request.query, filters=filters, k=5, search_params=search_params)
+        documents = retrieved["documents"]
         
         return {
             "success": True,
             "query": request.query,
             "extracted_filters": filters,
-            "results_count": len(results),
-            "results": results,
+            "results_count": len(documents),
+            "results": format_enhanced_results(documents) if documents else "No relevant information found.",
+            "relaxation": retrieved["relaxation"],
             "retrieval_type": "qdrant_enhanced"
         }
     except Exception as e:
@@ -141,69 +224,25 @@ async def analyze_query_filters(query: str):
     """Analyze a query and extract potential filters with detailed analysis."""
     try:
         filters = extract_filters_from_query(query)
+        details = filter_extractor.analyze(query)
         
         # Detailed analysis of why filters were/were not found
         analysis = {
             "query_analyzed": query,
             "query_lowercase": query.lower(),
-            "words_in_query": query.lower().split(),
-            "filter_matches": {}
-        }
-        
-        # Check for department matches
-        departments = ["ai research", "ml engineering", "data science", "product", "engineering", "r&d", "analytics", "platform"]
-        analysis["filter_matches"]["departments"] = []
-        for dept in departments:
-            if dept in query.lower():
-                analysis["filter_matches"]["departments"].append({
-                    "department": dept,
-                    "found": True,
-                    "match_type": "exact"
-                })
-            elif any(word in query.lower().split() for word in dept.split()):
-                analysis["filter_matches"]["departments"].append({
-                    "department": dept,
-                    "found": True,
-                    "match_type": "partial"
-                })
-            else:
-                analysis["filter_matches"]["departments"].append({
-                    "department": dept,
-                    "found": False,
-                    "match_type": "none"
-                })
-        
-        # Check for document type matches
-        doc_types = ["research paper", "technical guide", "api documentation", "best practices", 
-                    "implementation guide", "technical report", "system design", "tutorial"]
-        analysis["filter_matches"]["document_types"] = []
-        for doc_type in doc_types:
-            if doc_type in query.lower():
-                analysis["filter_matches"]["document_types"].append({
-                    "doc_type": doc_type,
-                    "found": True,
-                    "match_type": "exact"
-                })
-            elif any(word in query.lower().split() for word in doc_type.split()):
-                analysis["filter_matches"]["document_types"].append({
-                    "doc_type": doc_type,
-                    "found": True,
-                    "match_type": "partial"
-                })
-            else:
-                analysis["filter_matches"]["document_types"].append({
-                    "doc_type": doc_type,
-                    "found": False,
-                    "match_type": "none"
-                })
-        
-        # Check for year matches
-        import re
-        year_pattern = r'\b(20[1-2][0-9])\b'
-        year_matches = re.findall(year_pattern, query)
-        analysis["filter_matches"]["years"] = {
-            "found_years": year_matches,
-            "pattern_used": year_pattern
+            "words_in_query": details["tokens"],
+            "filter_matches": {
+                "departments": [
+                    {"department": match.pop("phrase"), **match} for match in details["fields"]["department"]
+                ],
+                "document_types": [
+                    {"doc_type": match.pop("phrase"), **match} for match in details["fields"]["doc_type"]
+                ],
+                "security_levels": [
+                    {"security_level": match.pop("phrase"), **match} for match in details["fields"]["security_level"]
+                ],
+                "years": {**details["years"], "pattern_used": YEAR_PATTERN.pattern},
+            }
         }
         
         return {
@@ -212,15 +251,17 @@ async def analyze_query_filters(query: str):
             "extracted_filters": filters,
             "analysis": analysis,
             "suggested_filters": {
-                "available_departments": ["AI Research", "ML Engineering", "Data Science", "Product", "Engineering", "R&D", "Analytics", "Platform"],
-                "available_doc_types": ["Research Paper", "Technical Guide", "API Documentation", "Best Practices", "Implementation Guide", "Technical Report", "System Design", "Tutorial"],
+                "available_departments": filter_extractor.values("department"),
+                "available_doc_types": filter_extractor.values("doc_type"),
+                "available_security_levels": filter_extractor.values("security_level"),
                 "available_years": list(range(2018, 2025)),
                 "example_queries_with_filters": [
                     "AI research papers from 2023",
                     "ML engineering technical guides",
                     "Data science best practices 2024",
                     "System design documentation",
-                    "R&D technical reports from 2022"
+                    "R&D technical reports from 2022",
+                    "Confidential platform system design since 2021"
                 ]
             }
         }
@@ -231,11 +272,30 @@ async def analyze_query_filters(query: str):
             "query": query
         }
     
+@router.get("/metrics")
+async def get_metrics():
+    """Runtime performance counters of the retrieval and generation stack."""
+    embeddings = registry.peek("embeddings")
+    reranker = registry.peek("reranker")
+    return {
+        "embeddings": embeddings.stats() if hasattr(embeddings, "stats") else None,
+        "retrieval_cache": retrieval_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "reranker": reranker.stats() if reranker is not None else None,
+        "filter_relaxation": relaxation_stats.stats(),
+        "speculation": speculative_retrieval.stats(),
+        "context_packing": context_packing_stats.stats(),
+        "coalescing": {"retrieval": retrieval_flight.stats(), "generation": generation_flight.stats()},
+        "stages": stage_timings.stats()
+    }
+
 @router.get("/conversation/{thread_id}", response_model=List[dict])
 async def get_conversation(thread_id: str):
     """Get conversation history for a thread."""
     messages = get_conversation_history(thread_id)
-    return [{"type": msg.type, "content": msg.content} for msg in messages]
+    summary = get_conversation_summary(thread_id)
+    history = [{"type": "summary", "content": summary}] if summary else []
+    return history + [{"type": msg.type, "content": msg.content} for msg in messages]
 
 @router.delete("/conversation/{thread_id}")
 async def clear_conversation(thread_id: str):
@@ -1,11 +1,27 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
+from fastapi.responses import JSONResponse
 from app.api.endpoints import router as api_router
+from app.services.registry import registry
+from config.settings import WARMUP_ON_STARTUP
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-app = FastAPI(title="Chatbot API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so /health answers immediately and /ready flips when done
+    warmup_task = asyncio.create_task(asyncio.to_thread(registry.warm_up)) if WARMUP_ON_STARTUP else None
+    yield
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    async_store = registry.peek("async_vector_store")
+    if async_store and hasattr(async_store, "client"):
+        await async_store.client.close()
+
+app = FastAPI(title="Chatbot API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -34,5 +50,11 @@ async def root(request: Request):
 async def health():
     return {"status": "ok", "message": "API is running!"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once every service is warmed up, 503 before that."""
+    status = registry.status()
+    return JSONResponse(status_code=200 if status["state"] == "ready" else 503, content=status)
+
 # Serve static files (CSS, JS, images, icons)
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -1,17 +1,36 @@
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
 from app.core.graph import build_graph
-from typing import AsyncIterator, Dict, Any
+from app.core.checkpointer import get_checkpointer
+from app.services.answer_cache import answer_cache
+from app.services.batch import shared_batch_calls
+from app.services.latency import request_budget
+from app.services.qdrant_store import request_search_params
+from app.services.registry import registry
+from app.tools.qdrant_retrieval import extract_filters_from_query
+from config.settings import BATCH_MAX_CONCURRENCY, REQUEST_LATENCY_BUDGET_MS
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+import asyncio
 import logging
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
-# Initialize memory
-memory = MemorySaver()
+def create_graph():
+    """Build and compile the Qdrant-powered graph with the shared checkpointer."""
+    return build_graph().compile(checkpointer=get_memory())
 
-# Build and compile the Qdrant-powered graph
-graph_builder = build_graph()
-graph = graph_builder.compile(checkpointer=memory)
+# Initialize memory (in-process or shared, see CHECKPOINTER_BACKEND)
+registry.register("checkpointer", get_checkpointer)
+registry.register("graph", create_graph)
+
+def get_memory():
+    """Shared conversation checkpointer."""
+    return registry.get("checkpointer")
+
+def get_graph():
+    """Shared compiled agent graph."""
+    return registry.get("graph")
 
 def safe_convert_to_string(content):
     """Safely convert any content to a string."""
@@ -48,13 +67,114 @@ def safe_convert_to_string(content):
         logger.error(f"Error converting to string: {e}")
         return "Unable to process response"
 
+def answered_from_knowledge_base(messages) -> bool:
+    """Whether the latest turn (after the last human message) used a retrieval tool."""
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage):
+            return False
+        if isinstance(msg, ToolMessage):
+            return True
+    return False
+
+def _first_turn(values) -> bool:
+    return not values.get("summary") and not any(isinstance(msg, HumanMessage) for msg in values.get("messages", []))
+
+def is_first_turn(thread_id) -> bool:
+    """Whether the thread has no earlier turns.
+
+    Only such questions go through the answer cache: a follow-up ("tell me
+    more") means something different in every conversation.
+    """
+    if not answer_cache.enabled:
+        return False
+    try:
+        return _first_turn(get_graph().get_state({"configurable": {"thread_id": thread_id}}).values)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read thread {thread_id}, skipping the answer cache: {e}")
+        return False
+
+async def ais_first_turn(thread_id) -> bool:
+    """Async version of is_first_turn."""
+    if not answer_cache.enabled:
+        return False
+    try:
+        return _first_turn((await get_graph().aget_state({"configurable": {"thread_id": thread_id}})).values)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read thread {thread_id}, skipping the answer cache: {e}")
+        return False
+
+def _cache_hit_message(hit) -> AIMessage:
+    return AIMessage(
+        content=hit["answer"],
+        response_metadata={"answer_cache": {"question": hit["question"], "similarity": round(hit["similarity"], 4)}},
+    )
+
+def lookup_cached_answer(message, thread_id, bypass_cache=False):
+    """Answer from the semantic answer cache and record the turn in the thread, or return None."""
+    if bypass_cache or not answer_cache.enabled:
+        return None
+    question = safe_convert_to_string(message.content)
+    try:
+        hit = answer_cache.lookup(question, extract_filters_from_query(question))
+        if hit is None:
+            return None
+        ai_message = _cache_hit_message(hit)
+        # Keep the conversation history identical to a full graph run
+        get_graph().update_state(
+            {"configurable": {"thread_id": thread_id}}, {"messages": [message, ai_message]}, as_node="done"
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Answer cache lookup failed, running the agent: {e}")
+        return None
+    logger.info(f"✅ Answer cache hit (similarity {hit['similarity']:.3f}) for: {question[:60]}")
+    return ai_message
+
+async def alookup_cached_answer(message, thread_id, bypass_cache=False):
+    """Async version of lookup_cached_answer."""
+    if bypass_cache or not answer_cache.enabled:
+        return None
+    question = safe_convert_to_string(message.content)
+    try:
+        hit = await answer_cache.alookup(question, extract_filters_from_query(question))
+        if hit is None:
+            return None
+        ai_message = _cache_hit_message(hit)
+        await get_graph().aupdate_state(
+            {"configurable": {"thread_id": thread_id}}, {"messages": [message, ai_message]}, as_node="done"
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Answer cache lookup failed, running the agent: {e}")
+        return None
+    logger.info(f"✅ Answer cache hit (similarity {hit['similarity']:.3f}) for: {question[:60]}")
+    return ai_message
+
+def store_cached_answer(message, ai_message, from_knowledge_base):
+    """Remember knowledge-base answers; small talk and failures are not cached."""
+    if not answer_cache.enabled or not from_knowledge_base:
+        return
+    question = safe_convert_to_string(message.content)
+    try:
+        answer_cache.store(question, safe_convert_to_string(ai_message.content), extract_filters_from_query(question))
+    except Exception as e:
+        logger.warning(f"⚠️ Could not store answer in the answer cache: {e}")
+
+async def astore_cached_answer(message, ai_message, from_knowledge_base):
+    """Async version of store_cached_answer."""
+    if not answer_cache.enabled or not from_knowledge_base:
+        return
+    question = safe_convert_to_string(message.content)
+    try:
+        await answer_cache.astore(question, safe_convert_to_string(ai_message.content), extract_filters_from_query(question))
+    except Exception as e:
+        logger.warning(f"⚠️ Could not store answer in the answer cache: {e}")
+
 def run_agent_debug(message, thread_id="qdrant_thread"):
     """Debug function to run agent and inspect Qdrant retrieval."""
     config = {"configurable": {"thread_id": thread_id}}
     
     # Collect all messages from the stream
     all_messages = []
-    for step in graph.stream(
+    for step in get_graph().stream(
         {"messages": [message]},
         stream_mode="values",
         config=config,
@@ -108,68 +228,246 @@ def run_agent_debug(message, thread_id="qdrant_thread"):
     
     return None
 
-def run_agent(message, thread_id="qdrant_thread"):
-    """Run the Qdrant-powered agent with a message and return the AI response."""
+def run_agent(message, thread_id="qdrant_thread", bypass_cache=False, latency_budget_ms=None, search_params=None):
+    """Run the Qdrant-powered agent with a message and return the AI response.
+
+    Optional stages (reranking) adapt to latency_budget_ms (REQUEST_LATENCY_BUDGET_MS by default).
+    search_params (see build_search_params) override hnsw_ef/exact for the retrieval tools.
+    """
     config = {"configurable": {"thread_id": thread_id}}
     
-    try:
-        # Collect all messages from the stream
-        all_messages = []
-        for step in graph.stream(
-            {"messages": [message]},
-            stream_mode="values",
-            config=config,
-        ):  
-            if step.get("messages"):
-                all_messages.extend(step["messages"])
+    with request_budget(latency_budget_ms or REQUEST_LATENCY_BUDGET_MS) as budget, request_search_params(search_params):
+        try:
+            first_turn = is_first_turn(thread_id)
+            cached = lookup_cached_answer(message, thread_id, bypass_cache or not first_turn)
+            if cached is not None:
+                return cached
+
+            # Collect all messages from the stream
+            all_messages = []
+            for step in get_graph().stream(
+                {"messages": [message]},
+                stream_mode="values",
+                config=config,
+            ):  
+                if step.get("messages"):
+                    all_messages.extend(step["messages"])
         
-        # Find the last AI message in the response
-        for msg in reversed(all_messages):
-            if isinstance(msg, AIMessage):
-                logger.info(f"✅ Qdrant agent response generated successfully")
-                return msg
+            # Find the last AI message in the response
+            for msg in reversed(all_messages):
+                if isinstance(msg, AIMessage):
+                    logger.info(f"✅ Qdrant agent response generated successfully | stages (ms): {budget.timings} | tokens: {budget.tokens}")
+                    store_cached_answer(message, msg, first_turn and answered_from_knowledge_base(all_messages))
+                    return msg
         
-        logger.warning("❌ No AI message found in response")
-        return AIMessage(content="I apologize, but I couldn't generate a response. Please try again.")
+            logger.warning("❌ No AI message found in response")
+            return AIMessage(content="I apologize, but I couldn't generate a response. Please try again.")
     
-    except Exception as e:
-        logger.error(f"❌ Error in Qdrant agent invocation: {e}")
-        return AIMessage(content="Sorry, I encountered an error while processing your request with our knowledge base.")
+        except Exception as e:
+            logger.error(f"❌ Error in Qdrant agent invocation: {e}")
+            return AIMessage(content="Sorry, I encountered an error while processing your request with our knowledge base.")
 
-async def run_agent_stream(message: HumanMessage, thread_id: str = "qdrant_thread") -> AsyncIterator[Dict[str, Any]]:
-    """Streaming version of the Qdrant-powered agent."""
+async def run_agent_async(message, thread_id="qdrant_thread", bypass_cache=False, latency_budget_ms=None,
+                          search_params=None):
+    """Async version of run_agent: drives graph.ainvoke so the event loop stays free."""
     config = {"configurable": {"thread_id": thread_id}}
-    
-    sent_hashes = set()
-    last_content = ""
+
+    with request_budget(latency_budget_ms or REQUEST_LATENCY_BUDGET_MS) as budget, request_search_params(search_params):
+        try:
+            first_turn = await ais_first_turn(thread_id)
+            cached = await alookup_cached_answer(message, thread_id, bypass_cache or not first_turn)
+            if cached is not None:
+                return cached
+
+            result = await get_graph().ainvoke({"messages": [message]}, config=config)
+
+            # Find the last AI message in the final state
+            for msg in reversed(result.get("messages", [])):
+                if isinstance(msg, AIMessage):
+                    logger.info(f"✅ Qdrant agent response generated successfully | stages (ms): {budget.timings} | tokens: {budget.tokens}")
+                    await astore_cached_answer(message, msg, first_turn and answered_from_knowledge_base(result["messages"]))
+                    return msg
+
+            logger.warning("❌ No AI message found in response")
+            return AIMessage(content="I apologize, but I couldn't generate a response. Please try again.")
+
+        except Exception as e:
+            logger.error(f"❌ Error in Qdrant agent invocation: {e}")
+            return AIMessage(content="Sorry, I encountered an error while processing your request with our knowledge base.")
+
+async def run_agent_batch(items: List[Tuple[HumanMessage, str, bool, Optional[float], Any]],
+                          max_concurrency: int = BATCH_MAX_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+    """Run (message, thread_id, bypass_cache, latency_budget_ms, search_params) items through the graph concurrently.
+
+    Results are yielded as soon as each item completes. Items that share a
+    thread_id run in submission order so their conversation stays consistent;
+    items on the "default" thread each get an isolated thread. Identical
+    retrieval calls across the batch are shared.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    results: asyncio.Queue = asyncio.Queue()
+    batch_id = uuid.uuid4().hex[:8]
+
+    # Group items per conversation thread
+    threads: Dict[str, list] = {}
+    for index, (message, thread_id, bypass_cache, latency_budget_ms, search_params) in enumerate(items):
+        if thread_id == "default":
+            thread_id = f"batch_{batch_id}_{index}"
+        threads.setdefault(thread_id, []).append((index, message, bypass_cache, latency_budget_ms, search_params))
+
+    async def run_thread(thread_id, thread_items):
+        for index, message, bypass_cache, latency_budget_ms, search_params in thread_items:
+            async with semaphore:
+                start_time = time.perf_counter()
+                try:
+                    ai_message = await run_agent_async(message, thread_id=thread_id, bypass_cache=bypass_cache,
+                                                     latency_budget_ms=latency_budget_ms, search_params=search_params)
+                    result = {"index": index, "thread_id": thread_id, "response": safe_convert_to_string(ai_message.content)}
+                except Exception as e:
+                    logger.error(f"❌ Batch item {index} failed: {e}")
+                    result = {"index": index, "thread_id": thread_id, "error": str(e)}
+                result["elapsed_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+            await results.put(result)
+
+    with shared_batch_calls():
+        tasks = [asyncio.create_task(run_thread(tid, group)) for tid, group in threads.items()]
 
     try:
-        yield {"type": "status", "status": "thinking"}
-
-        async for event in graph.astream(
-            {"messages": [message]},
-            config=config,
-            stream_mode="values"
-        ):
-            if "messages" in event:
-                for msg in event["messages"]:
-                    if isinstance(msg, AIMessage) and hasattr(msg, 'content'):
-                        content = str(msg.content).strip()
-                        msg_hash = hash(content)
-
-                        # Skip if already sent
-                        if not content or msg_hash in sent_hashes or content == last_content:
+        for _ in range(len(items)):
+            yield await results.get()
+    finally:
+        # Client went away or the consumer stopped early
+        for task in tasks:
+            task.cancel()
+
+# Nodes whose LLM tokens are forwarded to streaming clients
+STREAMED_NODES = ("query_or_respond", "generate")
+# Nodes whose tokens are held back until their message is known not to be a tool call
+# (text a model writes before its tool call is not part of the answer)
+BUFFERED_NODES = ("query_or_respond",)
+
+async def run_agent_stream(message: HumanMessage, thread_id: str = "qdrant_thread", bypass_cache: bool = False,
+                           latency_budget_ms=None, search_params=None) -> AsyncIterator[Dict[str, Any]]:
+    """Streaming version of the Qdrant-powered agent.
+
+    Yields status, retrieval and token events as the graph runs, followed by a
+    metrics event with time-to-first-token, total latency, per-stage timings
+    and token counts (packed context, prompt). Answer cache hits are sent as a single token event.
+    Generation tokens stream as they arrive; a direct answer from the tool-calling
+    model is sent once it is known not to be a tool call.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+
+    start_time = time.perf_counter()
+    first_token_time = None
+    chunk_count = 0
+    # Tokens sent per node, and tokens held back from buffered nodes
+    node_chunks: Dict[str, int] = {}
+    buffered: List[str] = []
+    final_message = None
+    final_node = None
+    used_retrieval = False
+
+    def elapsed_ms():
+        return round((time.perf_counter() - start_time) * 1000, 1)
+
+    with request_budget(latency_budget_ms or REQUEST_LATENCY_BUDGET_MS) as budget, request_search_params(search_params):
+        try:
+            yield {"type": "status", "status": "thinking"}
+
+            first_turn = await ais_first_turn(thread_id)
+            cached = await alookup_cached_answer(message, thread_id, bypass_cache or not first_turn)
+            if cached is not None:
+                yield {"type": "status", "status": "answer_cache_hit", **cached.response_metadata["answer_cache"]}
+                first_token_time = time.perf_counter()
+                chunk_count = 1
+                yield {"type": "token", "content": cached.content}
+            else:
+                async for mode, chunk in get_graph().astream(
+                    {"messages": [message]},
+                    config=config,
+                    stream_mode=["messages", "updates"]
+                ):
+                    if mode == "messages":
+                        msg_chunk, metadata = chunk
+                        node = metadata.get("langgraph_node")
+                        if node not in STREAMED_NODES:
+                            continue
+                        if not isinstance(msg_chunk, AIMessageChunk) or msg_chunk.tool_call_chunks:
+                            continue
+
+                        content = safe_convert_to_string(msg_chunk.content) if msg_chunk.content else ""
+                        if not content:
+                            continue
+                        if node in BUFFERED_NODES:
+                            buffered.append(content)
                             continue
-                        
-                        sent_hashes.add(msg_hash)
-                        last_content = content
-                        yield {"type": "content", "content": content}
 
-                    elif msg.type == "tool":
-                        yield {"type": "status", "status": "searching_knowledge_base"}
+                        if first_token_time is None:
+                            first_token_time = time.perf_counter()
+                        chunk_count += 1
+                        node_chunks[node] = node_chunks.get(node, 0) + 1
+                        yield {"type": "token", "content": content}
 
-        yield {"type": "status", "status": "complete"}
+                    elif mode == "updates":
+                        for node, update in chunk.items():
+                            # The terminal "done" node echoes the whole state back
+                            if node == "done":
+                                continue
+                            messages = (update or {}).get("messages") or []
+                            for msg in messages:
+                                if isinstance(msg, AIMessage) and msg.tool_calls:
+                                    buffered.clear()  # A preamble to the tool call, not the answer
+                                    tool_call = msg.tool_calls[0]
+                                    yield {
+                                        "type": "status",
+                                        "status": "searching_knowledge_base",
+                                        "tool": tool_call["name"],
+                                        "args": tool_call["args"],
+                                        "elapsed_ms": elapsed_ms(),
+                                    }
+                                elif msg.type == "tool":
+                                    used_retrieval = True
+                                    yield {
+                                        "type": "retrieval",
+                                        "tool": msg.name,
+                                        "preview": safe_convert_to_string(msg.content)[:200],
+                                        "elapsed_ms": elapsed_ms(),
+                                    }
+                                elif isinstance(msg, AIMessage) and node in STREAMED_NODES:
+                                    final_message = msg
+                                    final_node = node
+                                    # A direct answer: release the tokens held back for it
+                                    for content in buffered:
+                                        if first_token_time is None:
+                                            first_token_time = time.perf_counter()
+                                        chunk_count += 1
+                                        node_chunks[node] = node_chunks.get(node, 0) + 1
+                                        yield {"type": "token", "content": content}
+                                    buffered.clear()
 
-    except Exception as e:
-        logger.error(f"❌ Error in Qdrant agent stream: {e}")
-        yield {"type": "error", "error": str(e)}
+            # The answering node did not stream (provider fallback, coalesced follower): send the whole answer at once
+            if final_message is not None and final_message.content and not node_chunks.get(final_node):
+                first_token_time = time.perf_counter()
+                chunk_count += 1
+                yield {"type": "token", "content": safe_convert_to_string(final_message.content)}
+
+            if final_message is not None:
+                await astore_cached_answer(message, final_message, first_turn and used_retrieval)
+
+            metrics = {
+                "type": "metrics",
+                "ttft_ms": round((first_token_time - start_time) * 1000, 1) if first_token_time else None,
+                "total_ms": elapsed_ms(),
+                "chunks": chunk_count,
+                "stages": dict(budget.timings),
+                "tokens": dict(budget.tokens),
+            }
+            logger.info(f"⏱️ Stream metrics for thread {thread_id}: {metrics}")
+            yield metrics
+
+            yield {"type": "status", "status": "complete"}
+
+        except Exception as e:
+            logger.error(f"❌ Error in Qdrant agent stream: {e}")
+            yield {"type": "error", "error": str(e)}
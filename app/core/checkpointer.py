@@ -0,0 +1,408 @@
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+import zlib
+from contextlib import closing
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+from config.settings import CHECKPOINTER_BACKEND, CHECKPOINT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Blobs above this size are zlib-compressed before they hit the database
+COMPRESS_MIN_BYTES = 1024
+COMPRESSED_SUFFIX = "+zlib"
+
+# Blob type of a channel version that holds no value (the channel was cleared)
+EMPTY_BLOB_TYPE = "empty"
+
+# Checkpoints whose blobs and pending writes are fetched per query by list()
+LOAD_PAGE_SIZE = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver):
+    """Checkpointer storing conversation state in a local SQLite database.
+
+    The database runs in WAL mode so several uvicorn worker processes can share
+    threads: readers never block the single writer, and concurrent writers wait
+    on busy_timeout instead of failing. Channel values are stored once per
+    (channel, version) in the blobs table, so a step writes only the channels
+    it changed rather than the whole state. Serialized values are
+    zlib-compressed once they grow past COMPRESS_MIN_BYTES. Both the sync and async checkpointer APIs
+    are served, the async ones from a worker thread.
+    """
+
+    def __init__(self, db_path: str, *, serde=None):
+        super().__init__(serde=serde)
+        self.db_path = db_path
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=30000")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    # Serialization helpers
+    def _dumps(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) >= COMPRESS_MIN_BYTES:
+            return type_ + COMPRESSED_SUFFIX, zlib.compress(data)
+        return type_, data
+
+    def _loads(self, type_: str, data: bytes) -> Any:
+        if type_.endswith(COMPRESSED_SUFFIX):
+            type_ = type_[:-len(COMPRESSED_SUFFIX)]
+            data = zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    def _execute(self, query: str, params: Sequence[Any] = ()):
+        with self.lock:
+            with closing(self.conn.cursor()) as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+            self.conn.commit()
+        return rows
+
+    def _load_pending_writes(self, keys) -> Dict[Tuple[str, str, str], list]:
+        """Pending writes of several checkpoints, keyed by (thread_id, checkpoint_ns, checkpoint_id)."""
+        if not keys:
+            return {}
+        placeholders = ", ".join(["(?, ?, ?)"] * len(keys))
+        rows = self._execute(
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, task_id, channel, type, value FROM writes "
+            f"WHERE (thread_id, checkpoint_ns, checkpoint_id) IN (VALUES {placeholders}) ORDER BY task_id, idx",
+            [value for key in keys for value in key],
+        )
+        writes: Dict[Tuple[str, str, str], list] = {}
+        for thread_id, checkpoint_ns, checkpoint_id, task_id, channel, value_type, value in rows:
+            writes.setdefault((thread_id, checkpoint_ns, checkpoint_id), []).append(
+                (task_id, channel, self._loads(value_type, value))
+            )
+        return writes
+
+    def _load_blobs(self, keys) -> Dict[Tuple[str, str, str, str], Tuple[str, bytes]]:
+        """Serialized channel values, keyed by (thread_id, checkpoint_ns, channel, version)."""
+        if not keys:
+            return {}
+        placeholders = ", ".join(["(?, ?, ?, ?)"] * len(keys))
+        rows = self._execute(
+            "SELECT thread_id, checkpoint_ns, channel, version, type, value FROM blobs "
+            f"WHERE (thread_id, checkpoint_ns, channel, version) IN (VALUES {placeholders})",
+            [value for key in keys for value in key],
+        )
+        return {tuple(row[:4]): (row[4], row[5]) for row in rows}
+
+    def _rows_to_tuples(self, rows) -> list:
+        """Checkpoint tuples of (thread_id, checkpoint_ns, *checkpoint columns) rows, with one
+        query for their channel values and one for their pending writes."""
+        loaded = []
+        for thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata in rows:
+            checkpoint = self._loads(type_, checkpoint)
+            loaded.append((thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint,
+                           self._loads(metadata_type, metadata)))
+
+        blob_keys = [
+            (thread_id, checkpoint_ns, channel, str(version))
+            for thread_id, checkpoint_ns, _, _, checkpoint, _ in loaded
+            for channel, version in checkpoint["channel_versions"].items()
+        ]
+        blobs = self._load_blobs(list(dict.fromkeys(blob_keys)))
+        writes = self._load_pending_writes([(thread_id, checkpoint_ns, checkpoint_id)
+                                            for thread_id, checkpoint_ns, checkpoint_id, *_ in loaded])
+
+        checkpoint_tuples = []
+        for thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint, metadata in loaded:
+            # Checkpoints written before per-channel blobs carry their values inline
+            channel_values = dict(checkpoint.get("channel_values") or {})
+            for channel, version in checkpoint["channel_versions"].items():
+                blob = blobs.get((thread_id, checkpoint_ns, channel, str(version)))
+                if blob is not None and blob[0] != EMPTY_BLOB_TYPE:
+                    channel_values[channel] = self._loads(*blob)
+            checkpoint_tuples.append(CheckpointTuple(
+                config={"configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }},
+                checkpoint={**checkpoint, "channel_values": channel_values},
+                metadata=metadata,
+                parent_config=(
+                    {"configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }}
+                    if parent_checkpoint_id else None
+                ),
+                pending_writes=writes.get((thread_id, checkpoint_ns, checkpoint_id), []),
+            ))
+        return checkpoint_tuples
+
+    # Sync API
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+
+        if checkpoint_id := get_checkpoint_id(config):
+            rows = self._execute(
+                f"SELECT {columns} FROM checkpoints "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+        else:
+            rows = self._execute(
+                f"SELECT {columns} FROM checkpoints "
+                "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, checkpoint_ns),
+            )
+
+        if not rows:
+            return None
+        return self._rows_to_tuples([(thread_id, checkpoint_ns, *rows[0])])[0]
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config is not None:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if "checkpoint_ns" in config["configurable"]:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        if limit is not None and not filter:
+            where += " ORDER BY checkpoint_id DESC LIMIT ?"
+            params.append(limit)
+        else:
+            where += " ORDER BY checkpoint_id DESC"
+        rows = self._execute(
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+            f"metadata_type, metadata FROM checkpoints {where}",
+            params,
+        )
+
+        yielded = 0
+        for start in range(0, len(rows), LOAD_PAGE_SIZE):
+            for checkpoint_tuple in self._rows_to_tuples(rows[start:start + LOAD_PAGE_SIZE]):
+                if filter and not all(checkpoint_tuple.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                yield checkpoint_tuple
+                yielded += 1
+                if limit is not None and yielded >= limit:
+                    return
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        # Only the channels updated by this step get new blobs; the checkpoint
+        # itself keeps just their versions
+        checkpoint = checkpoint.copy()
+        channel_values = checkpoint.pop("channel_values", {})
+        blobs = []
+        for channel, version in new_versions.items():
+            if channel in channel_values:
+                value_type, value = self._dumps(channel_values[channel])
+            else:
+                value_type, value = EMPTY_BLOB_TYPE, None
+            blobs.append((thread_id, checkpoint_ns, channel, str(version), value_type, value))
+
+        type_, serialized_checkpoint = self._dumps(checkpoint)
+        metadata_type, serialized_metadata = self._dumps(metadata)
+
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO blobs (thread_id, checkpoint_ns, channel, version, type, value) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                blobs,
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints "
+                "(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_,
+                    serialized_checkpoint,
+                    metadata_type,
+                    serialized_metadata,
+                ),
+            )
+            self.conn.commit()
+        return {"configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        # Special channels (errors, interrupts) overwrite; regular writes are kept once
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized_value = self._dumps(value)
+            rows.append((
+                thread_id, checkpoint_ns, checkpoint_id, task_id,
+                WRITES_IDX_MAP.get(channel, idx), channel, type_, serialized_value,
+            ))
+
+        with self.lock:
+            self.conn.executemany(
+                f"{verb} INTO writes "
+                "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.lock:
+            self.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self.conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            self.conn.execute("DELETE FROM blobs WHERE thread_id = ?", (thread_id,))
+            self.conn.commit()
+
+    def get_next_version(self, current: Optional[str], channel: Any) -> str:
+        # Same scheme as LangGraph's own savers: zero-padded counter plus a random
+        # suffix so versions written by different processes never collide
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # Async API (sqlite3 is blocking, so run it off the event loop)
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoint_tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+def get_checkpointer(backend: str = CHECKPOINTER_BACKEND):
+    """Create the conversation checkpointer selected in config/settings.py."""
+    if backend == "sqlite":
+        print(f"✅ Using SQLite checkpointer at {CHECKPOINT_DB_PATH}")
+        return SQLiteCheckpointSaver(CHECKPOINT_DB_PATH)
+    if backend != "memory":
+        print(f"⚠️ Unknown checkpointer backend '{backend}', falling back to memory")
+    return MemorySaver()
@@ -1,24 +1,56 @@
 from langchain_core.messages import SystemMessage
 from langgraph.graph import MessagesState, StateGraph
 from langgraph.prebuilt import ToolNode
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import StructuredTool
 
-from app.services.llm import llm
-from app.tools.qdrant_retrieval import retrieve, retrieve_with_filters, needs_retrieval, extract_filters_from_query
+from app.core.history import AgentState, asummarize_turns, conversation_messages, plan_history, split_turns, summarize_turns
+from app.services.context_packing import context_packing_stats, context_token_budget, pack_context
+from app.services.latency import record_stage, record_tokens
+from app.services.llm import get_llm
+from app.services.qdrant_store import current_search_params, search_params_key
+from app.services.registry import registry
+from app.services.single_flight import generation_flight, normalize_args, normalize_text, retrieval_flight
+from app.services.speculation import speculative_retrieval
+from app.services.tokens import count_message_tokens
+from app.tools.qdrant_retrieval import (
+    retrieve, retrieve_with_filters, needs_retrieval, extract_filters_from_query, filters_to_tool_args
+)
+from config.settings import AGENT_MODE, REQUEST_COALESCING, SPECULATIVE_RETRIEVAL
 import time
+import uuid
+import inspect
 import logging
 from functools import wraps
 
 logger = logging.getLogger(__name__)
 
 # Add timing decorator
-def time_execution(func):
+def time_execution(func=None, *, stage=None):
+    """Log a node's duration and record it as a pipeline stage (sync and async variants share a stage name)."""
+    if func is None:
+        return lambda f: time_execution(f, stage=stage)
+    stage = stage or func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start_time = time.time()
+            result = await func(*args, **kwargs)
+            end_time = time.time()
+            logger.info(f"{func.__name__} executed in {end_time - start_time:.2f} seconds")
+            record_stage(stage, (end_time - start_time) * 1000)
+            return result
+        return async_wrapper
+
     @wraps(func)
     def wrapper(*args, **kwargs):
         start_time = time.time()
         result = func(*args, **kwargs)
         end_time = time.time()
         logger.info(f"{func.__name__} executed in {end_time - start_time:.2f} seconds")
+        record_stage(stage, (end_time - start_time) * 1000)
         return result
     return wrapper
 
@@ -33,10 +65,15 @@ def safe_join_content(content):
         return ' '.join(str(item) for item in content)
     return str(content)
 
-# Generate an AIMessage that may include a tool-call to be sent.
-@time_execution
-def query_or_respond(state: MessagesState):
-    """Generate tool call for retrieval or respond using Qdrant."""
+# Tool-bound LLMs are built once, not on every request
+registry.register("llm_with_retrieve", lambda: get_llm().bind_tools([retrieve]))
+registry.register("llm_with_retrieve_with_filters", lambda: get_llm().bind_tools([retrieve_with_filters]))
+
+def select_responder(state: MessagesState):
+    """Pick the runnable for the first LLM call: tool-bound when retrieval is needed.
+
+    Returns the runnable and the filters extracted from the query.
+    """
     if needs_retrieval(state):
         last_message = state["messages"][-1].content
         print(f"🔍 Qdrant retrieval needed for query: {last_message}")
@@ -47,83 +84,225 @@ def query_or_respond(state: MessagesState):
         # Choose appropriate retrieval tool based on filters
         if filters:
             print(f"🎯 Using filtered retrieval with: {filters}")
-            llm_with_tools = llm.bind_tools([retrieve_with_filters])
-        else:
-            llm_with_tools = llm.bind_tools([retrieve])
-        
-        response = llm_with_tools.invoke(state["messages"])
-        return {"messages": [response]}
-    else:
+            return registry.get("llm_with_retrieve_with_filters"), filters
+        return registry.get("llm_with_retrieve"), filters
+
+    print(f"💬 No retrieval needed for query: {state['messages'][-1].content}")
+    return get_llm(), {}
+
+def push_down_filters(response, filters: dict):
+    """Fill retrieve_with_filters arguments the LLM left out with the filters extracted from the query.
+
+    The model often drops a filter (or cannot express a year range), which would
+    silently widen the search; every extracted filter reaches the vector store.
+    """
+    if not filters:
+        return response
+    for tool_call in getattr(response, "tool_calls", None) or []:
+        if tool_call["name"] != retrieve_with_filters.name:
+            continue
+        for arg, value in filters_to_tool_args(filters).items():
+            if not tool_call["args"].get(arg):
+                tool_call["args"][arg] = value
+    return response
+
+
+def heuristic_tool_call(state: MessagesState):
+    """The retrieval tool call the query heuristics pick (None for small talk).
+
+    It has the tool name and arguments the tool-calling round usually produces:
+    the user's message as query, with the extracted filters.
+    """
+    if not needs_retrieval(state):
+        return None
+    query = state["messages"][-1].content
+    filters = extract_filters_from_query(query)
+    if filters:
+        return {"name": retrieve_with_filters.name, "args": {"query": query, **filters_to_tool_args(filters)}}
+    return {"name": retrieve.name, "args": {"query": query}}
+
+def coalesced_tool(tool):
+    """The tool, with concurrent calls with the same (normalized) arguments sharing one execution."""
+    def call_args(kwargs):
+        # The wrapper's schema fills omitted optionals with None, which the tool's own schema rejects
+        return {name: value for name, value in kwargs.items() if value is not None}
+
+    def key(args):
+        # Requests with their own hnsw_ef/exact only share searches with the same settings
+        return (tool.name, normalize_args(args), search_params_key(current_search_params()))
+
+    def run(**kwargs):
+        args = call_args(kwargs)
+        return retrieval_flight.do(key(args), lambda: tool.invoke(args))
+
+    async def arun(**kwargs):
+        args = call_args(kwargs)
+        return await retrieval_flight.ado(key(args), lambda: tool.ainvoke(args))
+
+    return StructuredTool.from_function(func=run, coroutine=arun, name=tool.name, description=tool.description,
+                                        args_schema=tool.args_schema)
+
+RETRIEVAL_TOOLS = [retrieve, retrieve_with_filters]
+if REQUEST_COALESCING:
+    RETRIEVAL_TOOLS = [coalesced_tool(tool) for tool in RETRIEVAL_TOOLS]
+
+# Retrieval tools by name, for calls made outside the ToolNode (speculative prefetches)
+TOOLS_BY_NAME = {tool.name: tool for tool in RETRIEVAL_TOOLS}
+
+def start_prefetch(state: MessagesState, run_async: bool = False):
+    """Start the heuristic tool call next to the tool-calling LLM call (tool-calling mode only)."""
+    if not SPECULATIVE_RETRIEVAL:
+        return None
+    tool_call = heuristic_tool_call(state)
+    if tool_call is None:
+        return None
+    tool = TOOLS_BY_NAME[tool_call["name"]]
+    return speculative_retrieval.astart(tool_call, tool) if run_async else speculative_retrieval.start(tool_call, tool)
+
+def _thread_id(config):
+    """Graph thread of the run; tool call ids are only unique within one."""
+    return ((config or {}).get("configurable") or {}).get("thread_id")
+
+def _history_update(removed) -> dict:
+    return {"messages": [RemoveMessage(id=message.id) for message in removed]}
+
+def _log_history(state: MessagesState, removed, folded):
+    kept = len(state["messages"]) - len(removed)
+    print(f"🧠 History: {kept} messages kept, {len(folded)} turns folded into the summary, "
+          f"{len(removed)} messages dropped")
+
+# Keep the thread within the history budget before the LLM sees it
+@time_execution(stage="history")
+def manage_history(state: AgentState):
+    """Drop stale tool payloads and fold old turns into the rolling summary."""
+    removed, folded = plan_history(state["messages"], state.get("summary", ""))
+    if not removed:
+        return {}
+    update = _history_update(removed)
+    if folded:
+        update["summary"] = summarize_turns(state.get("summary", ""), folded)
+    _log_history(state, removed, folded)
+    return update
+
+@time_execution(stage="history")
+async def amanage_history(state: AgentState):
+    """Async variant of manage_history."""
+    removed, folded = plan_history(state["messages"], state.get("summary", ""))
+    if not removed:
+        return {}
+    update = _history_update(removed)
+    if folded:
+        update["summary"] = await asummarize_turns(state.get("summary", ""), folded)
+    _log_history(state, removed, folded)
+    return update
+
+# Generate an AIMessage that may include a tool-call to be sent.
+@time_execution
+def query_or_respond(state: MessagesState, config):
+    """Generate tool call for retrieval or respond using Qdrant."""
+    responder, filters = select_responder(state)
+    prefetch = start_prefetch(state)
+    response = None
+    try:
+        response = push_down_filters(responder.invoke(conversation_messages(state)), filters)
+    finally:
+        speculative_retrieval.attach(prefetch, response, _thread_id(config))
+    return {"messages": [response]}
+
+@time_execution(stage="query_or_respond")
+async def aquery_or_respond(state: MessagesState, config):
+    """Async variant of query_or_respond used by graph.ainvoke/astream."""
+    responder, filters = select_responder(state)
+    prefetch = start_prefetch(state, run_async=True)
+    response = None
+    try:
+        response = push_down_filters(await responder.ainvoke(conversation_messages(state)), filters)
+    finally:
+        speculative_retrieval.attach(prefetch, response, _thread_id(config))
+    return {"messages": [response]}
+
+def direct_tool_call(state: MessagesState):
+    """The retrieval tool call built from the query heuristics, without asking the LLM (None for small talk).
+
+    Carries the same tool names and arguments the tool-calling round would
+    produce, so the ToolNode, generate and the conversation history are unchanged.
+    """
+    tool_call = heuristic_tool_call(state)
+    if tool_call is None:
         print(f"💬 No retrieval needed for query: {state['messages'][-1].content}")
-        response = llm.invoke(state["messages"])
-        return {"messages": [response]}
+        return None
+
+    print(f"🔍 Direct {tool_call['name']} call with: {tool_call['args']}")
+    return AIMessage(content="", tool_calls=[{**tool_call, "id": f"direct_{uuid.uuid4().hex[:12]}"}])
+
+@time_execution(stage="query_or_respond")
+def direct_query_or_respond(state: MessagesState):
+    """Direct mode: retrieve without a tool-calling LLM round, or answer small talk in one call."""
+    tool_call = direct_tool_call(state)
+    if tool_call is not None:
+        return {"messages": [tool_call]}
+    return {"messages": [get_llm().invoke(conversation_messages(state))]}
+
+@time_execution(stage="query_or_respond")
+async def adirect_query_or_respond(state: MessagesState):
+    """Async variant of direct_query_or_respond."""
+    tool_call = direct_tool_call(state)
+    if tool_call is not None:
+        return {"messages": [tool_call]}
+    return {"messages": [await get_llm().ainvoke(conversation_messages(state))]}
 
 # Execute the retrieval with multiple tools
-tools = ToolNode([retrieve, retrieve_with_filters])
-
-def score_text(text: str, query_terms: list[str]) -> int:
-    """Score text relevance based on query terms."""
-    t = text.lower()
-    return sum(t.count(q) for q in query_terms)
-
-def pick_relevant_context(docs_content: list[str], user_question: str, max_chars: int = 5000) -> str:
-    """Select the most relevant context from retrieved documents."""
-    import re
-    terms = [w for w in re.findall(r"\w+", user_question.lower()) if len(w) > 2]
-
-    # slice each doc a bit so a single long chunk can't dominate
-    candidates = [c[:1200] for c in docs_content if c]
-    ranked = sorted(
-        candidates,
-        key=lambda c: score_text(c, terms),
-        reverse=True
-    )
+tools = ToolNode(RETRIEVAL_TOOLS)
 
-    out, total = [], 0
-    for c in ranked:
-        if total + len(c) > max_chars: 
-            break
-        out.append(c)
-        total += len(c)
-    
-    if not out and candidates:
-        out = [candidates[0][:max_chars]]  # fallback
-    
-    return "\n\n".join(out)
+def _pending_tool_calls(state: MessagesState, served_call):
+    """State for the ToolNode with the call already answered by a prefetch removed (None if nothing is left)."""
+    last = state["messages"][-1]
+    if served_call is None:
+        return state
+    remaining = [tool_call for tool_call in last.tool_calls if tool_call["id"] != served_call["id"]]
+    if not remaining:
+        return None
+    return {"messages": state["messages"][:-1] + [last.model_copy(update={"tool_calls": remaining})]}
 
-# Generate a response using the retrieved content.
-@time_execution
-def generate(state: MessagesState):
-    """Generate answer using Qdrant-retrieved context and conversation history."""
-    # Get generated ToolMessages
-    tool_messages = [msg for msg in state["messages"] if msg.type == "tool"]
-    
-    if not tool_messages:
-        return {"messages": []}
+def _prefetched_message(tool_call, content):
+    return ToolMessage(content=content, name=tool_call["name"], tool_call_id=tool_call["id"])
 
-    # Flatten tool message contents into text chunks
-    docs_content = []
-    metadata_info = []  # Track metadata for better context
-    
-    for tool_msg in tool_messages:
-        if getattr(tool_msg, "content", None):
-            content = safe_join_content(tool_msg.content)
-            docs_content.append(content)
-            
-            # Extract metadata if available from tool call
-            if hasattr(tool_msg, 'metadata'):
-                metadata_info.append(str(tool_msg.metadata))
+def run_tools(state: MessagesState, config):
+    """ToolNode, except for a tool call a speculative prefetch already answered."""
+    served_call, prefetch = speculative_retrieval.take(state["messages"][-1].tool_calls, _thread_id(config))
+    content = speculative_retrieval.result(prefetch) if prefetch is not None else None
+    if content is None:
+        served_call = None
 
-    # Get the latest user message
-    human_messages = [msg for msg in state["messages"] if msg.type == "human"]
-    user_question = human_messages[-1].content if human_messages else "No question found"
+    messages = [_prefetched_message(served_call, content)] if served_call is not None else []
+    pending = _pending_tool_calls(state, served_call)
+    if pending is not None:
+        messages += tools.invoke(pending, config)["messages"]
+    return {"messages": messages}
+
+async def arun_tools(state: MessagesState, config):
+    """Async variant of run_tools."""
+    served_call, prefetch = speculative_retrieval.take(state["messages"][-1].tool_calls, _thread_id(config))
+    content = await speculative_retrieval.aresult(prefetch) if prefetch is not None else None
+    if content is None:
+        served_call = None
 
-    # Select a compact, relevant slice of context
-    compact_context = pick_relevant_context(docs_content, user_question, max_chars=5000)
-    print(f"📊 Qdrant context: {len(compact_context)} chars from {len(docs_content)} documents")
+    messages = [_prefetched_message(served_call, content)] if served_call is not None else []
+    pending = _pending_tool_calls(state, served_call)
+    if pending is not None:
+        messages += (await tools.ainvoke(pending, config))["messages"]
+    return {"messages": messages}
 
-    # Enhanced system prompt for enterprise context
-    system_prompt = (
+# Sampling settings for the answer generation call
+GENERATION_CONFIG = {
+    "max_tokens": 512,
+    "temperature": 0.3,
+    "top_p": 0.85
+}
+
+def generation_system_prompt(context: str) -> str:
+    """Enhanced system prompt for enterprise context."""
+    return (
         "You are an expert AI/ML assistant for an enterprise organization. Use the provided context from our knowledge base to answer questions.\n\n"
         "CONTEXT GUIDELINES:\n"
         "1. Prioritize information from the provided context when relevant\n"
@@ -136,24 +315,88 @@ def generate(state: MessagesState):
         "- Provide supporting details from context\n"
         "- Mention source relevance when appropriate\n"
         "- Suggest related topics if helpful\n\n"
-        f"RETRIEVED CONTEXT:\n{compact_context}\n\n"
+        f"RETRIEVED CONTEXT:\n{context}\n\n"
         "USER QUESTION: {user_question}"
     )
 
+def build_generation_prompt(state: MessagesState):
+    """Build the generation prompt from the current turn's retrieved context, or None without tool output."""
+    # Only this turn's tool results: earlier turns' context was answered already
+    turn = split_turns(state["messages"])[-1] if state["messages"] else []
+    docs_content = [safe_join_content(msg.content) for msg in turn if msg.type == "tool" and getattr(msg, "content", None)]
+    if not docs_content:
+        return None
+
+    # Get the latest user message
+    human_messages = [msg for msg in turn if msg.type == "human"]
+    user_question = human_messages[-1].content if human_messages else "No question found"
+
+    # Fill the context budget left by the rest of the prompt and the answer
+    prompt_tokens = count_message_tokens([SystemMessage(content=generation_system_prompt("")), HumanMessage(content=user_question)])
+    budget = context_token_budget(prompt_tokens, GENERATION_CONFIG["max_tokens"])
+    packed = pack_context(docs_content, user_question, budget)
+    context_packing_stats.record(packed)
+    record_tokens("context", packed.tokens)
+    record_tokens("prompt", prompt_tokens + packed.tokens)
+    print(f"📊 Qdrant context: {packed.describe()}")
+
     # Compose prompt
-    prompt = [SystemMessage(content=system_prompt), HumanMessage(content=user_question)]
+    return [SystemMessage(content=generation_system_prompt(packed.text)), HumanMessage(content=user_question)]
+
+def generation_key(prompt):
+    """Coalescing key of a generation: model and sampling settings, normalized question and packed context."""
+    llm = get_llm()
+    model = getattr(llm, "model", type(llm).__name__)
+    system, question = prompt[0].content, prompt[-1].content
+    return (model, tuple(sorted(GENERATION_CONFIG.items())), normalize_text(question), system)
+
+def generation_llm():
+    """Chat model with the generation settings bound, so max_tokens caps the answer the context budget planned for."""
+    return get_llm().bind(**GENERATION_CONFIG)
+
+def _invoke_generation(prompt):
+    return generation_llm().invoke(prompt)
+
+async def _stream_generation(prompt):
+    # Stream so LangGraph's "messages" mode can forward tokens as they arrive
+    response = None
+    async for chunk in generation_llm().astream(prompt):
+        response = chunk if response is None else response + chunk
+    return response
+
+# Generate a response using the retrieved content.
+@time_execution
+def generate(state: MessagesState):
+    """Generate answer using Qdrant-retrieved context and conversation history."""
+    prompt = build_generation_prompt(state)
+    if prompt is None:
+        return {"messages": []}
 
     # Run LLM with optimized settings for enterprise
-    response = llm.invoke(
-        prompt,
-        config={
-            "max_tokens": 512,
-            "temperature": 0.3,
-            "top_p": 0.85
-        }
-    )
+    if REQUEST_COALESCING:
+        response = generation_flight.do(generation_key(prompt), lambda: _invoke_generation(prompt)).model_copy()
+    else:
+        response = _invoke_generation(prompt)
     return {"messages": [response]}
 
+@time_execution(stage="generate")
+async def agenerate(state: MessagesState):
+    """Async variant of generate used by graph.ainvoke/astream.
+
+    Requests coalesced onto another one's generation get the whole answer at
+    once rather than streamed tokens.
+    """
+    prompt = build_generation_prompt(state)
+    if prompt is None:
+        return {"messages": []}
+
+    if REQUEST_COALESCING:
+        response = await generation_flight.ado(generation_key(prompt), lambda: _stream_generation(prompt))
+        response = response.model_copy() if response is not None else None
+    else:
+        response = await _stream_generation(prompt)
+    return {"messages": [response] if response is not None else []}
+
 def custom_tools_condition(state: MessagesState):
     """Check if the last AI message has tool calls."""
     messages = state["messages"]
@@ -163,18 +406,32 @@ def custom_tools_condition(state: MessagesState):
         return "tools"
     return "done"
 
-def build_graph():
+# First node per agent mode: "tool_calling" lets the LLM emit the retrieval call (two LLM
+# calls per retrieval question); "direct" builds it from the query heuristics (one call)
+AGENT_MODES = {
+    "tool_calling": (query_or_respond, aquery_or_respond),
+    "direct": (direct_query_or_respond, adirect_query_or_respond),
+}
+
+def build_graph(mode: str = AGENT_MODE):
     """Build and return the Qdrant-powered agent graph."""
-    graph_builder = StateGraph(MessagesState)
+    if mode not in AGENT_MODES:
+        raise ValueError(f"Unknown agent mode '{mode}', expected one of {sorted(AGENT_MODES)}")
+    graph_builder = StateGraph(AgentState)
 
     # Add nodes
-    graph_builder.add_node("query_or_respond", query_or_respond)
-    graph_builder.add_node("tools", tools)
-    graph_builder.add_node("generate", generate)
+    # Nodes carry both sync and async implementations so graph.stream and
+    # graph.ainvoke/astream each run without blocking their caller
+    respond, arespond = AGENT_MODES[mode]
+    graph_builder.add_node("manage_history", RunnableLambda(manage_history, afunc=amanage_history))
+    graph_builder.add_node("query_or_respond", RunnableLambda(respond, afunc=arespond))
+    graph_builder.add_node("tools", RunnableLambda(run_tools, afunc=arun_tools))
+    graph_builder.add_node("generate", RunnableLambda(generate, afunc=agenerate))
     graph_builder.add_node("done", lambda state: state)
 
     # Set up the workflow
-    graph_builder.set_entry_point("query_or_respond")
+    graph_builder.set_entry_point("manage_history")
+    graph_builder.add_edge("manage_history", "query_or_respond")
     
     graph_builder.add_conditional_edges(
         "query_or_respond",
@@ -185,5 +442,5 @@ def build_graph():
     graph_builder.add_edge("tools", "generate")
     graph_builder.add_edge("generate", "done")
     
-    print("✅ Agent graph built successfully")
+    print(f"✅ Agent graph built successfully ({mode} mode)")
     return graph_builder
\ No newline at end of file
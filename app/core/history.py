@@ -0,0 +1,127 @@
+"""Token-budgeted conversation history with a rolling summary.
+
+Before each turn the thread is trimmed so the LLM input stays flat however
+long the thread gets:
+
+- retrieval payloads of earlier turns (tool-call messages and the ToolMessages
+  with their document dumps) are dropped; the answers built from them stay;
+- the last HISTORY_MAX_TURNS turns are kept verbatim while they fit in
+  HISTORY_TOKEN_BUDGET; beyond that, older turns are folded into a rolling
+  summary kept in graph state, down to HISTORY_KEEP_TURNS turns so the
+  summarization call runs every few turns rather than on each one.
+
+Folded and dropped messages are removed from the checkpointed state too, so
+checkpoints stop growing as well.
+"""
+import logging
+from typing import List, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.graph import MessagesState
+
+from app.services.llm import get_llm
+from app.services.tokens import get_token_counter, message_text
+from config.settings import HISTORY_MAX_TURNS, HISTORY_KEEP_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_SUMMARY_MAX_TOKENS
+
+logger = logging.getLogger(__name__)
+
+class AgentState(MessagesState):
+    """Graph state: the messages plus the summary of turns folded out of them."""
+    summary: str
+
+def split_turns(messages) -> List[list]:
+    """Group messages into turns, each starting at a human message."""
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+def is_tool_payload(message) -> bool:
+    """Tool results and the AI messages that only requested them."""
+    return isinstance(message, ToolMessage) or (isinstance(message, AIMessage) and bool(message.tool_calls))
+
+def _flatten(turns) -> list:
+    return [message for turn in turns for message in turn]
+
+def plan_history(messages, summary: str = "", max_turns: int = HISTORY_MAX_TURNS, keep_turns: int = HISTORY_KEEP_TURNS,
+                 token_budget: int = HISTORY_TOKEN_BUDGET, counter=None) -> Tuple[list, List[list]]:
+    """Messages to remove from the thread, and the (payload-free) older turns to fold into the summary.
+
+    The current turn (the last one) is always kept.
+    """
+    counter = counter or get_token_counter()
+    turns = split_turns(messages)
+    if len(turns) <= 1:
+        return [], []
+    older, current = turns[:-1], turns[-1]
+    stale = [message for message in _flatten(older) if is_tool_payload(message)]
+    older = [[message for message in turn if not is_tool_payload(message)] for turn in older]
+
+    def tokens(kept):
+        return counter.count_messages(_flatten(kept) + current) + counter.count(summary)
+
+    kept = older
+    if len(kept) + 1 > max_turns or tokens(kept) > token_budget:
+        kept = older[len(older) - max(keep_turns - 1, 0):] if keep_turns > 1 else []
+        while kept and tokens(kept) > token_budget:
+            kept = kept[1:]
+    folded = older[:len(older) - len(kept)]
+    return stale + _flatten(folded), folded
+
+def transcript(turns, max_chars: int = 1000) -> str:
+    lines = []
+    for message in _flatten(turns):
+        text = message_text(message).strip()
+        if not text:
+            continue
+        role = "User" if isinstance(message, HumanMessage) else "Assistant"
+        lines.append(f"{role}: {text[:max_chars]}")
+    return "\n".join(lines)
+
+def summary_prompt(summary: str, turns) -> list:
+    words = int(HISTORY_SUMMARY_MAX_TOKENS * 0.7)
+    return [
+        SystemMessage(content=(
+            "You maintain the running summary of a conversation between a user and an enterprise AI/ML assistant. "
+            "Merge the new exchanges into the summary. Keep the topics discussed, facts and figures the user may "
+            "refer back to, their preferences and open questions; drop greetings and filler. "
+            f"Reply with the updated summary only, in at most {words} words."
+        )),
+        HumanMessage(content=f"Current summary:\n{summary or '(none)'}\n\nNew exchanges:\n{transcript(turns)}"),
+    ]
+
+def extractive_summary(summary: str, turns, max_tokens: int = HISTORY_SUMMARY_MAX_TOKENS, counter=None) -> str:
+    """Fallback without the LLM: the previous summary plus the start of each folded message, newest kept."""
+    lines = [summary] if summary else []
+    lines += [line[:200] for line in transcript(turns).splitlines()]
+    text = "\n".join(lines)
+    counter = counter or get_token_counter()
+    while counter.count(text) > max_tokens and "\n" in text:
+        text = text.split("\n", 1)[1]
+    return text
+
+def _summarizer():
+    return get_llm().bind(max_tokens=HISTORY_SUMMARY_MAX_TOKENS, temperature=0)
+
+def summarize_turns(summary: str, turns) -> str:
+    try:
+        return message_text(_summarizer().invoke(summary_prompt(summary, turns))).strip()
+    except Exception as e:
+        logger.warning(f"⚠️ History summarization failed, using an extractive summary: {e}")
+        return extractive_summary(summary, turns)
+
+async def asummarize_turns(summary: str, turns) -> str:
+    try:
+        return message_text(await _summarizer().ainvoke(summary_prompt(summary, turns))).strip()
+    except Exception as e:
+        logger.warning(f"⚠️ History summarization failed, using an extractive summary: {e}")
+        return extractive_summary(summary, turns)
+
+def conversation_messages(state) -> list:
+    """What the LLM sees of the thread: the rolling summary (if any) followed by the kept messages."""
+    summary = state.get("summary")
+    if not summary:
+        return state["messages"]
+    return [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] + state["messages"]
@@ -1,20 +1,28 @@
-from app.core.agent import graph
+from app.core.agent import get_graph, get_memory
 
 def get_conversation_history(thread_id: str):
     """Get conversation history for a thread."""
     try:
-        # Get the current state from the graph's memory
+        # Get the current state from the graph's checkpointer
         config = {"configurable": {"thread_id": thread_id}}
-        current_state = graph.get_state(config)
+        current_state = get_graph().get_state(config)
         return current_state.values.get("messages", [])
     except:
         return []
 
+def get_conversation_summary(thread_id: str):
+    """Get the rolling summary of the turns folded out of a thread's history."""
+    try:
+        config = {"configurable": {"thread_id": thread_id}}
+        return get_graph().get_state(config).values.get("summary", "")
+    except:
+        return ""
+
 def clear_conversation_history(thread_id: str):
     """Clear conversation history for a thread."""
     try:
-        config = {"configurable": {"thread_id": thread_id}}
-        graph.update_state(config, {"messages": []})
+        # Drop every checkpoint of the thread so all workers see it cleared
+        get_memory().delete_thread(thread_id)
         return True
     except:
         return False
\ No newline at end of file
@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.services.llm import get_embeddings
+from app.services.stamp import StampWatcher
+from config.settings import (
+    ANSWER_CACHE, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_SIZE, RETRIEVAL_CACHE_STAMP_PATH
+)
+
+class SemanticAnswerCache:
+    """Reuse answers for near-duplicate questions instead of re-running the agent.
+
+    Questions are embedded with the shared embedding model and grouped by
+    their extracted metadata filters, so a question is only ever answered
+    from a question asked under the same filters. A stored answer is returned
+    when cosine similarity reaches the threshold and the entry is younger than
+    the TTL. The total number of entries is bounded with LRU eviction, and
+    re-uploading documents (which touches the retrieval cache stamp file)
+    drops every stored answer.
+    """
+
+    def __init__(self, threshold: float = 0.92, ttl_seconds: float = 3600, max_entries: int = 2000,
+                 enabled: bool = True, stamp_path: Optional[str] = None, embeddings=None):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.stamp_path = stamp_path
+        self.embeddings = embeddings  # Defaults to the shared embedding model
+
+        self._buckets: Dict[str, Dict[str, Any]] = {}
+        self._lru: OrderedDict = OrderedDict()  # entry id -> filters key
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self._stamp = StampWatcher(stamp_path)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _filters_key(filters: Optional[Dict[str, Any]]) -> str:
+        return json.dumps({k: v for k, v in (filters or {}).items() if v}, sort_keys=True, default=str)
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_stamp(self):
+        if self._stamp.changed():
+            self._buckets.clear()
+            self._lru.clear()
+            self.invalidations += 1
+
+    def _embeddings(self):
+        return self.embeddings if self.embeddings is not None else get_embeddings()
+
+    def _remove(self, filters_key: str, entry_id: int):
+        bucket = self._buckets.get(filters_key)
+        if bucket is None:
+            return
+        bucket["entries"] = [e for e in bucket["entries"] if e["id"] != entry_id]
+        bucket["matrix"] = None
+        if not bucket["entries"]:
+            del self._buckets[filters_key]
+        self._lru.pop(entry_id, None)
+
+    def _expire(self, filters_key: str):
+        """Drop the bucket's entries older than the TTL, so an expired best match cannot hide a fresh one."""
+        now = time.monotonic()
+        for entry in [e for e in self._buckets[filters_key]["entries"] if now - e["stored_at"] >= self.ttl_seconds]:
+            self._remove(filters_key, entry["id"])
+            self.expirations += 1
+
+    def _match(self, vector: np.ndarray, filters_key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._check_stamp()
+            if filters_key in self._buckets:
+                self._expire(filters_key)
+            bucket = self._buckets.get(filters_key)
+            if bucket is None:
+                self.misses += 1
+                return None
+
+            if bucket["matrix"] is None:
+                bucket["matrix"] = np.vstack([e["vector"] for e in bucket["entries"]])
+            scores = bucket["matrix"] @ vector
+            best = int(np.argmax(scores))
+            entry = bucket["entries"][best]
+
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._lru.move_to_end(entry["id"])
+            self.hits += 1
+            return {"answer": entry["answer"], "question": entry["question"], "similarity": float(scores[best])}
+
+    def _insert(self, vector: np.ndarray, question: str, filters_key: str, answer: str):
+        with self._lock:
+            entry = {
+                "id": self._next_id,
+                "vector": vector,
+                "question": question,
+                "answer": answer,
+                "stored_at": time.monotonic(),
+            }
+            self._next_id += 1
+
+            # A question answered again replaces its previous answer
+            for previous in [e for e in self._buckets.get(filters_key, {}).get("entries", []) if e["question"] == question]:
+                self._remove(filters_key, previous["id"])
+
+            bucket = self._buckets.setdefault(filters_key, {"entries": [], "matrix": None})
+            bucket["entries"].append(entry)
+            bucket["matrix"] = None
+            self._lru[entry["id"]] = filters_key
+            self.stores += 1
+
+            while len(self._lru) > self.max_entries:
+                oldest_id, oldest_key = next(iter(self._lru.items()))
+                self._remove(oldest_key, oldest_id)
+                self.evictions += 1
+
+    def lookup(self, question: str, filters: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Return {"answer", "question", "similarity"} for a close enough earlier question."""
+        if not self.enabled:
+            return None
+        vector = self._unit(self._embeddings().embed_query(question))
+        return self._match(vector, self._filters_key(filters))
+
+    async def alookup(self, question: str, filters: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        vector = self._unit(await self._embeddings().aembed_query(question))
+        return self._match(vector, self._filters_key(filters))
+
+    def store(self, question: str, answer: str, filters: Optional[Dict[str, Any]] = None):
+        if not self.enabled or not answer:
+            return
+        vector = self._unit(self._embeddings().embed_query(question))
+        self._insert(vector, question, self._filters_key(filters), answer)
+
+    async def astore(self, question: str, answer: str, filters: Optional[Dict[str, Any]] = None):
+        if not self.enabled or not answer:
+            return
+        vector = self._unit(await self._embeddings().aembed_query(question))
+        self._insert(vector, question, self._filters_key(filters), answer)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._lru.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._lru),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    ttl_seconds=ANSWER_CACHE_TTL,
+    max_entries=ANSWER_CACHE_SIZE,
+    enabled=ANSWER_CACHE,
+    stamp_path=RETRIEVAL_CACHE_STAMP_PATH,
+)
@@ -0,0 +1,34 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+# Calls shared by every agent run started inside the same batch
+_batch_calls: ContextVar[Optional[dict]] = ContextVar("batch_calls", default=None)
+
+@contextmanager
+def shared_batch_calls():
+    """Share identical retrieval calls between tasks created inside this block.
+
+    Tasks copy the current context when they are created, so every task started
+    here sees the same call table even after the block exits.
+    """
+    token = _batch_calls.set({})
+    try:
+        yield
+    finally:
+        _batch_calls.reset(token)
+
+async def share_batch_call(key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """Run factory() once per key within a batch; other callers await the same result."""
+    calls = _batch_calls.get()
+    if calls is None:
+        return await factory()
+
+    task = calls.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        calls[key] = task
+
+    # Shield so one cancelled batch item does not cancel the call for the others
+    return await asyncio.shield(task)
@@ -0,0 +1,285 @@
+"""BM25 inverted index over document text for lexical retrieval.
+
+Dense MiniLM embeddings miss exact keyword matches (model names, acronyms
+such as "PCA" or "SVM"); this index provides that signal. It is built at
+ingest time by config/upload_to_qdrant.py, streaming the corpus, and loaded
+once per process (and again whenever re-ingestion touches the invalidation
+stamp).
+"""
+import json
+import math
+import os
+import re
+import shutil
+import time
+import logging
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.services.numpy_store import MetadataMasks
+from app.services.registry import Unavailable, registry
+
+logger = logging.getLogger(__name__)
+
+POSTINGS_FILE = "postings.npz"
+TERMS_FILE = "terms.json"
+DOCUMENTS_FILE = "documents.jsonl"
+META_FILE = "meta.json"
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it its me of on or tell that the this "
+    "to was what when where which who why with about explain please give show find".split()
+)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stop words; keeps acronyms and hyphenated names whole."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+class Postings:
+    """Term frequencies per term, accumulated one document at a time.
+
+    Kept in compact arrays so building over a large corpus holds only the
+    postings, not the documents.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Tuple[array, array]] = {}  # Term -> (doc ids, term frequencies)
+        self.lengths = array("f")
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add(self, text: str):
+        counts = Counter(tokenize(text))
+        doc_id = len(self.lengths)
+        self.lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            doc_ids, tfs = self.postings.setdefault(term, (array("i"), array("i")))
+            doc_ids.append(doc_id)
+            tfs.append(tf)
+
+    def compile(self, k1: float, b: float) -> Tuple[Dict[str, int], np.ndarray, np.ndarray, np.ndarray]:
+        """Terms and the CSR postings with their BM25 term weights."""
+        lengths = np.array(self.lengths, dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+        n_docs = len(lengths)
+
+        terms: Dict[str, int] = {}
+        offsets = [0]
+        doc_id_parts, weight_parts = [], []
+        for term_id, term in enumerate(sorted(self.postings)):
+            terms[term] = term_id
+            doc_ids = np.array(self.postings[term][0], dtype=np.int32)
+            tfs = np.array(self.postings[term][1], dtype=np.float32)
+            idf = math.log(1 + (n_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            norm = k1 * (1 - b + b * lengths[doc_ids] / avg_length)
+            doc_id_parts.append(doc_ids)
+            weight_parts.append((idf * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32))
+            offsets.append(offsets[-1] + len(doc_ids))
+
+        return (
+            terms,
+            np.array(offsets, dtype=np.int64),
+            np.concatenate(doc_id_parts) if doc_id_parts else np.zeros(0, dtype=np.int32),
+            np.concatenate(weight_parts) if weight_parts else np.zeros(0, dtype=np.float32),
+        )
+
+def _document_line(text: str, metadata: Dict[str, Any]) -> str:
+    return json.dumps({"page_content": text, "metadata": metadata}, ensure_ascii=False) + "\n"
+
+def _new_version(directory: str) -> str:
+    """Fresh version directory inside the index directory; returns its name."""
+    version = f"v{time.time_ns()}"
+    os.makedirs(os.path.join(directory, version))
+    return version
+
+def _publish(directory: str, version: str, terms, offsets, doc_ids, weights, count: int, k1: float, b: float):
+    """Write the postings into the version directory and point the meta file at it.
+
+    The meta file is swapped in with a single rename, so readers see either the
+    previous index or the new one. The version it replaced is kept for loads
+    still reading it; older ones (and abandoned builds) are removed.
+    """
+    version_dir = os.path.join(directory, version)
+    np.savez(os.path.join(version_dir, POSTINGS_FILE), offsets=offsets, doc_ids=doc_ids, weights=weights)
+    with open(os.path.join(version_dir, TERMS_FILE), "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+
+    meta_path = os.path.join(directory, META_FILE)
+    previous = None
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            previous = json.load(f).get("version")
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump({"version": version, "count": count, "terms": len(terms), "k1": k1, "b": b}, f)
+    os.replace(meta_path + ".tmp", meta_path)
+
+    for name in os.listdir(directory):
+        if name.startswith("v") and name[1:].isdigit() and name not in (version, previous):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+class BM25Index:
+    """Okapi BM25 over an in-memory inverted index.
+
+    Postings are stored per term in CSR layout (offsets into flat doc id and
+    weight arrays). Each posting already holds its full BM25 term weight, so
+    scoring a query is one scatter-add per query term.
+    """
+
+    def __init__(self, terms: Dict[str, int], offsets: np.ndarray, doc_ids: np.ndarray, weights: np.ndarray,
+                 texts: List[str], metadatas: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75):
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.texts = texts
+        self.metadatas = metadatas
+        self.k1 = k1
+        self.b = b
+        self.masks = MetadataMasks(metadatas)
+
+    def __len__(self):
+        return len(self.texts)
+
+    @classmethod
+    def from_documents(cls, documents: List[Document], k1: float = 1.5, b: float = 0.75):
+        """Tokenize documents and build the postings."""
+        postings = Postings()
+        for doc in documents:
+            postings.add(doc.page_content)
+        terms, offsets, doc_ids, weights = postings.compile(k1, b)
+        return cls(
+            terms,
+            offsets,
+            doc_ids,
+            weights,
+            [doc.page_content for doc in documents],
+            [dict(doc.metadata) for doc in documents],
+            k1=k1,
+            b=b,
+        )
+
+    def search_with_scores(self, query: str, k: int = 4, filters=None) -> List[Tuple[Document, float]]:
+        """Top-k documents by BM25 score; documents without any query term are never returned."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+
+        mask = self.masks.mask(filters)
+        if mask is not None:
+            scores[~mask] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        if candidates.size == 0:
+            return []
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+
+        return [
+            (Document(page_content=self.texts[row], metadata=self.metadatas[row]), float(scores[row]))
+            for row in candidates
+        ]
+
+    def search(self, query: str, k: int = 4, filters=None) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query, k=k, filters=filters)]
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        version = _new_version(directory)
+        with open(os.path.join(directory, version, DOCUMENTS_FILE), "w", encoding="utf-8") as f:
+            for text, metadata in zip(self.texts, self.metadatas):
+                f.write(_document_line(text, metadata))
+        _publish(directory, version, self.terms, self.offsets, self.doc_ids, self.weights, len(self), self.k1, self.b)
+
+    @classmethod
+    def load(cls, directory: str):
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        # Indexes saved before versioning keep their files next to the meta file
+        directory = os.path.join(directory, meta.get("version", ""))
+        postings = np.load(os.path.join(directory, POSTINGS_FILE))
+        with open(os.path.join(directory, TERMS_FILE), encoding="utf-8") as f:
+            terms = json.load(f)
+
+        texts, metadatas = [], []
+        with open(os.path.join(directory, DOCUMENTS_FILE), encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                texts.append(record["page_content"])
+                metadatas.append(record["metadata"])
+        return cls(terms, postings["offsets"], postings["doc_ids"], postings["weights"], texts, metadatas,
+                   k1=meta["k1"], b=meta["b"])
+
+class BM25Builder:
+    """Writes a BM25 index from a stream of documents.
+
+    Document texts go straight to disk; only the postings stay in memory. The
+    index is written into a new version directory and swapped in when complete.
+    """
+
+    def __init__(self, directory: str, k1: float = 1.5, b: float = 0.75):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        os.makedirs(directory, exist_ok=True)
+        self.version = _new_version(directory)
+        self.postings = Postings()
+        self._documents = open(os.path.join(directory, self.version, DOCUMENTS_FILE), "w", encoding="utf-8")
+
+    def add_documents(self, documents: Iterable[Document]):
+        for doc in documents:
+            self.postings.add(doc.page_content)
+            self._documents.write(_document_line(doc.page_content, dict(doc.metadata)))
+
+    def finish(self) -> Tuple[int, int]:
+        """Save the index into the target directory; returns (documents, terms)."""
+        self._documents.close()
+        terms, offsets, doc_ids, weights = self.postings.compile(self.k1, self.b)
+        _publish(self.directory, self.version, terms, offsets, doc_ids, weights, len(self.postings), self.k1, self.b)
+        return len(self.postings), len(terms)
+
+def write_bm25_index(directory: str, documents: Iterable[Document]) -> Tuple[int, int]:
+    """Build the BM25 index for the documents being ingested (streamed) and save it."""
+    builder = BM25Builder(directory)
+    builder.add_documents(documents)
+    count, terms = builder.finish()
+    print(f"✅ Built BM25 index with {count} documents and {terms} terms in {directory}")
+    return count, terms
+
+def load_bm25_index() -> Union[BM25Index, Unavailable]:
+    """Load the BM25 index written at ingest time.
+
+    A missing or unreadable index is reported once and remembered until the
+    next re-ingestion; it is never built on the request path. Not having built
+    one yet is expected (dense-only retrieval) and does not affect readiness.
+    """
+    from config.settings import BM25_INDEX_DIR
+
+    if not os.path.exists(os.path.join(BM25_INDEX_DIR, META_FILE)):
+        print(f"ℹ️ No BM25 index in {BM25_INDEX_DIR} yet, using dense retrieval only")
+        return Unavailable(f"no index in {BM25_INDEX_DIR}, run config/upload_to_qdrant.py to build it",
+                           degraded=False)
+    try:
+        index = BM25Index.load(BM25_INDEX_DIR)
+        print(f"✅ BM25 index loaded ({len(index)} documents)")
+        return index
+    except Exception as e:
+        print(f"⚠️ BM25 index unavailable, using dense retrieval only: {e}")
+        return Unavailable(f"BM25 index unavailable: {e}")
+
+registry.register("bm25_index", load_bm25_index, reload_on_stamp=True)
+
+def get_bm25_index() -> Optional[BM25Index]:
+    """Shared BM25 index (None if it could not be loaded)."""
+    return registry.get("bm25_index")
@@ -1,47 +1,155 @@
-import hashlib
+import json
+import os
+import threading
 import time
-from functools import lru_cache
-from typing import Dict, Any, List
-
-from app.services.qdrant_store import qdrant_vector_store as vector_store
-
-# Custom cache implementation
-_query_cache: Dict[str, Dict[str, Any]] = {}
-_CACHE_TTL = 300  # 5 minutes
-
-def get_query_hash(query: str) -> str:
-    """Generate hash for query caching."""
-    return hashlib.md5(query.encode()).hexdigest()
-
-@lru_cache(maxsize=1000)
-def cached_similarity_search(query: str, k: int = 3) -> List[Any]:
-    """Cache similarity search results."""
-    cache_key = f"search_{get_query_hash(query)}_{k}"
-    
-    # Check cache
-    if cache_key in _query_cache:
-        cached_data = _query_cache[cache_key]
-        if time.time() - cached_data['timestamp'] < _CACHE_TTL:
-            return cached_data['results']
-    
-    # Perform search
-    results = vector_store.similarity_search(query, k=k)
-    _query_cache[cache_key] = {
-        'timestamp': time.time(),
-        'results': results
-    }
-    
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.services.hybrid_search import hybrid_similarity_search, ahybrid_similarity_search
+from app.services.stamp import StampWatcher
+from config.settings import (
+    QDRANT_COLLECTION_NAME, RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL, RETRIEVAL_CACHE_STAMP_PATH
+)
+
+class RetrievalCache:
+    """Thread-safe retrieval cache with size-based LRU eviction and a real TTL.
+
+    Entries are keyed by (query, filters, k, collection, search params). Invalidation works
+    across processes: upload scripts touch a stamp file, and every cache that
+    notices a newer stamp (checked at most once per second) drops its entries.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 300, stamp_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stamp_path = stamp_path
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._stamp = StampWatcher(stamp_path)
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query: str, filters: Optional[Dict[str, Any]], k: int, collection: str = QDRANT_COLLECTION_NAME,
+                 search_params=None):
+        frozen_filters = json.dumps(
+            {key: value for key, value in (filters or {}).items() if value},
+            sort_keys=True, default=str,
+        )
+        # Searches with a per-query hnsw_ef/exact override are cached apart from default ones
+        frozen_params = search_params.model_dump_json(exclude_none=True) if search_params is not None else None
+        return (query.strip(), frozen_filters, k, collection, frozen_params)
+
+    def _check_stamp(self):
+        if self._stamp.changed():
+            self._entries.clear()
+            self.invalidations += 1
+
+    def get(self, key):
+        """Return (hit, value) for a key, expiring stale entries."""
+        with self._lock:
+            self._check_stamp()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            stored_at, value = entry
+            if time.monotonic() - stored_at >= self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, collection: Optional[str] = None):
+        """Drop cached entries (for one collection, or all) in this process."""
+        with self._lock:
+            if collection is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[3] == collection]:
+                    del self._entries[key]
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+retrieval_cache = RetrievalCache(
+    max_entries=RETRIEVAL_CACHE_SIZE,
+    ttl_seconds=RETRIEVAL_CACHE_TTL,
+    stamp_path=RETRIEVAL_CACHE_STAMP_PATH,
+)
+
+def cached_similarity_search(query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None,
+                             search_params=None) -> List[Any]:
+    """Cache similarity search results, including metadata-filtered searches."""
+    key = retrieval_cache.make_key(query, filters, k, search_params=search_params)
+    hit, results = retrieval_cache.get(key)
+    if hit:
+        return results
+
+    results = hybrid_similarity_search(query, k=k, filters=filters, search_params=search_params)
+    retrieval_cache.set(key, results)
     return results
 
+async def acached_similarity_search(query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None,
+                                    search_params=None) -> List[Any]:
+    """Async similarity search sharing the retrieval cache with the sync path."""
+    key = retrieval_cache.make_key(query, filters, k, search_params=search_params)
+    hit, results = retrieval_cache.get(key)
+    if hit:
+        return results
+
+    results = await ahybrid_similarity_search(query, k=k, filters=filters, search_params=search_params)
+    retrieval_cache.set(key, results)
+    return results
+
+def invalidate_retrieval_cache(collection: Optional[str] = None):
+    """Invalidate cached retrievals here and in every other process sharing the stamp file."""
+    retrieval_cache.invalidate(collection)
+    if RETRIEVAL_CACHE_STAMP_PATH:
+        directory = os.path.dirname(RETRIEVAL_CACHE_STAMP_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(RETRIEVAL_CACHE_STAMP_PATH, "w") as f:
+            f.write(str(time.time()))
+
 def clear_cache():
     """Clear the cache."""
-    global _query_cache
-    _query_cache = {}
-    cached_similarity_search.cache_clear()
+    retrieval_cache.invalidate()
 
 # Mock the LangChain cache functions for compatibility
 def set_llm_cache(*args, **kwargs):
     pass
 
 class InMemoryCache:
-    pass
\ No newline at end of file
+    pass
@@ -0,0 +1,136 @@
+"""Sentence-aware chunking with parent-document mapping.
+
+Each source document is split into overlapping chunks of whole sentences.
+Every chunk keeps the parent's metadata plus its parent id and its character
+offsets in the parent text, so retrieved chunks of one parent can be merged
+back into a single passage.
+"""
+import hashlib
+import json
+import re
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+
+def parent_document_id(doc: Document) -> str:
+    """Stable id of a source document: its doc_id when assigned at ingest, else a hash of content and metadata."""
+    if doc.metadata.get("doc_id"):
+        return str(doc.metadata["doc_id"])
+    payload = json.dumps({"content": doc.page_content, "metadata": doc.metadata}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+def sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """(start, end) offsets of the sentences in text, without surrounding whitespace."""
+    spans = []
+    start = 0
+    for boundary in SENTENCE_BOUNDARY.finditer(text):
+        spans.append((start, boundary.start()))
+        start = boundary.end()
+    spans.append((start, len(text.rstrip())))
+    return [(s, e) for s, e in spans if e > s]
+
+def _split_long_span(text: str, start: int, end: int, chunk_size: int) -> List[Tuple[int, int]]:
+    # A single sentence longer than a chunk is cut at word boundaries
+    pieces = []
+    while end - start > chunk_size:
+        cut = text.rfind(" ", start, start + chunk_size)
+        if cut <= start:
+            cut = start + chunk_size
+        pieces.append((start, cut))
+        start = cut + 1 if text[cut:cut + 1] == " " else cut
+    pieces.append((start, end))
+    return pieces
+
+def chunk_spans(text: str, chunk_size: int = 800, chunk_overlap: int = 150) -> List[Tuple[int, int]]:
+    """Group sentences into chunks of at most chunk_size characters.
+
+    Consecutive chunks share their trailing/leading sentences, up to
+    chunk_overlap characters.
+    """
+    sentences = []
+    for start, end in sentence_spans(text):
+        sentences.extend(_split_long_span(text, start, end, chunk_size))
+
+    chunks = []
+    first = 0
+    while first < len(sentences):
+        last = first
+        while last + 1 < len(sentences) and sentences[last + 1][1] - sentences[first][0] <= chunk_size:
+            last += 1
+        chunks.append((sentences[first][0], sentences[last][1]))
+        if last + 1 >= len(sentences):
+            break
+
+        # Step back over trailing sentences that fit into the overlap
+        next_first = last + 1
+        while next_first - 1 > first and sentences[last][1] - sentences[next_first - 1][0] <= chunk_overlap:
+            next_first -= 1
+        first = next_first
+    return chunks
+
+def chunk_document(doc: Document, chunk_size: int = 800, chunk_overlap: int = 150) -> List[Document]:
+    """Split one document into chunk Documents carrying parent id and offsets."""
+    parent_id = parent_document_id(doc)
+    spans = chunk_spans(doc.page_content, chunk_size, chunk_overlap)
+    return [
+        Document(
+            page_content=doc.page_content[start:end],
+            metadata={
+                **doc.metadata,
+                "parent_id": parent_id,
+                "chunk_index": index,
+                "chunk_count": len(spans),
+                "start": start,
+                "end": end,
+            },
+        )
+        for index, (start, end) in enumerate(spans)
+    ]
+
+def chunk_documents(documents: List[Document], chunk_size: int = 800, chunk_overlap: int = 150) -> List[Document]:
+    return [chunk for doc in documents for chunk in chunk_document(doc, chunk_size, chunk_overlap)]
+
+def merge_chunks_by_parent(documents: List[Document]) -> List[Document]:
+    """Merge retrieved chunks of the same parent into one passage, ordered by rank of the best chunk.
+
+    Overlapping or adjacent chunks are stitched using their offsets; gaps are
+    marked with an ellipsis. Documents that are not chunks pass through.
+    """
+    groups = {}
+    order = []
+    for doc in documents:
+        parent_id = doc.metadata.get("parent_id")
+        if parent_id is None:
+            order.append(doc)
+            continue
+        if parent_id not in groups:
+            groups[parent_id] = []
+            order.append(parent_id)
+        groups[parent_id].append(doc)
+
+    merged = []
+    for item in order:
+        if isinstance(item, Document):
+            merged.append(item)
+            continue
+
+        chunks = sorted(groups[item], key=lambda d: d.metadata["start"])
+        text = chunks[0].page_content
+        end = chunks[0].metadata["end"]
+        for chunk in chunks[1:]:
+            start = chunk.metadata["start"]
+            if chunk.metadata["end"] <= end:
+                continue
+            if start <= end:
+                text += chunk.page_content[end - start:]
+            elif start - end <= 3:  # Adjacent chunks, only whitespace in between
+                text += " " + chunk.page_content
+            else:
+                text += " … " + chunk.page_content
+            end = chunk.metadata["end"]
+
+        metadata = {**chunks[0].metadata, "end": end, "merged_chunks": len(chunks)}
+        merged.append(Document(page_content=text, metadata=metadata))
+    return merged
@@ -0,0 +1,137 @@
+"""Token-budgeted packing of retrieved passages into the generation prompt.
+
+Only the current turn's tool results are packed. They are split into
+passages, ranked by query-term overlap, stripped of near-duplicates (the
+same text reached through two tool calls, or a chunk contained in a merged
+parent) and added while they fit the token budget; a passage that does not
+fit is skipped so smaller ones can still fill the remaining space. The budget
+is the smaller of CONTEXT_TOKEN_BUDGET and what the model window leaves after
+the rest of the prompt and the answer's max_tokens.
+"""
+import re
+import threading
+from typing import Dict, List, Optional
+
+from app.services.tokens import get_token_counter
+from config.settings import LLM_CONTEXT_WINDOW, CONTEXT_TOKEN_BUDGET, CONTEXT_DUPLICATE_THRESHOLD
+
+# Tool results are "\n\n"-joined passages, each starting with its title line
+PASSAGE_BOUNDARY = re.compile(r"\n\n(?=📄)")
+PASSAGE_SEPARATOR = "\n\n"
+
+def split_passages(text: str) -> List[str]:
+    return [passage.strip() for passage in PASSAGE_BOUNDARY.split(text or "") if passage.strip()]
+
+def query_terms(question: str) -> List[str]:
+    return [word for word in re.findall(r"\w+", question.lower()) if len(word) > 2]
+
+def score_passage(passage: str, terms: List[str]) -> int:
+    text = passage.lower()
+    return sum(text.count(term) for term in terms)
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def is_near_duplicate(shingles: set, kept: List[set], threshold: float) -> bool:
+    """Overlap over the smaller passage, so a passage contained in another counts as a duplicate."""
+    for other in kept:
+        smaller = min(len(shingles), len(other))
+        if smaller and len(shingles & other) / smaller >= threshold:
+            return True
+    return False
+
+def context_token_budget(prompt_tokens: int, max_tokens: int, window: int = LLM_CONTEXT_WINDOW,
+                         cap: int = CONTEXT_TOKEN_BUDGET) -> int:
+    """Context tokens that fit next to the rest of the prompt and the answer."""
+    return max(0, min(cap, window - max_tokens - prompt_tokens))
+
+class PackedContext:
+    """The packed context text and how it was filled."""
+
+    def __init__(self, text: str, tokens: int, budget: int, passages: int, duplicates: int, skipped: int,
+                 truncated: bool = False):
+        self.text = text
+        self.tokens = tokens
+        self.budget = budget
+        self.passages = passages
+        self.duplicates = duplicates
+        self.skipped = skipped
+        self.truncated = truncated
+
+    def describe(self) -> str:
+        return (f"{self.tokens}/{self.budget} tokens from {self.passages} passages "
+                f"({self.duplicates} duplicates removed, {self.skipped} over budget)")
+
+def pack_context(texts: List[str], question: str, budget: int, counter=None,
+                 duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD) -> PackedContext:
+    """Pack the passages of texts (tool results), most relevant first, into at most budget tokens."""
+    counter = counter or get_token_counter()
+    passages = [passage for text in texts for passage in split_passages(text)]
+    terms = query_terms(question)
+    # Stable sort: ties keep the retrieval (rerank) order
+    ranked = sorted(passages, key=lambda passage: score_passage(passage, terms), reverse=True)
+
+    kept, kept_shingles = [], []
+    used = duplicates = skipped = 0
+    separator_tokens = counter.count(PASSAGE_SEPARATOR)
+    for passage in ranked:
+        shingles = _shingles(passage)
+        if is_near_duplicate(shingles, kept_shingles, duplicate_threshold):
+            duplicates += 1
+            continue
+        cost = counter.count(passage) + (separator_tokens if kept else 0)
+        if used + cost > budget:
+            skipped += 1
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+        used += cost
+
+    truncated = False
+    if not kept and ranked and budget > 0:
+        # Nothing fits whole: send the start of the best passage
+        kept, truncated = [counter.truncate(ranked[0], budget)], True
+        skipped -= 1
+
+    text = PASSAGE_SEPARATOR.join(kept)
+    return PackedContext(text, counter.count(text), budget, len(kept), duplicates, skipped, truncated)
+
+class ContextPackingStats:
+    """Process-wide packing counters for /metrics."""
+
+    def __init__(self):
+        self.requests = 0
+        self.packed_tokens = 0
+        self.budget_tokens = 0
+        self.passages = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.truncated = 0
+        self._lock = threading.Lock()
+
+    def record(self, packed: PackedContext):
+        with self._lock:
+            self.requests += 1
+            self.packed_tokens += packed.tokens
+            self.budget_tokens += packed.budget
+            self.passages += packed.passages
+            self.duplicates += packed.duplicates
+            self.skipped += packed.skipped
+            self.truncated += int(packed.truncated)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "avg_packed_tokens": round(self.packed_tokens / self.requests, 1) if self.requests else None,
+                "fill_ratio": round(self.packed_tokens / self.budget_tokens, 4) if self.budget_tokens else None,
+                "passages": self.passages,
+                "duplicates_removed": self.duplicates,
+                "skipped_over_budget": self.skipped,
+                "truncated": self.truncated,
+            }
+
+context_packing_stats = ContextPackingStats()
@@ -0,0 +1,147 @@
+import asyncio
+import queue
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 2)
+
+class BatchingEmbeddings(Embeddings):
+    """Embeddings wrapper that merges concurrent embed_query calls into one forward pass.
+
+    Callers enqueue their query and wait on a future. A single worker thread
+    collects queued queries until max_batch_size is reached or max_wait_ms has
+    passed since the first one arrived, then embeds them with one
+    embed_documents call. Document embedding (ingestion) is already batched
+    and goes straight to the wrapped model.
+    """
+
+    def __init__(self, base: Embeddings, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.base = base
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.forward_seconds = 0.0
+        self._latencies_ms = deque(maxlen=1000)
+        self._batch_sizes = deque(maxlen=1000)
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a query for the next batch and return a future for its vector."""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # Wait on the batch future directly; no executor thread is tied up
+        return await asyncio.wrap_future(self.submit(text))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._flush(batch)
+
+    def _flush(self, batch):
+        # Identical queries in one batch are embedded once
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+
+        start_time = time.perf_counter()
+        try:
+            vectors = self.base.embed_documents(texts)
+        except Exception as e:
+            logger.error(f"❌ Batched embedding failed for {len(texts)} queries: {e}")
+            with self._stats_lock:
+                self.errors += len(batch)
+            for _, future, _ in batch:
+                self._resolve(future, exception=e)
+            return
+        end_time = time.perf_counter()
+
+        by_text = dict(zip(texts, vectors))
+        for text, future, _ in batch:
+            self._resolve(future, result=by_text[text])
+
+        with self._stats_lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self.forward_seconds += end_time - start_time
+            self._batch_sizes.append(len(batch))
+            self._latencies_ms.extend((end_time - enqueued) * 1000 for _, _, enqueued in batch)
+
+    @staticmethod
+    def _resolve(future, result=None, exception=None):
+        # The caller may have been cancelled while waiting
+        if future.cancelled():
+            return
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def stats(self):
+        """Throughput and latency metrics of the batcher."""
+        with self._stats_lock:
+            latencies = list(self._latencies_ms)
+            batch_sizes = list(self._batch_sizes)
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "errors": self.errors,
+                "queue_depth": self._queue.qsize(),
+                "avg_batch_size": round(sum(batch_sizes) / len(batch_sizes), 2) if batch_sizes else None,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "latency_p50_ms": percentile(latencies, 50),
+                "latency_p95_ms": percentile(latencies, 95),
+                "avg_forward_ms": round(self.forward_seconds * 1000 / self.batches, 2) if self.batches else None,
+                "queries_per_forward_second": round(self.requests / self.forward_seconds, 1) if self.forward_seconds else None,
+            }
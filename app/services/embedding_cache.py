@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, single writer assumed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.tsv"
+META_FILE = "meta.json"
+LOCK_FILE = ".lock"
+
+def normalize_query(text: str) -> str:
+    """Canonical form used both as cache key and as the text that gets embedded."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def cache_key(model_name: str, text: str) -> str:
+    return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+class MmapEmbeddingStore:
+    """Append-only on-disk vector store: a float32 matrix plus a key -> row index.
+
+    Vectors are appended to a raw float32 file that readers memory-map, and
+    each row is registered in a tab-separated index file. The row is always
+    written before its index line, so a reader that sees a key can read its
+    vector. Appends take an exclusive file lock, so several worker processes
+    can share one store; read-only workers never write.
+    """
+
+    def __init__(self, directory: str, dim: int, read_only: bool = False):
+        self.directory = directory
+        self.dim = dim
+        self.read_only = read_only
+        self.vectors_path = os.path.join(directory, VECTORS_FILE)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.lock = threading.Lock()
+
+        self._rows = {}
+        self._index_offset = 0
+        self._matrix = None
+
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+            meta_path = os.path.join(directory, META_FILE)
+            if not os.path.exists(meta_path):
+                with open(meta_path, "w") as f:
+                    json.dump({"dim": dim, "dtype": "float32"}, f)
+            for path in (self.vectors_path, self.index_path):
+                open(path, "ab").close()
+
+        self._refresh_index()
+
+    def __len__(self):
+        return len(self._rows)
+
+    @contextmanager
+    def _file_lock(self):
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh_index(self):
+        """Pick up index lines appended since the last read (by any process)."""
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) == self._index_offset:
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # Partially written line; read it next time
+                key, row = line.rstrip("\n").split("\t")
+                self._rows[key] = int(row)
+                self._index_offset += len(line.encode("utf-8"))
+
+    def _row_vector(self, row: int) -> Optional[np.ndarray]:
+        if self._matrix is None or row >= self._matrix.shape[0]:
+            rows_on_disk = os.path.getsize(self.vectors_path) // (self.dim * 4)
+            if row >= rows_on_disk:
+                return None
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows_on_disk, self.dim))
+        return self._matrix[row]
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self.lock:
+            row = self._rows.get(key)
+            if row is None:
+                self._refresh_index()
+                row = self._rows.get(key)
+            if row is None:
+                return None
+            vector = self._row_vector(row)
+            return vector.tolist() if vector is not None else None
+
+    def put(self, key: str, vector: List[float]):
+        if self.read_only:
+            return
+        data = np.asarray(vector, dtype=np.float32)
+        if data.shape != (self.dim,):
+            return
+
+        with self.lock, self._file_lock():
+            self._refresh_index()
+            if key in self._rows:
+                return
+            with open(self.vectors_path, "ab") as f:
+                row = f.tell() // (self.dim * 4)
+                f.write(data.tobytes())
+            line = f"{key}\t{row}\n"
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._rows[key] = row
+            self._index_offset += len(line.encode("utf-8"))
+
+class CachedEmbeddings(Embeddings):
+    """Query-embedding cache: in-memory LRU in front of a persistent mmap store.
+
+    Queries are normalized (whitespace, case) and keyed with the model name.
+    Document embeddings (ingestion) bypass the cache.
+    """
+
+    def __init__(self, inner: Embeddings, model_name: str, directory: Optional[str] = None,
+                 max_memory_entries: int = 10000, read_only: bool = False):
+        self.inner = inner
+        self.model_name = model_name
+        self.max_memory_entries = max_memory_entries
+        self.read_only = read_only
+        self.directory = (
+            os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)) if directory else None
+        )
+
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk: Optional[MmapEmbeddingStore] = None
+        self._open_existing_store()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _open_existing_store(self):
+        # The vector size is only known once the first vector exists, so the
+        # store is opened here if it was created earlier, otherwise on first put
+        if not self.directory:
+            return
+        meta_path = os.path.join(self.directory, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                dim = json.load(f)["dim"]
+            self._disk = MmapEmbeddingStore(self.directory, dim, read_only=self.read_only)
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        if self._disk is None and self.read_only:
+            self._open_existing_store()  # Another worker may have created it since
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+        vector = self._disk.get(key) if self._disk is not None else None
+        with self._lock:
+            if vector is not None:
+                self.disk_hits += 1
+                self._remember(key, vector)
+            else:
+                self.misses += 1
+        return vector
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _store(self, key: str, vector: List[float]):
+        with self._lock:
+            self._remember(key, vector)
+            if self._disk is None and self.directory and not self.read_only:
+                self._disk = MmapEmbeddingStore(self.directory, len(vector))
+        if self._disk is not None:
+            try:
+                self._disk.put(key, vector)
+            except OSError as e:
+                logger.warning(f"⚠️ Could not persist query embedding: {e}")
+
+    def embed_query(self, text: str) -> List[float]:
+        text = normalize_query(text)
+        key = cache_key(self.model_name, text)
+        vector = self._lookup(key)
+        if vector is None:
+            vector = self.inner.embed_query(text)
+            self._store(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        text = normalize_query(text)
+        key = cache_key(self.model_name, text)
+        vector = self._lookup(key)
+        if vector is None:
+            vector = await self.inner.aembed_query(text)
+            self._store(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.inner.aembed_documents(texts)
+
+    def stats(self):
+        """Hit/miss counters of both tiers, plus the wrapped model's stats."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            stats = {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk) if self._disk is not None else 0,
+            }
+        if hasattr(self.inner, "stats"):
+            stats["backend"] = self.inner.stats()
+        return stats
@@ -0,0 +1,206 @@
+"""Single-pass extraction of metadata filters from a user query.
+
+The vocabularies are compiled once into one alternation pattern (longest
+phrase first) and a word -> phrase index. Extraction tokenizes the query
+once, finds whole-phrase matches in a single scan and partial (word) matches
+through the index, then keeps the most specific candidate per field: most
+matched words first, then a whole-phrase over a partial match, then
+vocabulary order. So "ml engineering" wins over "engineering" even when only
+the words "ml" and "engineering" occur apart.
+
+Runs on every chat turn (graph, answer cache) and backs /retrieval/analyze.
+Benchmark: `python -m app.test.bench_filter_extraction`.
+"""
+import re
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Query phrase -> metadata value, in priority order for ties
+DEPARTMENTS = {
+    "ai research": "AI Research",
+    "ml engineering": "ML Engineering",
+    "data science": "Data Science",
+    "product": "Product",
+    "engineering": "Engineering",
+    "r&d": "R&D",
+    "analytics": "Analytics",
+    "platform": "Platform",
+}
+
+DOC_TYPES = {
+    "research paper": "Research Paper",
+    "technical guide": "Technical Guide",
+    "api documentation": "API Documentation",
+    "best practices": "Best Practices",
+    "implementation guide": "Implementation Guide",
+    "technical report": "Technical Report",
+    "system design": "System Design",
+    "tutorial": "Tutorial",
+    "whitepaper": "Whitepaper",
+    "case study": "Case Study",
+    "standard operating procedure": "Standard Operating Procedure",
+    "paper": "Research Paper",
+    "guide": "Technical Guide",
+    "documentation": "API Documentation",
+    "report": "Technical Report",
+    "design": "System Design",
+}
+
+SECURITY_LEVELS = {
+    "confidential": "Confidential",
+    "internal": "Internal",
+    "public": "Public",
+    "restricted": "Restricted",
+}
+
+VOCABULARIES = {
+    "department": DEPARTMENTS,
+    "doc_type": DOC_TYPES,
+    "security_level": SECURITY_LEVELS,
+}
+
+# Words asking for recent documents, and the year they map to when no year is given
+RECENT_WORDS = frozenset({"recent", "latest", "new", "current"})
+RECENT_YEAR = 2024
+
+YEAR = r"(20[1-2][0-9])"
+YEAR_PATTERN = re.compile(rf"\b{YEAR}\b")
+YEAR_RANGE_PATTERNS = [
+    # "2020-2023", "2020 – 2023", "between 2020 and 2023", "from 2020 to 2023"
+    (re.compile(rf"\b{YEAR}\s*(?:-|–|—|to|through|until|and)\s*{YEAR}\b", re.IGNORECASE),
+     lambda a, b: {"gte": min(a, b), "lte": max(a, b)}),
+    # A bare "from 2022" stays an exact year; "from 2020 to 2023" is the range above
+    (re.compile(rf"\b(?:since|starting(?:\s+from)?)\s+{YEAR}\b|\b{YEAR}\s+(?:onwards|onward|and later|or later)\b", re.IGNORECASE),
+     lambda a: {"gte": a}),
+    (re.compile(rf"\b(?:after|post)\s+{YEAR}\b", re.IGNORECASE), lambda a: {"gte": a + 1}),
+    (re.compile(rf"\b(?:before|prior to|pre)\s+{YEAR}\b", re.IGNORECASE), lambda a: {"lte": a - 1}),
+    (re.compile(rf"\b(?:until|through|up to|by)\s+{YEAR}\b|\b{YEAR}\s+(?:and earlier|or earlier)\b", re.IGNORECASE),
+     lambda a: {"lte": a}),
+]
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:&[a-z0-9]+)*")
+
+def normalize(token: str) -> str:
+    """Fold simple plurals ("reports" -> "report") so both vocabulary and query forms match."""
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
+def tokenize(query: str) -> List[str]:
+    return TOKEN_PATTERN.findall(query.lower())
+
+def extract_year_filter(query: str):
+    """Year filter of a query: a {"gte"/"lte"} range, a single year, or None."""
+    match = YEAR_PATTERN.search(query)
+    if match is None:
+        return None  # The common case: no range pattern can match either
+    for pattern, to_range in YEAR_RANGE_PATTERNS:
+        range_match = pattern.search(query)
+        if range_match:
+            return to_range(*[int(group) for group in range_match.groups() if group])
+    return int(match.group(1))
+
+class FilterExtractor:
+    """Vocabulary matcher compiled once; extract() is one tokenization and one regex scan per query."""
+
+    def __init__(self, vocabularies: Dict[str, Dict[str, str]] = VOCABULARIES):
+        self.vocabularies = vocabularies
+        self._entries: List[Tuple[str, str, str, int]] = []  # (field, phrase, value, word count)
+        self._by_phrase: Dict[str, List[int]] = {}
+        self._by_word: Dict[str, List[int]] = {}
+        for field, vocabulary in vocabularies.items():
+            for phrase, value in vocabulary.items():
+                entry = len(self._entries)
+                words = [normalize(word) for word in tokenize(phrase)]
+                self._entries.append((field, " ".join(words), value, len(words)))
+                self._by_phrase.setdefault(" ".join(words), []).append(entry)
+                for word in set(words):
+                    self._by_word.setdefault(word, []).append(entry)
+
+        # Phrases are matched against the space-joined tokens; longest alternatives first
+        phrases = sorted(self._by_phrase, key=len, reverse=True)
+        self._pattern = re.compile(r"(?<!\S)(?:" + "|".join(map(re.escape, phrases)) + r")(?!\S)")
+
+    def _match(self, tokens: List[str]) -> Dict[int, Tuple[int, bool]]:
+        """Entry -> (matched words, whole-phrase match) for every vocabulary entry the query touches."""
+        tokens = [normalize(token) for token in tokens]
+        matches: Dict[int, Tuple[int, bool]] = {}
+        for match in self._pattern.finditer(" ".join(tokens)):
+            for entry in self._by_phrase[match.group(0)]:
+                matches[entry] = (self._entries[entry][3], True)
+        for word in set(tokens):
+            for entry in self._by_word.get(word, ()):
+                matched, exact = matches.get(entry, (0, False))
+                if not exact:
+                    matches[entry] = (matched + 1, False)
+        return matches
+
+    def _best(self, matches: Dict[int, Tuple[int, bool]]) -> Dict[str, int]:
+        best: Dict[str, int] = {}
+        for entry, (matched, exact) in matches.items():
+            field = self._entries[entry][0]
+            current = best.get(field)
+            # Entries are numbered in vocabulary order, so a lower number wins ties
+            if current is None or (matched, exact, -entry) > (*matches[current], -current):
+                best[field] = entry
+        return best
+
+    def extract(self, query: str) -> Dict[str, Any]:
+        """Filters for a query: vocabulary fields, year (or year range) and the recent-documents default."""
+        tokens = tokenize(query)
+        filters: Dict[str, Any] = {
+            field: self._entries[entry][2] for field, entry in self._best(self._match(tokens)).items()
+        }
+        # Fields in vocabulary order, as the filters are part of cache keys and log lines
+        filters = {field: filters[field] for field in self.vocabularies if field in filters}
+
+        year = extract_year_filter(query)
+        if year is None and not RECENT_WORDS.isdisjoint(tokens):
+            year = RECENT_YEAR
+        if year is not None:
+            filters["year"] = year
+        return filters
+
+    def extract_batch(self, queries: Iterable[str]) -> List[Dict[str, Any]]:
+        """Filters for many queries; repeated queries are extracted once."""
+        queries = list(queries)
+        extracted = {query: self.extract(query) for query in dict.fromkeys(queries)}
+        return [_copy(extracted[query]) for query in queries]
+
+    def analyze(self, query: str) -> Dict[str, Any]:
+        """Why each vocabulary entry did or did not match, for debugging extraction."""
+        tokens = tokenize(query)
+        matches = self._match(tokens)
+        best = self._best(matches)
+        fields: Dict[str, List[Dict[str, Any]]] = {field: [] for field in self.vocabularies}
+        for entry, (field, phrase, value, words) in enumerate(self._entries):
+            matched, exact = matches.get(entry, (0, False))
+            fields[field].append({
+                "phrase": phrase,
+                "value": value,
+                "found": matched > 0,
+                "match_type": "exact" if exact else "partial" if matched else "none",
+                "matched_words": matched,
+                "selected": best.get(field) == entry,
+            })
+        return {
+            "tokens": tokens,
+            "fields": fields,
+            "years": {
+                "found_years": YEAR_PATTERN.findall(query),
+                "year_filter": extract_year_filter(query),
+                "recent_words": sorted(RECENT_WORDS.intersection(tokens)),
+            },
+        }
+
+    def values(self, field: str) -> List[str]:
+        """Distinct values a field can be extracted as."""
+        return list(dict.fromkeys(self.vocabularies[field].values()))
+
+def _copy(filters: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: dict(value) if isinstance(value, dict) else value for key, value in filters.items()}
+
+filter_extractor = FilterExtractor()
+
+def extract_filters(query: str) -> Dict[str, Any]:
+    return filter_extractor.extract(query)
+
+def extract_filters_batch(queries: Iterable[str]) -> List[Dict[str, Any]]:
+    return filter_extractor.extract_batch(queries)
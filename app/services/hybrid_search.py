@@ -0,0 +1,76 @@
+import asyncio
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from app.services.bm25 import get_bm25_index
+from app.services.qdrant_store import get_vector_store, get_async_vector_store, build_qdrant_filter, DEFAULT_SEARCH_PARAMS
+from config.settings import HYBRID_SEARCH, HYBRID_CANDIDATES, RRF_K
+
+# Runs the lexical search next to the (blocking) sync dense search
+_lexical_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bm25")
+
+def document_key(doc: Document) -> str:
+    """Identity of a document across retrievers (the corpus repeats texts with different metadata).
+
+    Chunks are identified by parent id and chunk index; otherwise store bookkeeping fields such
+    as Qdrant's "_id" and "_collection_name" are ignored.
+    """
+    if "parent_id" in doc.metadata and "chunk_index" in doc.metadata:
+        return f"{doc.metadata['parent_id']}:{doc.metadata['chunk_index']}"
+    metadata = {key: value for key, value in doc.metadata.items() if not key.startswith("_")}
+    payload = json.dumps({"content": doc.page_content, "metadata": metadata}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int = 60, limit: Optional[int] = None) -> List[Document]:
+    """Merge ranked lists: each document scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = document_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, doc)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked[:limit]]
+
+def hybrid_similarity_search(query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None,
+                             search_params=None) -> List[Document]:
+    """Dense search fused with BM25; plain dense search when hybrid search is off or BM25 is unavailable.
+
+    search_params (see build_search_params) default to the configured hnsw_ef/exact settings.
+    """
+    qdrant_filter = build_qdrant_filter(filters)
+    search_params = search_params or DEFAULT_SEARCH_PARAMS
+    bm25 = get_bm25_index() if HYBRID_SEARCH else None
+    if bm25 is None:
+        return get_vector_store().similarity_search(query, k=k, filter=qdrant_filter, search_params=search_params)
+
+    candidates = max(k, HYBRID_CANDIDATES)
+    lexical = _lexical_executor.submit(bm25.search, query, candidates, filters)
+    dense = get_vector_store().similarity_search(query, k=candidates, filter=qdrant_filter, search_params=search_params)
+    return reciprocal_rank_fusion([dense, lexical.result()], k=RRF_K, limit=k)
+
+async def ahybrid_similarity_search(query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None,
+                                    search_params=None) -> List[Document]:
+    """Async hybrid search: the dense and BM25 searches run concurrently."""
+    qdrant_filter = build_qdrant_filter(filters)
+    search_params = search_params or DEFAULT_SEARCH_PARAMS
+    bm25 = get_bm25_index() if HYBRID_SEARCH else None
+    if bm25 is None:
+        return await get_async_vector_store().asimilarity_search(
+            query, k=k, filter=qdrant_filter, search_params=search_params
+        )
+
+    candidates = max(k, HYBRID_CANDIDATES)
+    dense, lexical = await asyncio.gather(
+        get_async_vector_store().asimilarity_search(
+            query, k=candidates, filter=qdrant_filter, search_params=search_params
+        ),
+        asyncio.to_thread(bm25.search, query, candidates, filters),
+    )
+    return reciprocal_rank_fusion([dense, lexical], k=RRF_K, limit=k)
@@ -0,0 +1,433 @@
+"""Streaming, parallel and resumable ingestion into Qdrant.
+
+The pipeline has three stages that overlap:
+
+1. read   - source documents are parsed incrementally (JSON array or JSONL),
+            chunked, and grouped into batches of whole documents
+2. embed  - batches are embedded in a process pool, each worker holding its
+            own copy of the embedding model
+3. upsert - embedded batches are upserted with a bounded number of requests
+            in flight
+
+Point ids are derived from the document identity and the chunk index, so
+re-sending a batch after a crash overwrites instead of duplicating. A
+checkpoint file records how many source documents are fully stored; a
+restarted run skips them.
+
+Runs are incremental: every point carries its document's content hash, and
+the existing collection is scanned first so unchanged documents are not
+embedded again. Changed documents are re-chunked and their leftover chunks
+deleted; documents missing from the source are removed.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+import uuid
+import logging
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+from qdrant_client.models import PointIdsList, PointStruct
+
+from app.services.chunking import chunk_document
+
+logger = logging.getLogger(__name__)
+
+POINT_ID_NAMESPACE = uuid.UUID("6f1c9a52-3d0e-4c41-9b7a-2f5d8e6a1c3b")
+
+# Metadata fields that identify a source record when it has no explicit id
+IDENTITY_FIELDS = ("url", "title")
+
+def point_id(chunk: Document) -> str:
+    """Deterministic Qdrant point id of a chunk (parent id + chunk index)."""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{chunk.metadata['parent_id']}:{chunk.metadata['chunk_index']}"))
+
+def iter_json_records(path: str, read_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """Yield records from a JSON array or a JSONL file without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(read_size)
+        position = len(buffer) - len(buffer.lstrip())
+        in_array = buffer[position:position + 1] == "["
+        if in_array:
+            position += 1
+
+        while True:
+            # Skip whitespace and array separators between records
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n,":
+                    position += 1
+                if position < len(buffer):
+                    break
+                more = f.read(read_size)
+                if not more:
+                    return
+                buffer, position = more, 0
+
+            if in_array and buffer[position] == "]":
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                more = f.read(read_size)
+                if not more:
+                    raise
+                buffer, position = buffer[position:] + more, 0
+                continue
+
+            yield record
+            position = end
+            if position > read_size:
+                buffer, position = buffer[position:], 0
+
+def record_to_document(record: Dict[str, Any]) -> Document:
+    return Document(page_content=record["content"], metadata=record["metadata"])
+
+def document_identity(record: Dict[str, Any], occurrences: Counter) -> str:
+    """Stable id of a source record that survives edits to its text.
+
+    An explicit "id" (or metadata "doc_id") is used as is. Otherwise the id
+    hashes IDENTITY_FIELDS plus the record's occurrence number among records
+    sharing them, since the generated corpus reuses urls and titles.
+    """
+    metadata = record.get("metadata") or {}
+    explicit = record.get("id") or metadata.get("doc_id")
+    if explicit:
+        return str(explicit)
+    key = "|".join(str(metadata.get(field, "")) for field in IDENTITY_FIELDS)
+    occurrences[key] += 1
+    return hashlib.sha1(f"{key}#{occurrences[key]}".encode("utf-8")).hexdigest()[:16]
+
+def iter_source_documents(records: Iterable[Dict[str, Any]]) -> Iterator[Document]:
+    """Source Documents with their identity in metadata["doc_id"]."""
+    occurrences: Counter = Counter()
+    for record in records:
+        doc = record_to_document(record)
+        doc.metadata["doc_id"] = document_identity(record, occurrences)
+        yield doc
+
+def content_hash(doc: Document, chunk_size: int, chunk_overlap: int) -> str:
+    """Hash of everything that determines a document's points: text, metadata and chunking."""
+    metadata = {key: value for key, value in doc.metadata.items() if key not in ("doc_id", "content_hash")}
+    payload = json.dumps({"content": doc.page_content, "metadata": metadata, "chunking": [chunk_size, chunk_overlap]},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def scan_collection(client, collection_name: str, page_size: int = 1024) -> Tuple[Dict[str, Dict[str, Any]], List[Any]]:
+    """Map doc_id -> {"hash", "ids"} of the points already stored, plus the ids of points without a doc_id.
+
+    Only the two bookkeeping payload fields are fetched, never vectors.
+    """
+    existing: Dict[str, Dict[str, Any]] = {}
+    untracked: List[Any] = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=page_size,
+            offset=offset,
+            with_payload=["metadata.doc_id", "metadata.content_hash"],
+            with_vectors=False,
+        )
+        for point in points:
+            metadata = (point.payload or {}).get("metadata") or {}
+            doc_id = metadata.get("doc_id")
+            if doc_id is None:
+                untracked.append(point.id)
+                continue
+            entry = existing.setdefault(doc_id, {"hash": metadata.get("content_hash"), "ids": set()})
+            if entry["hash"] != metadata.get("content_hash"):
+                entry["hash"] = None  # Partially updated document: re-index it
+            entry["ids"].add(str(point.id))
+        if offset is None:
+            return existing, untracked
+
+class Batch:
+    """Chunks of a contiguous range of source documents [first_document, end_document)."""
+
+    def __init__(self, first_document: int):
+        self.first_document = first_document
+        self.end_document = first_document
+        self.chunks: List[Document] = []
+        self.vectors = None
+        self.stale_ids: List[str] = []  # Chunks of changed documents that no longer exist
+
+# Process-pool worker state: one embedding model per worker process
+_worker_embeddings = None
+
+def _init_embedding_worker(embeddings_factory, threads_per_worker: int):
+    global _worker_embeddings
+    if threads_per_worker:
+        try:
+            import torch
+            torch.set_num_threads(threads_per_worker)
+        except ImportError:
+            pass
+    _worker_embeddings = embeddings_factory()
+
+def _embed_texts(texts: List[str]):
+    start_time = time.perf_counter()
+    vectors = _worker_embeddings.embed_documents(texts)
+    return vectors, time.perf_counter() - start_time
+
+class IngestionCheckpoint:
+    """Number of leading source documents that are fully stored, persisted atomically."""
+
+    def __init__(self, path: Optional[str], fingerprint: Dict[str, Any]):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.completed_documents = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get("fingerprint") == fingerprint:
+                self.completed_documents = state["completed_documents"]
+            else:
+                print(f"⚠️ Checkpoint {path} belongs to another source or collection, starting over")
+
+    def save(self, completed_documents: int):
+        self.completed_documents = completed_documents
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"fingerprint": self.fingerprint, "completed_documents": completed_documents,
+                       "updated_at": time.time()}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+class IngestionPipeline:
+    """Read -> embed -> upsert pipeline with bounded work in flight at every stage."""
+
+    def __init__(self, client, collection_name: str, embeddings_factory, embed_workers: int = 2,
+                 batch_size: int = 256, max_inflight_upserts: int = 4, chunk_size: int = 800,
+                 chunk_overlap: int = 150, threads_per_worker: int = 0, report_every: int = 10,
+                 existing: Optional[Dict[str, Dict[str, Any]]] = None, untracked_ids: Optional[List[Any]] = None):
+        self.client = client
+        self.collection_name = collection_name
+        self.embeddings_factory = embeddings_factory
+        self.embed_workers = embed_workers
+        self.batch_size = batch_size
+        self.max_inflight_upserts = max(1, max_inflight_upserts)
+        self.max_inflight_embeddings = max(1, embed_workers) * 2
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.threads_per_worker = threads_per_worker
+        self.report_every = report_every
+        # Result of scan_collection for incremental runs; None ingests every document
+        self.existing = existing
+        self.untracked_ids = untracked_ids or []
+        self._seen: Set[str] = set()
+
+        self.stats = {
+            "documents_read": 0, "documents_skipped": 0, "chunks": 0, "points_upserted": 0, "batches": 0,
+            "documents_new": 0, "documents_changed": 0, "documents_unchanged": 0, "documents_removed": 0,
+            "points_deleted": 0,
+            "read_seconds": 0.0, "embed_seconds": 0.0, "upsert_seconds": 0.0, "wall_seconds": 0.0,
+        }
+
+    def _batches(self, documents: Iterable[Document], skip_documents: int) -> Iterator[Batch]:
+        batch = Batch(skip_documents)
+        iterator = iter(documents)
+        ordinal = 0
+        while True:
+            start_time = time.perf_counter()
+            doc = next(iterator, None)
+            if doc is None:
+                self.stats["read_seconds"] += time.perf_counter() - start_time
+                break
+            self._seen.add(doc.metadata.get("doc_id"))
+            if ordinal < skip_documents:
+                ordinal += 1
+                self.stats["documents_skipped"] += 1
+                self.stats["read_seconds"] += time.perf_counter() - start_time
+                continue
+
+            ordinal += 1
+            batch.end_document = ordinal
+            self.stats["documents_read"] += 1
+            doc.metadata["content_hash"] = content_hash(doc, self.chunk_size, self.chunk_overlap)
+            previous = self.existing.get(doc.metadata.get("doc_id")) if self.existing is not None else None
+            if previous is not None and previous["hash"] == doc.metadata["content_hash"]:
+                self.stats["documents_unchanged"] += 1
+                self.stats["read_seconds"] += time.perf_counter() - start_time
+                continue
+
+            # A document's chunks always land in the same batch, so batches map to document ranges
+            chunks = chunk_document(doc, self.chunk_size, self.chunk_overlap)
+            batch.chunks.extend(chunks)
+            if previous is not None:
+                self.stats["documents_changed"] += 1
+                batch.stale_ids.extend(previous["ids"] - {point_id(chunk) for chunk in chunks})
+            else:
+                self.stats["documents_new"] += 1
+            self.stats["chunks"] += len(chunks)
+            self.stats["read_seconds"] += time.perf_counter() - start_time
+
+            if len(batch.chunks) >= self.batch_size:
+                yield batch
+                batch = Batch(ordinal)
+        if batch.chunks or batch.stale_ids:
+            yield batch
+
+    def _upsert(self, batch: Batch):
+        start_time = time.perf_counter()
+        points = [
+            PointStruct(
+                id=point_id(chunk),
+                vector=list(vector),
+                payload={"page_content": chunk.page_content, "metadata": chunk.metadata},
+            )
+            for chunk, vector in zip(batch.chunks, batch.vectors)
+        ]
+        self.client.upsert(collection_name=self.collection_name, points=points, wait=True)
+        if batch.stale_ids:
+            # Only after the upsert, so a changed document is never missing from the collection
+            self._delete(batch.stale_ids)
+        return time.perf_counter() - start_time
+
+    def _delete(self, ids: List[Any], page_size: int = 1024):
+        for i in range(0, len(ids), page_size):
+            page = ids[i:i + page_size]
+            self.client.delete(collection_name=self.collection_name, points_selector=PointIdsList(points=page),
+                               wait=True)
+            self.stats["points_deleted"] += len(page)
+
+    def _delete_removed(self):
+        """Delete documents that are no longer in the source, and points from before ids were tracked."""
+        removed = [doc_id for doc_id in self.existing if doc_id not in self._seen]
+        ids = [point for doc_id in removed for point in self.existing[doc_id]["ids"]]
+        if self.untracked_ids:
+            print(f"🧹 Removing {len(self.untracked_ids)} points without a document id (indexed by an older version)")
+        self._delete(ids + list(self.untracked_ids))
+        self.stats["documents_removed"] = len(removed)
+
+    def _rates(self):
+        s = self.stats
+        rate = lambda count, seconds: round(count / seconds, 1) if seconds else None
+        return {
+            # Per-stage throughput while the stage was busy (summed over its workers)
+            "read_docs_per_s": rate(s["documents_read"], s["read_seconds"]),
+            "embed_chunks_per_s": rate(s["chunks"], s["embed_seconds"]),
+            "upsert_points_per_s": rate(s["points_upserted"], s["upsert_seconds"]),
+            # End-to-end throughput
+            "docs_per_s": rate(s["documents_read"], s["wall_seconds"]),
+        }
+
+    def run(self, documents: Iterable[Document], checkpoint: Optional[IngestionCheckpoint] = None) -> Dict[str, Any]:
+        """Ingest documents (an iterable of source Documents); returns stage statistics."""
+        checkpoint = checkpoint or IngestionCheckpoint(None, {})
+        start_time = time.perf_counter()
+        if checkpoint.completed_documents:
+            print(f"⏩ Resuming after {checkpoint.completed_documents} already ingested documents")
+
+        if self.embed_workers > 0:
+            embed_pool = ProcessPoolExecutor(
+                max_workers=self.embed_workers,
+                mp_context=multiprocessing.get_context("spawn"),  # Fresh interpreters: no forked torch/thread state
+                initializer=_init_embedding_worker,
+                initargs=(self.embeddings_factory, self.threads_per_worker),
+            )
+        else:
+            # In-process embedding (one model, one thread), e.g. for tests or GPU models
+            _init_embedding_worker(self.embeddings_factory, self.threads_per_worker)
+            embed_pool = ThreadPoolExecutor(max_workers=1)
+        upsert_pool = ThreadPoolExecutor(max_workers=self.max_inflight_upserts, thread_name_prefix="upsert")
+
+        embedding: Dict[Any, Batch] = {}
+        upserting: Dict[Any, Batch] = {}
+        ready: deque = deque()
+        finished_ranges: Dict[int, int] = {}
+        watermark = checkpoint.completed_documents
+
+        def pump():
+            nonlocal watermark
+            done, _ = wait(list(embedding) + list(upserting), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in embedding:
+                    batch = embedding.pop(future)
+                    batch.vectors, seconds = future.result()
+                    self.stats["embed_seconds"] += seconds
+                    ready.append(batch)
+                else:
+                    batch = upserting.pop(future)
+                    self.stats["upsert_seconds"] += future.result()
+                    self.stats["points_upserted"] += len(batch.chunks)
+                    self.stats["batches"] += 1
+                    batch.chunks, batch.vectors, batch.stale_ids = [], None, []
+
+                    # Batches finish out of order; the checkpoint only advances over a contiguous prefix
+                    finished_ranges[batch.first_document] = batch.end_document
+                    advanced = watermark
+                    while advanced in finished_ranges:
+                        advanced = finished_ranges.pop(advanced)
+                    if advanced != watermark:
+                        watermark = advanced
+                        checkpoint.save(watermark)
+
+                    if self.stats["batches"] % self.report_every == 0:
+                        self.stats["wall_seconds"] = time.perf_counter() - start_time
+                        print(f"📈 {self.stats['points_upserted']} points from {watermark} documents | {self._rates()}")
+
+            while ready and len(upserting) < self.max_inflight_upserts:
+                batch = ready.popleft()
+                upserting[upsert_pool.submit(self._upsert, batch)] = batch
+
+        try:
+            for batch in self._batches(documents, checkpoint.completed_documents):
+                while len(embedding) + len(ready) >= self.max_inflight_embeddings:
+                    pump()
+                embedding[embed_pool.submit(_embed_texts, [c.page_content for c in batch.chunks])] = batch
+            while embedding or upserting or ready:
+                pump()
+        finally:
+            embed_pool.shutdown(cancel_futures=True)
+            upsert_pool.shutdown(wait=True, cancel_futures=True)
+        if self.existing is not None:
+            self._delete_removed()
+
+        self.stats["wall_seconds"] = time.perf_counter() - start_time
+        result = {**self.stats, **self._rates()}
+        print(f"🎉 Ingested {self.stats['documents_read']} documents ({self.stats['points_upserted']} points) "
+              f"in {self.stats['wall_seconds']:.1f}s | {self._rates()}")
+        if self.existing is not None:
+            print(f"🔁 {self.stats['documents_new']} new, {self.stats['documents_changed']} changed, "
+                  f"{self.stats['documents_unchanged']} unchanged, {self.stats['documents_removed']} removed "
+                  f"({self.stats['points_deleted']} points deleted)")
+        return result
+
+def source_fingerprint(path: str, collection_name: str) -> Dict[str, Any]:
+    stat = os.stat(path)
+    return {"source": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime, "collection": collection_name}
+
+def ingest_file(path: str, client, collection_name: str, embeddings_factory, checkpoint_dir: Optional[str] = None,
+                incremental: bool = True, **pipeline_options) -> Dict[str, Any]:
+    """Stream a JSON/JSONL corpus into a collection, resuming from a previous crashed run.
+
+    With incremental=True only new and changed documents are embedded and
+    upserted, and documents missing from the file are deleted.
+    """
+    checkpoint_path = (
+        os.path.join(checkpoint_dir, f"{collection_name}.{os.path.basename(path)}.checkpoint.json")
+        if checkpoint_dir else None
+    )
+    checkpoint = IngestionCheckpoint(checkpoint_path, source_fingerprint(path, collection_name))
+    documents = iter_source_documents(iter_json_records(path))
+    if incremental:
+        existing, untracked = scan_collection(client, collection_name)
+        print(f"🔍 Collection '{collection_name}' holds {len(existing)} indexed documents")
+        pipeline_options = {**pipeline_options, "existing": existing, "untracked_ids": untracked}
+
+    stats = IngestionPipeline(client, collection_name, embeddings_factory, **pipeline_options).run(documents, checkpoint)
+    checkpoint.clear()  # Completed runs start from scratch next time
+    return stats
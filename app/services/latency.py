@@ -0,0 +1,112 @@
+"""Per-request latency budgets and per-stage timing.
+
+A request opens a budget (`with request_budget(ms):`); stages running inside
+it (in the same task, in tasks it creates, or in LangChain's executor
+threads, which all copy the context) read the remaining time to decide how
+much optional work they can afford, e.g. how many candidates to rerank.
+
+Every timed stage is also recorded in a process-wide window exported by
+/metrics.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from app.services.embedding_batcher import percentile
+
+class RequestBudget:
+    """Deadline of one request plus the time its stages took."""
+
+    def __init__(self, budget_ms: Optional[float]):
+        self.budget_ms = budget_ms
+        self.start = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.tokens: Dict[str, int] = {}
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def remaining_ms(self) -> Optional[float]:
+        """Milliseconds left, or None for an unlimited budget."""
+        if self.budget_ms is None:
+            return None
+        return self.budget_ms - self.elapsed_ms()
+
+    def record(self, stage: str, ms: float):
+        # Stages that run more than once per request (e.g. two tool calls) add up
+        self.timings[stage] = round(self.timings.get(stage, 0.0) + ms, 1)
+
+    def record_tokens(self, kind: str, count: int):
+        self.tokens[kind] = self.tokens.get(kind, 0) + count
+
+_current_budget: ContextVar[Optional[RequestBudget]] = ContextVar("request_budget", default=None)
+
+@contextmanager
+def request_budget(budget_ms: Optional[float]):
+    """Run the block under a latency budget; yields the RequestBudget."""
+    budget = RequestBudget(budget_ms)
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        try:
+            _current_budget.reset(token)
+        except ValueError:
+            pass  # An async generator closed from another context
+
+def current_budget() -> Optional[RequestBudget]:
+    return _current_budget.get()
+
+class StageTimings:
+    """Sliding window of durations per stage name."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._durations: Dict[str, deque] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, ms: float):
+        with self._lock:
+            if stage not in self._durations:
+                self._durations[stage] = deque(maxlen=self.window)
+                self._counts[stage] = 0
+            self._durations[stage].append(ms)
+            self._counts[stage] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                stage: {
+                    "count": self._counts[stage],
+                    "p50_ms": percentile(list(durations), 50),
+                    "p95_ms": percentile(list(durations), 95),
+                }
+                for stage, durations in self._durations.items()
+            }
+
+stage_timings = StageTimings()
+
+def record_stage(stage: str, ms: float):
+    """Record a stage duration for /metrics and for the current request, if any."""
+    stage_timings.record(stage, ms)
+    budget = current_budget()
+    if budget is not None:
+        budget.record(stage, ms)
+
+def record_tokens(kind: str, count: int):
+    """Record a token count (e.g. packed context tokens) for the current request, if any."""
+    budget = current_budget()
+    if budget is not None:
+        budget.record_tokens(kind, count)
+
+@contextmanager
+def timed_stage(stage: str):
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, (time.perf_counter() - start_time) * 1000)
@@ -1,7 +1,14 @@
 # from langchain_ollama import ChatOllama, OllamaEmbeddings
 from langchain_mistralai import ChatMistralAI
 from langchain_huggingface import HuggingFaceEmbeddings
-from config.settings import MISTRAL_API_KEY
+from app.services.registry import registry
+from app.services.embedding_batcher import BatchingEmbeddings
+from app.services.embedding_cache import CachedEmbeddings
+from config.settings import (
+    MISTRAL_API_KEY, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, ONNX_MODEL_DIR,
+    EMBEDDING_BATCHING, EMBEDDING_MAX_BATCH_SIZE, EMBEDDING_MAX_WAIT_MS,
+    EMBEDDING_CACHE, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_READ_ONLY
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,12 +27,13 @@ logger = logging.getLogger(__name__)
 #     timeout=60
 # )
 
-llm = ChatMistralAI(
-    model="mistral-small-2506",
-    mistral_api_key=MISTRAL_API_KEY,
-    temperature=0.3,
-    top_p=0.9
-)
+def create_llm():
+    return ChatMistralAI(
+        model="mistral-small-2506",
+        mistral_api_key=MISTRAL_API_KEY,
+        temperature=0.3,
+        top_p=0.9
+    )
 
 # Initialize embeddings
 # embeddings = OllamaEmbeddings(
@@ -33,6 +41,50 @@ llm = ChatMistralAI(
 #     base_url=OLLAMA_BASE_URL
 # )
 
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/paraphrase-MiniLM-L3-v2"
-)
\ No newline at end of file
+def create_base_embeddings(backend=EMBEDDING_BACKEND):
+    """Embedding model for the configured backend (torch or quantized ONNX)."""
+    if backend == "onnx":
+        try:
+            from app.services.onnx_embeddings import OnnxEmbeddings
+            embeddings = OnnxEmbeddings(ONNX_MODEL_DIR)
+            print(f"✅ Using int8 ONNX embeddings from {ONNX_MODEL_DIR}")
+            return embeddings
+        except Exception as e:
+            print(f"⚠️ ONNX embeddings unavailable ({e}), falling back to torch")
+
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME
+    )
+
+def create_embeddings():
+    embeddings = create_base_embeddings()
+    # Key cached vectors by the backend actually loaded: ONNX falls back to torch when it cannot load
+    backend = "onnx" if type(embeddings).__name__ == "OnnxEmbeddings" else "torch"
+    if EMBEDDING_BATCHING:
+        # Merge concurrent query embeddings into one forward pass
+        embeddings = BatchingEmbeddings(
+            embeddings,
+            max_batch_size=EMBEDDING_MAX_BATCH_SIZE,
+            max_wait_ms=EMBEDDING_MAX_WAIT_MS,
+        )
+    if EMBEDDING_CACHE:
+        # Repeated queries skip the model entirely
+        embeddings = CachedEmbeddings(
+            embeddings,
+            model_name=f"{backend}:{EMBEDDING_MODEL_NAME}",
+            directory=EMBEDDING_CACHE_DIR,
+            max_memory_entries=EMBEDDING_CACHE_SIZE,
+            read_only=EMBEDDING_CACHE_READ_ONLY,
+        )
+    return embeddings
+
+registry.register("embeddings", create_embeddings)
+registry.register("llm", create_llm)
+
+def get_llm():
+    """Shared chat model, created on first use."""
+    return registry.get("llm")
+
+def get_embeddings():
+    """Shared embedding model, loaded on first use."""
+    return registry.get("embeddings")
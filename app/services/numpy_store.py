@@ -0,0 +1,317 @@
+"""In-process vector index: brute-force cosine search over a NumPy matrix.
+
+The corpus is small enough to keep in RAM, so instead of a network round trip
+to Qdrant every query is one matrix-vector product over the normalized
+document vectors, followed by argpartition for the top k. Metadata is kept in
+columnar form with one precomputed boolean mask per filterable value.
+
+Build or refresh the on-disk index with `python -m app.services.numpy_store --build`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import time
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.services.batch import share_batch_call
+from app.services.payload_schema import INTEGER, KEYWORD, PAYLOAD_SCHEMA, RANGE_OPERATORS, is_empty, is_range
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+DOCUMENTS_FILE = "documents.jsonl"
+META_FILE = "meta.json"
+
+# Metadata fields whose masks are precomputed when the index is loaded: the low-cardinality
+# scalar fields of the payload schema (one mask per distinct value)
+FILTER_FIELDS = tuple(
+    field for field, kind in PAYLOAD_SCHEMA.items() if kind in (KEYWORD, INTEGER) and field not in ("author", "doc_id")
+)
+
+_RANGE_COMPARISONS = {"gt": np.greater, "gte": np.greater_equal, "lt": np.less, "lte": np.less_equal}
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+def filter_to_dict(filter) -> Dict[str, Any]:
+    """Turn a Qdrant Filter (as built by build_qdrant_filter) or a plain dict into {field: value}.
+
+    Range conditions become {"gte": ..., "lte": ...} dicts.
+    """
+    if not filter:
+        return {}
+    if isinstance(filter, dict):
+        return {key: value for key, value in filter.items() if not is_empty(value)}
+
+    conditions = {}
+    for condition in filter.must or []:
+        key = condition.key.split(".", 1)[1] if condition.key.startswith("metadata.") else condition.key
+        match = getattr(condition, "match", None)
+        bounds = getattr(condition, "range", None)
+        if match is not None and hasattr(match, "value"):
+            conditions[key] = match.value
+        elif match is not None and hasattr(match, "any"):
+            conditions[key] = list(match.any)
+        elif bounds is not None:
+            conditions[key] = {op: getattr(bounds, op) for op in RANGE_OPERATORS if getattr(bounds, op) is not None}
+        else:
+            raise ValueError(f"Unsupported filter condition for the numpy vector store: {condition}")
+    return conditions
+
+class MetadataMasks:
+    """Columnar metadata with one boolean row mask per field value.
+
+    Masks for FILTER_FIELDS are built up front; any other field (e.g. tags,
+    where a row matches if the list contains the value) is encoded on first
+    use. Range filters compare against a numeric column, also built on first
+    use. A filter is the AND of its field masks.
+    """
+
+    def __init__(self, metadatas: List[Dict[str, Any]], fields=FILTER_FIELDS):
+        self.metadatas = metadatas
+        self._masks: Dict[str, Dict[str, np.ndarray]] = {field: self._build_masks(field) for field in fields}
+        self._numeric: Dict[str, np.ndarray] = {}
+
+    def _build_masks(self, field: str) -> Dict[str, np.ndarray]:
+        """Encode one metadata column as integer codes and derive a mask per distinct value."""
+        codes_by_value: Dict[str, int] = {}
+        codes = np.fromiter(
+            (codes_by_value.setdefault(str(m.get(field)), len(codes_by_value)) for m in self.metadatas),
+            dtype=np.int32,
+            count=len(self.metadatas),
+        )
+        return {value: codes == code for value, code in codes_by_value.items()}
+
+    def _build_list_masks(self, field: str) -> Dict[str, np.ndarray]:
+        masks: Dict[str, np.ndarray] = {}
+        for row, metadata in enumerate(self.metadatas):
+            values = metadata.get(field)
+            for value in values if isinstance(values, list) else [values]:
+                if str(value) not in masks:
+                    masks[str(value)] = np.zeros(len(self.metadatas), dtype=bool)
+                masks[str(value)][row] = True
+        return masks
+
+    def _numeric_column(self, field: str) -> np.ndarray:
+        if field not in self._numeric:
+            def as_number(value):
+                try:
+                    return float(value)
+                except (TypeError, ValueError):
+                    return np.nan  # Never inside a range
+            self._numeric[field] = np.fromiter(
+                (as_number(m.get(field)) for m in self.metadatas), dtype=np.float64, count=len(self.metadatas)
+            )
+        return self._numeric[field]
+
+    def range_mask(self, field: str, bounds: Dict[str, Any]) -> np.ndarray:
+        column = self._numeric_column(field)
+        mask = np.ones(len(self.metadatas), dtype=bool)
+        for op, bound in bounds.items():
+            mask &= _RANGE_COMPARISONS[op](column, bound)
+        return mask
+
+    def field_mask(self, field: str, value) -> np.ndarray:
+        if is_range(value):
+            return self.range_mask(field, value)
+        if field not in self._masks:
+            self._masks[field] = self._build_list_masks(field)
+
+        masks = self._masks[field]
+        empty = np.zeros(len(self.metadatas), dtype=bool)
+        if isinstance(value, (list, tuple, set)):
+            mask = empty
+            for item in value:
+                mask = mask | masks.get(str(item), empty)
+            return mask
+        return masks.get(str(value), empty)
+
+    def mask(self, filter) -> Optional[np.ndarray]:
+        """Row mask for a filter, or None when the filter is empty."""
+        conditions = filter_to_dict(filter)
+        if not conditions:
+            return None
+        mask = None
+        for field, value in conditions.items():
+            field_mask = self.field_mask(field, value)
+            mask = field_mask if mask is None else mask & field_mask
+        return mask
+
+class NumpyVectorStore:
+    """Vector store with the similarity_search surface of QdrantVectorStore, served from memory.
+
+    Vectors are stored L2-normalized in a contiguous float32 matrix, so cosine
+    similarity (Qdrant's distance for this collection) is a plain dot product.
+    The matrix can be memory-mapped from disk to share pages between workers.
+    """
+
+    def __init__(self, vectors: np.ndarray, texts: List[str], metadatas: List[Dict[str, Any]], embedding,
+                 filter_fields=FILTER_FIELDS):
+        if len(vectors) != len(texts) or len(texts) != len(metadatas):
+            raise ValueError("vectors, texts and metadatas must have the same length")
+        self.vectors = vectors
+        self.texts = texts
+        self.metadatas = metadatas
+        self.embedding = embedding
+        self.masks = MetadataMasks(metadatas, filter_fields)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def similarity_search_with_score_by_vector(self, vector, k: int = 4, filter=None) -> List[Tuple[Document, float]]:
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        mask = self.masks.mask(filter)
+        if mask is None:
+            rows = None
+            scores = self.vectors @ query
+        else:
+            rows = np.flatnonzero(mask)
+            if rows.size == 0:
+                return []
+            scores = self.vectors[rows] @ query
+
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for position in top:
+            row = int(rows[position]) if rows is not None else int(position)
+            document = Document(page_content=self.texts[row], metadata=self.metadatas[row])
+            results.append((document, float(scores[position])))
+        return results
+
+    def similarity_search_by_vector(self, vector, k: int = 4, filter=None, search_params=None) -> List[Document]:
+        # search_params (Qdrant's hnsw_ef/exact) do not apply: a matrix product is always an exact search
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(vector, k=k, filter=filter)]
+
+    def similarity_search(self, query: str, k: int = 4, filter=None, search_params=None) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k=k, filter=filter)
+
+    async def asimilarity_search(self, query: str, k: int = 4, filter=None, search_params=None) -> List[Document]:
+        """Async search; the matrix product runs in a thread (NumPy releases the GIL)."""
+        vector = await share_batch_call(
+            ("embed", query),
+            lambda: self.embedding.aembed_query(query),
+        )
+        return await asyncio.to_thread(self.similarity_search_by_vector, vector, k, filter)
+
+    @classmethod
+    def from_documents(cls, documents: List[Document], embedding, batch_size: int = 256, **kwargs):
+        """Embed documents and build an index in memory."""
+        texts = [doc.page_content for doc in documents]
+        chunks = [
+            np.asarray(embedding.embed_documents(texts[i:i + batch_size]), dtype=np.float32)
+            for i in range(0, len(texts), batch_size)
+        ]
+        vectors = _normalize_rows(np.concatenate(chunks)) if chunks else np.zeros((0, 0), dtype=np.float32)
+        return cls(np.ascontiguousarray(vectors, dtype=np.float32), texts, [dict(doc.metadata) for doc in documents],
+                   embedding, **kwargs)
+
+    def save(self, directory: str):
+        """Write the index as a raw float32 matrix, a JSONL document file and a meta file.
+
+        The matrix and documents go into a fresh version directory; the meta file
+        points at it and is swapped in with a single rename, so readers always
+        see matching vectors and documents. The version it replaced is kept for
+        loads still reading it; older ones are removed.
+        """
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, META_FILE)
+        previous = None
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                previous = json.load(f).get("version")
+
+        version = f"v{time.time_ns()}"
+        version_dir = os.path.join(directory, version)
+        os.makedirs(version_dir)
+        np.ascontiguousarray(self.vectors, dtype=np.float32).tofile(os.path.join(version_dir, VECTORS_FILE))
+        with open(os.path.join(version_dir, DOCUMENTS_FILE), "w", encoding="utf-8") as f:
+            for text, metadata in zip(self.texts, self.metadatas):
+                f.write(json.dumps({"page_content": text, "metadata": metadata}, ensure_ascii=False) + "\n")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"version": version, "count": len(self), "dim": int(self.vectors.shape[1]) if len(self) else 0,
+                       "dtype": "float32", "normalized": True}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+        for name in os.listdir(directory):
+            if name.startswith("v") and name[1:].isdigit() and name not in (version, previous):
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str, embedding, mmap: bool = True, **kwargs):
+        """Load a saved index, memory-mapping the vectors unless mmap is False."""
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        # Indexes saved before versioning keep their files next to the meta file
+        directory = os.path.join(directory, meta.get("version", ""))
+        shape = (meta["count"], meta["dim"])
+        vectors_path = os.path.join(directory, VECTORS_FILE)
+        if mmap and meta["count"]:
+            vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=shape)
+        else:
+            vectors = np.fromfile(vectors_path, dtype=np.float32).reshape(shape)
+
+        texts, metadatas = [], []
+        with open(os.path.join(directory, DOCUMENTS_FILE), encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                texts.append(record["page_content"])
+                metadatas.append(record["metadata"])
+        return cls(vectors, texts, metadatas, embedding, **kwargs)
+
+def build_numpy_index(directory: str, embedding, documents: Optional[List[Document]] = None) -> NumpyVectorStore:
+    """Embed the (chunked) document corpus and save the index; defaults to the latest JSON file in data/."""
+    if documents is None:
+        from config.upload_to_qdrant import find_latest_json_file, prepare_documents
+        documents = prepare_documents(find_latest_json_file())
+    store = NumpyVectorStore.from_documents(documents, embedding)
+    store.save(directory)
+    print(f"✅ Built numpy vector index with {len(store)} documents in {directory}")
+    return store
+
+def get_numpy_vector_store():
+    """Load the on-disk numpy index, building it from the corpus the first time."""
+    from app.services.llm import get_embeddings
+    from config.settings import NUMPY_INDEX_DIR, NUMPY_INDEX_MMAP
+
+    try:
+        if os.path.exists(os.path.join(NUMPY_INDEX_DIR, META_FILE)):
+            store = NumpyVectorStore.load(NUMPY_INDEX_DIR, get_embeddings(), mmap=NUMPY_INDEX_MMAP)
+            print(f"✅ Numpy vector store loaded ({len(store)} documents)")
+            return store
+        return build_numpy_index(NUMPY_INDEX_DIR, get_embeddings())
+    except Exception as e:
+        print(f"❌ Numpy vector store initialization failed: {e}")
+        return None
+
+if __name__ == "__main__":
+    from app.services.llm import get_embeddings
+    from config.settings import NUMPY_INDEX_DIR
+
+    parser = argparse.ArgumentParser(description="Build the in-process numpy vector index")
+    parser.add_argument("--build", action="store_true", help="Embed the corpus and write the index")
+    parser.add_argument("--input", default=None, help="JSON corpus file (default: latest in data/)")
+    parser.add_argument("--output-dir", default=NUMPY_INDEX_DIR)
+    args = parser.parse_args()
+
+    if args.build:
+        from config.upload_to_qdrant import find_latest_json_file, prepare_documents
+        build_numpy_index(args.output_dir, get_embeddings(), prepare_documents(args.input or find_latest_json_file()))
+    else:
+        parser.print_help()
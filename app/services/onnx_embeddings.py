@@ -0,0 +1,140 @@
+"""ONNX Runtime backend for the sentence-transformers embedding model.
+
+The model is exported once with torch and int8 dynamically quantized
+(`python -m app.services.onnx_embeddings --export`). At serving time only
+onnxruntime and tokenizers are loaded, so workers do not pay for torch.
+"""
+import argparse
+import os
+import logging
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+FP32_MODEL_FILE = "model.onnx"
+INT8_MODEL_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+class OnnxEmbeddings(Embeddings):
+    """Mean-pooled sentence embeddings computed with ONNX Runtime on CPU.
+
+    Produces the same vectors as HuggingFaceEmbeddings for the exported model
+    (mean pooling over the attention mask, no normalization), up to int8
+    quantization error.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = True, max_length: int = 128,
+                 batch_size: int = 64, num_threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_file = INT8_MODEL_FILE if quantized else FP32_MODEL_FILE
+        model_path = os.path.join(model_dir, model_file)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"ONNX model not found at {model_path}; run `python -m app.services.onnx_embeddings --export`"
+            )
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.batch_size = batch_size
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real (non-padding) tokens
+        mask = attention_mask[..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return summed / counts
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Same whitespace handling as HuggingFaceEmbeddings
+        texts = [t.replace("\n", " ") for t in texts]
+        vectors = [
+            self._embed_batch(texts[i:i + self.batch_size])
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        if not vectors:
+            return []
+        return np.concatenate(vectors).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def export_onnx_model(model_name: str, output_dir: str, opset: int = 14):
+    """Export a transformers encoder to ONNX and write an int8 dynamically quantized copy."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    dummy = tokenizer(["export sample sentence"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+
+    class EncoderWrapper(torch.nn.Module):
+        # Pass inputs by keyword: positional order of forward() differs across transformers versions
+        def __init__(self, encoder):
+            super().__init__()
+            self.encoder = encoder
+
+        def forward(self, *inputs):
+            return self.encoder(**dict(zip(input_names, inputs))).last_hidden_state
+
+    fp32_path = os.path.join(output_dir, FP32_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            EncoderWrapper(model),
+            tuple(dummy[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False,
+        )
+    print(f"✅ Exported {model_name} to {fp32_path}")
+
+    int8_path = os.path.join(output_dir, INT8_MODEL_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"✅ Wrote int8 dynamically quantized model to {int8_path}")
+
+    tokenizer.save_pretrained(output_dir)
+    return int8_path
+
+if __name__ == "__main__":
+    from config.settings import EMBEDDING_MODEL_NAME, ONNX_MODEL_DIR
+
+    parser = argparse.ArgumentParser(description="Export the embedding model for the ONNX backend")
+    parser.add_argument("--export", action="store_true", help="Export and quantize the model")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--output-dir", default=ONNX_MODEL_DIR)
+    args = parser.parse_args()
+
+    if args.export:
+        export_onnx_model(args.model, args.output_dir)
+    else:
+        parser.print_help()
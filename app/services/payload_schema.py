@@ -0,0 +1,94 @@
+"""Declarative schema of the filterable document metadata.
+
+One entry per metadata field that config/data_generation.py
+(enhance_with_enterprise_metadata) attaches to a document. The schema drives
+the Qdrant payload indexes, the filter builder and the precomputed masks of
+the in-process indexes, so a new filterable field is added here only.
+
+Filter values are written the same way for every backend:
+
+    {"department": "AI Research"}            exact match
+    {"tags": "ml"}                           tag: any element matches
+    {"doc_type": ["Tutorial", "Whitepaper"]} any of the values
+    {"year": {"gte": 2020, "lte": 2023}}     range (gt, gte, lt, lte)
+"""
+from typing import Any, Dict, Optional
+
+from qdrant_client.models import (
+    FieldCondition, IntegerIndexParams, IntegerIndexType, MatchAny, MatchValue, PayloadSchemaType, Range,
+)
+
+KEYWORD = "keyword"  # Exact string match
+INTEGER = "integer"  # Exact match and ranges
+FLOAT = "float"      # Ranges
+TAG = "tag"          # Array of strings, matches when any element matches
+
+PAYLOAD_SCHEMA: Dict[str, str] = {
+    "department": KEYWORD,
+    "doc_type": KEYWORD,
+    "project": KEYWORD,
+    "security_level": KEYWORD,
+    "year": INTEGER,
+    "version": KEYWORD,
+    "author": KEYWORD,
+    "review_status": KEYWORD,
+    "tags": TAG,
+    "confidence_score": FLOAT,
+    "doc_id": KEYWORD,  # Looked up by incremental re-indexing
+}
+
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+
+# Payloads nest the document metadata under this key (see QdrantVectorStore)
+METADATA_PAYLOAD_KEY = "metadata"
+
+def payload_key(field: str) -> str:
+    """Qdrant payload path of a metadata field."""
+    prefix = METADATA_PAYLOAD_KEY + "."
+    return field if field.startswith(prefix) else prefix + field
+
+def index_schema(kind: str):
+    """Qdrant payload index definition for a schema kind."""
+    if kind == INTEGER:
+        # lookup serves exact matches, range serves gte/lte conditions
+        return IntegerIndexParams(type=IntegerIndexType.INTEGER, lookup=True, range=True)
+    if kind == FLOAT:
+        return PayloadSchemaType.FLOAT
+    # Keyword indexes on arrays index every element, which is what tag filters need
+    return PayloadSchemaType.KEYWORD
+
+def is_range(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and all(op in RANGE_OPERATORS for op in value)
+
+def is_empty(value: Any) -> bool:
+    return value is None or (isinstance(value, (str, list, tuple, dict)) and not value)
+
+def field_condition(field: str, value: Any) -> FieldCondition:
+    """Qdrant condition for one filter entry (exact, any-of or range)."""
+    key = payload_key(field)
+    if is_range(value):
+        return FieldCondition(key=key, range=Range(**value))
+    if isinstance(value, dict):
+        raise ValueError(f"Unsupported filter value for '{field}': {value}")
+    if isinstance(value, (list, tuple, set)):
+        return FieldCondition(key=key, match=MatchAny(any=list(value)))
+    return FieldCondition(key=key, match=MatchValue(value=value))
+
+def ensure_payload_indexes(client, collection_name: str, schema: Optional[Dict[str, str]] = None):
+    """Create the payload index of every schema field that the collection does not index yet."""
+    schema = schema or PAYLOAD_SCHEMA
+    try:
+        existing = client.get_collection(collection_name).payload_schema or {}
+    except Exception as e:
+        print(f"⚠️ Could not read payload indexes of '{collection_name}': {e}")
+        existing = {}
+
+    for field, kind in schema.items():
+        key = payload_key(field)
+        if key in existing:
+            continue
+        try:
+            client.create_payload_index(collection_name=collection_name, field_name=key, field_schema=index_schema(kind))
+            print(f"✅ Ensured {kind} index for '{key}'")
+        except Exception as e:
+            print(f"⚠️ Could not create index for '{key}': {e}")
@@ -1,7 +1,22 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from langchain_core.documents import Document
 from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from app.services.llm import embeddings
-from config.settings import QDRANT_URL, QDRANT_API_KEY, QDRANT_COLLECTION_NAME
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    Disabled, Distance, Filter, HnswConfigDiff, QuantizationSearchParams, QueryRequest, ScalarQuantization,
+    ScalarQuantizationConfig, ScalarType, SearchParams, VectorParams, VectorParamsDiff,
+)
+from app.services.llm import get_embeddings
+from app.services.payload_schema import ensure_payload_indexes, field_condition, is_empty
+from app.services.batch import share_batch_call
+from app.services.registry import registry
+from config.settings import (
+    QDRANT_URL, QDRANT_API_KEY, QDRANT_COLLECTION_NAME, VECTOR_STORE_BACKEND,
+    QDRANT_HNSW_M, QDRANT_HNSW_EF_CONSTRUCT, QDRANT_QUANTIZATION, QDRANT_QUANTIZATION_QUANTILE, QDRANT_ON_DISK_VECTORS,
+    QDRANT_SEARCH_HNSW_EF, QDRANT_SEARCH_EXACT, QDRANT_RESCORE, QDRANT_OVERSAMPLING,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,31 +45,141 @@ def get_qdrant_client():
         print(f"❌ Qdrant client connection failed: {e}")
         raise
 
+def get_async_qdrant_client():
+    """Initialize async Qdrant client (connection is opened lazily on first request)"""
+    if QDRANT_API_KEY:
+        # For Qdrant Cloud
+        return AsyncQdrantClient(
+            url=QDRANT_URL,
+            api_key=QDRANT_API_KEY
+        )
+    # For local Qdrant
+    return AsyncQdrantClient(
+        url=QDRANT_URL
+    )
+
 def ensure_qdrant_indexes(client, collection_name):
-    """Ensure filterable indexes exist for required fields."""
-    index_fields = ["department", "doc_type"]
-    for field in index_fields:
+    """Ensure payload indexes exist for every filterable field of the payload schema."""
+    ensure_payload_indexes(client, collection_name)
+
+def collection_config(vector_size=384, m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT,
+                      quantization=QDRANT_QUANTIZATION, on_disk=QDRANT_ON_DISK_VECTORS,
+                      quantile=QDRANT_QUANTIZATION_QUANTILE):
+    """create_collection arguments: cosine vectors, HNSW graph and optional int8 scalar quantization.
+
+    With quantization, the int8 copy stays in RAM for the graph traversal and the
+    original vectors (optionally on disk) are only read to rescore the candidates.
+    """
+    return {
+        "vectors_config": VectorParams(size=vector_size, distance=Distance.COSINE, on_disk=on_disk),
+        "hnsw_config": HnswConfigDiff(m=m, ef_construct=ef_construct),
+        "quantization_config": ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=quantile, always_ram=True)
+        ) if quantization else None,
+    }
+
+def collection_config_update(current, m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT,
+                             quantization=QDRANT_QUANTIZATION, on_disk=QDRANT_ON_DISK_VECTORS,
+                             quantile=QDRANT_QUANTIZATION_QUANTILE):
+    """update_collection arguments bringing an existing collection's config (CollectionConfig) to the
+    settings; empty when it already matches.
+
+    Qdrant rebuilds the HNSW graph and quantized vectors in the background after such an update.
+    """
+    update = {}
+    if (current.hnsw_config.m, current.hnsw_config.ef_construct) != (m, ef_construct):
+        update["hnsw_config"] = HnswConfigDiff(m=m, ef_construct=ef_construct)
+
+    scalar = getattr(current.quantization_config, "scalar", None)
+    if quantization and (scalar is None or scalar.type != ScalarType.INT8 or scalar.quantile != quantile):
+        update["quantization_config"] = collection_config(quantization=True, quantile=quantile)["quantization_config"]
+    elif not quantization and current.quantization_config is not None:
+        update["quantization_config"] = Disabled.DISABLED
+
+    vectors = current.params.vectors
+    if isinstance(vectors, VectorParams) and bool(vectors.on_disk) != on_disk:
+        update["vectors_config"] = {"": VectorParamsDiff(on_disk=on_disk)}
+    return update
+
+def apply_collection_config(client, collection_name):
+    """Apply the HNSW, quantization and on-disk settings to an existing collection."""
+    update = collection_config_update(client.get_collection(collection_name).config)
+    if update:
+        client.update_collection(collection_name=collection_name, **update)
+        print(f"✅ Updated '{collection_name}' config ({', '.join(update)}); Qdrant re-indexes it in the background")
+    return update
+
+def build_search_params(hnsw_ef=None, exact=None, rescore=QDRANT_RESCORE, oversampling=QDRANT_OVERSAMPLING,
+                        quantized=QDRANT_QUANTIZATION):
+    """Per-query search parameters, defaulting to the settings (None when everything is the server default).
+
+    hnsw_ef trades recall for latency on the HNSW graph; exact bypasses it for a full
+    scan. Quantized collections rescore an oversampled candidate set with the
+    original vectors; collections without quantization ignore that part.
+    """
+    hnsw_ef = QDRANT_SEARCH_HNSW_EF if hnsw_ef is None else hnsw_ef
+    exact = QDRANT_SEARCH_EXACT if exact is None else exact
+    if not hnsw_ef and not exact and not quantized:
+        return None
+    return SearchParams(
+        hnsw_ef=hnsw_ef or None,
+        exact=exact,
+        quantization=QuantizationSearchParams(rescore=rescore, oversampling=oversampling) if quantized else None,
+    )
+
+# Search parameters of queries that do not override them
+DEFAULT_SEARCH_PARAMS = build_search_params()
+
+def search_params_key(search_params):
+    """Hashable form of search params, for cache and coalescing keys."""
+    return search_params.model_dump_json(exclude_none=True) if search_params is not None else None
+
+_request_search_params: ContextVar = ContextVar("request_search_params", default=None)
+
+@contextmanager
+def request_search_params(search_params):
+    """Run the block with per-request search params (None keeps DEFAULT_SEARCH_PARAMS).
+
+    The retrieval tools read them with current_search_params(), so a chat
+    request can set hnsw_ef/exact without exposing them as tool arguments.
+    """
+    token = _request_search_params.set(search_params)
+    try:
+        yield
+    finally:
         try:
-            client.create_payload_index(
-                collection_name=collection_name,
-                field_name=field,
-                field_schema={"type": "keyword"}
-            )
-            print(f"✅ Ensured index for '{field}'")
-        except Exception as e:
-            print(f"⚠️ Could not create index for '{field}': {e}")
+            _request_search_params.reset(token)
+        except ValueError:
+            pass  # An async generator closed from another context
+
+def current_search_params():
+    """Search params of the current request, or None for the defaults."""
+    return _request_search_params.get()
 
-def get_qdrant_vector_store():
+def build_qdrant_filter(filters: dict = None):
+    """Build a Qdrant filter from a dict of metadata field values (exact, any-of or range)."""
+    if not filters:
+        return None
+
+    conditions = [
+        field_condition(key, value)
+        for key, value in filters.items()
+        if not is_empty(value)  # Only add non-empty filters
+    ]
+
+    return Filter(must=conditions) if conditions else None
+
+def get_qdrant_vector_store(shared_client=False):
     """Get Qdrant vector store for queries"""
     try:
-        client = get_qdrant_client()
+        client = registry.get("qdrant_client") if shared_client else get_qdrant_client()
         # Ensure indexes for filterable fields
         ensure_qdrant_indexes(client, QDRANT_COLLECTION_NAME)
         
         vector_store = QdrantVectorStore(
             client=client,
             collection_name=QDRANT_COLLECTION_NAME,
-            embedding=embeddings,
+            embedding=get_embeddings(),
         )
         
         # Test the vector store
@@ -67,5 +192,148 @@ def get_qdrant_vector_store():
         print(f"❌ Qdrant vector store initialization failed: {e}")
         return None
 
-# Global instance
-qdrant_vector_store = get_qdrant_vector_store()
\ No newline at end of file
+class AsyncQdrantStore:
+    """Async vector store over AsyncQdrantClient.
+
+    Reads the same payload layout that QdrantVectorStore writes, so it can serve
+    the collection uploaded by config/upload_to_qdrant.py without blocking the
+    event loop on the network round trip.
+    """
+
+    def __init__(self, client, collection_name, embedding,
+                 content_payload_key="page_content", metadata_payload_key="metadata"):
+        self.client = client
+        self.collection_name = collection_name
+        self.embedding = embedding
+        self.content_payload_key = content_payload_key
+        self.metadata_payload_key = metadata_payload_key
+
+    def _to_document(self, point):
+        payload = point.payload or {}
+        return Document(
+            page_content=payload.get(self.content_payload_key, ""),
+            metadata=payload.get(self.metadata_payload_key) or {},
+        )
+
+    async def asimilarity_search_by_vector(self, vector, k=4, filter=None, search_params=None):
+        """Search the collection with a precomputed query vector."""
+        response = await self.client.query_points(
+            collection_name=self.collection_name,
+            query=vector,
+            limit=k,
+            query_filter=filter,
+            search_params=search_params,
+            with_payload=True,
+        )
+        return [self._to_document(point) for point in response.points]
+
+    async def asearch_batch_by_vector(self, vector, k=4, filters=(), search_params=None):
+        """One search per filter for the same query vector, in a single batch request."""
+        responses = await self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[
+                QueryRequest(query=vector, limit=k, filter=filter, params=search_params, with_payload=True)
+                for filter in filters
+            ],
+        )
+        return [[self._to_document(point) for point in response.points] for response in responses]
+
+    async def asimilarity_search(self, query, k=4, filter=None, search_params=None):
+        """Embed the query off the event loop and search the collection.
+
+        Inside a batch, identical queries share one embedding and one search call.
+        """
+        vector = await share_batch_call(
+            ("embed", query),
+            lambda: self.embedding.aembed_query(query),
+        )
+        return await share_batch_call(
+            ("search", query, k, repr(filter), repr(search_params)),
+            lambda: self.asimilarity_search_by_vector(vector, k=k, filter=filter, search_params=search_params),
+        )
+
+def search_batch(store, query, k=4, filters=(), search_params=None):
+    """Dense search of one query under several Qdrant filters: one embedding, one round trip.
+
+    QdrantVectorStore sends a single batch request; other stores (the in-memory
+    numpy index) are searched filter by filter with the same query vector.
+    """
+    if isinstance(store, QdrantVectorStore):
+        vector = store.embeddings.embed_query(query)
+        responses = store.client.query_batch_points(
+            collection_name=store.collection_name,
+            requests=[
+                QueryRequest(query=vector, limit=k, filter=filter, params=search_params, with_payload=True)
+                for filter in filters
+            ],
+        )
+        return [
+            [
+                Document(
+                    page_content=(point.payload or {}).get(store.content_payload_key, ""),
+                    metadata=(point.payload or {}).get(store.metadata_payload_key) or {},
+                )
+                for point in response.points
+            ]
+            for response in responses
+        ]
+    vector = store.embedding.embed_query(query)
+    return [store.similarity_search_by_vector(vector, k=k, filter=filter) for filter in filters]
+
+async def asearch_batch(store, query, k=4, filters=(), search_params=None):
+    """Async search_batch: one shared embedding, then one batch request (or a worker thread for numpy)."""
+    vector = await share_batch_call(
+        ("embed", query),
+        lambda: store.embedding.aembed_query(query),
+    )
+    if isinstance(store, AsyncQdrantStore):
+        return await store.asearch_batch_by_vector(vector, k=k, filters=filters, search_params=search_params)
+    return await asyncio.to_thread(
+        lambda: [store.similarity_search_by_vector(vector, k=k, filter=filter) for filter in filters]
+    )
+
+def get_async_qdrant_vector_store():
+    """Get async Qdrant vector store for queries served from the event loop"""
+    try:
+        return AsyncQdrantStore(
+            client=get_async_qdrant_client(),
+            collection_name=QDRANT_COLLECTION_NAME,
+            embedding=get_embeddings(),
+        )
+    except Exception as e:
+        print(f"❌ Async Qdrant vector store initialization failed: {e}")
+        return None
+
+def create_vector_store():
+    if VECTOR_STORE_BACKEND == "numpy":
+        return registry.get("numpy_vector_store")
+    return get_qdrant_vector_store(shared_client=True)
+
+def create_async_vector_store():
+    if VECTOR_STORE_BACKEND == "numpy":
+        # The numpy store serves sync and async callers from one in-memory index
+        return registry.get("numpy_vector_store")
+    return get_async_qdrant_vector_store()
+
+def get_numpy_vector_store():
+    from app.services.numpy_store import get_numpy_vector_store as load_numpy_vector_store
+    return load_numpy_vector_store()
+
+# Shared instances: one connection, index check and test search per process.
+# The numpy index lives in memory, so it (and the stores wrapping it) is
+# reloaded after re-ingestion.
+numpy_backend = VECTOR_STORE_BACKEND == "numpy"
+if numpy_backend:
+    registry.register("numpy_vector_store", get_numpy_vector_store, reload_on_stamp=True)
+else:
+    registry.register("qdrant_client", get_qdrant_client)
+registry.register("vector_store", create_vector_store, reload_on_stamp=numpy_backend)
+registry.register("async_vector_store", create_async_vector_store, reload_on_stamp=numpy_backend)
+
+def get_vector_store():
+    """Shared sync vector store for the configured backend (None if unavailable)."""
+    return registry.get("vector_store")
+
+def get_async_vector_store():
+    """Shared async vector store for the configured backend (None if it could not be created)."""
+    return registry.get("async_vector_store")
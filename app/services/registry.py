@@ -0,0 +1,183 @@
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services.stamp import StampWatcher
+from config.settings import RETRIEVAL_CACHE_STAMP_PATH
+
+logger = logging.getLogger(__name__)
+
+class Unavailable:
+    """Returned by a factory whose service cannot be built (missing index, model that fails to load).
+
+    Unlike None it is cached: get() returns None without calling the factory
+    again, until a stamp-triggered reload retries it. An optional service that
+    is switched off or not built yet passes degraded=False so readiness is
+    not affected.
+    """
+
+    def __init__(self, reason: str, degraded: bool = True):
+        self.reason = reason
+        self.degraded = degraded
+
+class ServiceRegistry:
+    """Lazily builds shared services (LLM, embeddings, Qdrant, graph) exactly once.
+
+    Modules register a factory at import time, which is cheap. The expensive
+    work (loading models, connecting to Qdrant) happens on first use or during
+    the explicit warm-up run from the FastAPI lifespan. Failed or empty
+    (None) results are not cached, so a service that was down is retried on
+    the next call; factories for optional services return Unavailable instead
+    so the failure is remembered.
+
+    Services built from the ingested corpus (the BM25 and numpy indexes) are
+    registered with reload_on_stamp: when re-ingestion touches the
+    invalidation stamp file, a background thread rebuilds them in
+    registration order and swaps them in. get() never waits for that; callers
+    keep the current instances until the new ones are ready.
+    """
+
+    def __init__(self, stamp_path: Optional[str] = None):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._stamped: List[str] = []  # Services rebuilt when the stamp changes
+        self._stamp = StampWatcher(stamp_path)
+        self._reload_lock = threading.Lock()
+        self.init_seconds: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.unavailable: Dict[str, str] = {}  # Optional services that are off or not built yet
+        self.reloads: Dict[str, int] = {}
+        self.state = "cold"
+        self.warmup_seconds: Optional[float] = None
+
+    def register(self, name: str, factory: Callable[[], Any], reload_on_stamp: bool = False):
+        """Register the factory that builds a service on first use."""
+        self._factories[name] = factory
+        self._locks.setdefault(name, threading.Lock())
+        if reload_on_stamp and name not in self._stamped:
+            self._stamped.append(name)
+
+    def get(self, name: str) -> Any:
+        """Return the service, building it on first access."""
+        if self._stamped and self._stamp.changed():
+            threading.Thread(target=self.reload, args=(list(self._stamped),), name="registry-reload",
+                             daemon=True).start()
+        if name in self._instances:
+            return self._available(name)
+        if name not in self._factories:
+            raise KeyError(f"Service '{name}' is not registered")
+
+        # One lock per service so factories can depend on other services
+        with self._locks[name]:
+            if name in self._instances:
+                return self._available(name)
+
+            start_time = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                self.errors[name] = str(e)
+                raise
+            self.init_seconds[name] = round(time.perf_counter() - start_time, 3)
+
+            if instance is None:
+                self.errors[name] = "initialization returned no instance"
+                return None
+            if isinstance(instance, Unavailable):
+                self._record_unavailable(name, instance)
+                self._instances[name] = instance
+                return None
+
+            self.errors.pop(name, None)
+            self.unavailable.pop(name, None)
+            self._instances[name] = instance
+            return instance
+
+    def _record_unavailable(self, name: str, instance: Unavailable):
+        if instance.degraded:
+            self.errors[name] = instance.reason
+            self.unavailable.pop(name, None)
+        else:
+            self.unavailable[name] = instance.reason
+            self.errors.pop(name, None)
+
+    def reload(self, names: List[str]):
+        """Rebuild the already built services among names and swap them in.
+
+        A rebuild that fails or returns None or Unavailable keeps the current
+        instance (a service that was unavailable is retried here).
+        """
+        with self._reload_lock:
+            self._reload(names)
+
+    def _reload(self, names: List[str]):
+        for name in names:
+            if name not in self._instances:
+                continue
+            with self._locks[name]:
+                start_time = time.perf_counter()
+                try:
+                    instance = self._factories[name]()
+                except Exception as e:
+                    self.errors[name] = str(e)
+                    logger.error(f"❌ Reload failed for '{name}', keeping the current instance: {e}")
+                    continue
+                if instance is None:
+                    self.errors[name] = "reload returned no instance"
+                    continue
+                if isinstance(instance, Unavailable):
+                    self._record_unavailable(name, instance)
+                    continue
+
+                self.init_seconds[name] = round(time.perf_counter() - start_time, 3)
+                self.errors.pop(name, None)
+                self.unavailable.pop(name, None)
+                self._instances[name] = instance
+                self.reloads[name] = self.reloads.get(name, 0) + 1
+                print(f"🔄 Reloaded '{name}' in {self.init_seconds[name]:.2f}s")
+
+    def peek(self, name: str) -> Any:
+        """Return the service only if it has already been built."""
+        return self._available(name)
+
+    def _available(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        return None if isinstance(instance, Unavailable) else instance
+
+    def warm_up(self, names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Build every registered service (in registration order) and record timings."""
+        self.state = "warming"
+        start_time = time.perf_counter()
+
+        for name in names or list(self._factories):
+            try:
+                if self.get(name) is not None:
+                    print(f"🔥 Warmed up '{name}' in {self.init_seconds.get(name, 0):.2f}s")
+            except Exception as e:
+                logger.error(f"❌ Warm-up failed for '{name}': {e}")
+
+        self.warmup_seconds = round(time.perf_counter() - start_time, 3)
+        self.state = "degraded" if self.errors else "ready"
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        """Warm-up state and per-service initialization details."""
+        return {
+            "state": self.state,
+            "warmup_seconds": self.warmup_seconds,
+            "services": {
+                name: {
+                    "initialized": self._available(name) is not None,
+                    "init_seconds": self.init_seconds.get(name),
+                    "error": self.errors.get(name),
+                    "unavailable": self.unavailable.get(name),
+                    "reloads": self.reloads.get(name, 0),
+                }
+                for name in self._factories
+            },
+        }
+
+# Global registry shared by the whole app
+registry = ServiceRegistry(stamp_path=RETRIEVAL_CACHE_STAMP_PATH)
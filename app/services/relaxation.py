@@ -0,0 +1,157 @@
+"""Progressive filter relaxation for filtered retrieval, in a single round trip.
+
+Filters extracted from a query are often narrower than the corpus (the year
+and "recent" heuristics especially), and a filtered search that comes back
+empty leaves the LLM with nothing. Instead of retrying with looser filters one
+round trip at a time, the strict filters and a ladder of relaxations are
+searched together (one Qdrant batch request, or one embedding and an in-memory
+pass per rung), and the most specific rung with results wins. The level used
+is returned with the documents and counted for /metrics.
+"""
+import asyncio
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from app.services.bm25 import get_bm25_index
+from app.services.cache import retrieval_cache
+from app.services.hybrid_search import reciprocal_rank_fusion, _lexical_executor
+from app.services.payload_schema import is_empty
+from app.services.qdrant_store import (
+    get_vector_store, get_async_vector_store, build_qdrant_filter, search_batch, asearch_batch, DEFAULT_SEARCH_PARAMS
+)
+from config.settings import HYBRID_SEARCH, HYBRID_CANDIDATES, RRF_K
+
+# Filters dropped first are the least reliable ones: the year heuristics, then the
+# fields a query rarely states outright. Fields not listed are dropped last.
+RELAXATION_ORDER = ("year", "security_level", "doc_type", "project", "department")
+
+def relaxation_ladder(filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Filter sets from strict to unfiltered, dropping one more field per rung."""
+    current = {field: value for field, value in (filters or {}).items() if not is_empty(value)}
+    ladder = [current]
+    order = [field for field in RELAXATION_ORDER if field in current]
+    order += [field for field in current if field not in RELAXATION_ORDER]
+    for field in order:
+        current = {key: value for key, value in current.items() if key != field}
+        ladder.append(current)
+    return ladder
+
+class RelaxedResult:
+    """Documents of the most specific non-empty rung of a relaxation ladder."""
+
+    def __init__(self, documents: List[Document], level: int, filters: Dict[str, Any], strict: Dict[str, Any]):
+        self.documents = documents
+        self.level = level
+        self.filters = filters
+        self.strict = strict
+        self.dropped = [field for field in strict if field not in filters]
+
+    @property
+    def relaxed(self) -> bool:
+        return self.level > 0
+
+    def note(self) -> str:
+        """One line telling the reader which filters had to be dropped (empty when none were)."""
+        if not self.relaxed or not self.documents:
+            return ""
+        return f"⚠️ No documents matched all filters; showing results without: {', '.join(self.dropped)}"
+
+class RelaxationStats:
+    """How often each relaxation level ends up serving filtered retrievals."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.empty = 0
+        self.levels = Counter()
+        self.dropped = Counter()
+
+    def record(self, result: RelaxedResult):
+        with self._lock:
+            self.requests += 1
+            if not result.documents:
+                self.empty += 1
+                return
+            self.levels[result.level] += 1
+            self.dropped.update(result.dropped)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "strict": self.levels[0],
+                "relaxed": sum(count for level, count in self.levels.items() if level > 0),
+                "empty": self.empty,
+                "levels": {str(level): count for level, count in sorted(self.levels.items())},
+                "dropped_fields": dict(self.dropped),
+            }
+
+relaxation_stats = RelaxationStats()
+
+def _lexical_ladder(bm25, query: str, k: int, ladder: List[Dict[str, Any]]) -> List[List[Document]]:
+    return [bm25.search(query, k, filters) for filters in ladder]
+
+def select_most_specific(k: int, ladder: List[Dict[str, Any]], dense: List[List[Document]],
+                         lexical: Optional[List[List[Document]]]) -> RelaxedResult:
+    """First rung (dense results, fused with BM25 when given) that found anything."""
+    for level, filters in enumerate(ladder):
+        if lexical is None:
+            documents = dense[level][:k]
+        else:
+            documents = reciprocal_rank_fusion([dense[level], lexical[level]], k=RRF_K, limit=k)
+        if documents:
+            return RelaxedResult(documents, level, filters, ladder[0])
+    return RelaxedResult([], len(ladder) - 1, ladder[-1], ladder[0])
+
+def _cache_key(query: str, k: int, filters: Dict[str, Any], search_params=None):
+    return retrieval_cache.make_key(query, {**filters, "_relaxed": True}, k, search_params=search_params)
+
+def _finish(query: str, k: int, result: RelaxedResult, search_params=None) -> RelaxedResult:
+    retrieval_cache.set(_cache_key(query, k, result.strict, search_params), result)
+    relaxation_stats.record(result)
+    return result
+
+def relaxed_similarity_search(query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None,
+                              search_params=None) -> RelaxedResult:
+    """Search the strict filters and every relaxation at once; keep the most specific non-empty result."""
+    ladder = relaxation_ladder(filters)
+    hit, result = retrieval_cache.get(_cache_key(query, k, ladder[0], search_params))
+    if hit:
+        relaxation_stats.record(result)
+        return result
+
+    bm25 = get_bm25_index() if HYBRID_SEARCH else None
+    candidates = max(k, HYBRID_CANDIDATES) if bm25 is not None else k
+    lexical = _lexical_executor.submit(_lexical_ladder, bm25, query, candidates, ladder) if bm25 is not None else None
+    dense = search_batch(get_vector_store(), query, k=candidates,
+                         filters=[build_qdrant_filter(rung) for rung in ladder],
+                         search_params=search_params or DEFAULT_SEARCH_PARAMS)
+    result = select_most_specific(k, ladder, dense, lexical.result() if lexical is not None else None)
+    return _finish(query, k, result, search_params)
+
+async def arelaxed_similarity_search(query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None,
+                                     search_params=None) -> RelaxedResult:
+    """Async relaxed search: the batched dense search and the BM25 ladder run concurrently."""
+    ladder = relaxation_ladder(filters)
+    hit, result = retrieval_cache.get(_cache_key(query, k, ladder[0], search_params))
+    if hit:
+        relaxation_stats.record(result)
+        return result
+
+    bm25 = get_bm25_index() if HYBRID_SEARCH else None
+    candidates = max(k, HYBRID_CANDIDATES) if bm25 is not None else k
+    dense_search = asearch_batch(get_async_vector_store(), query, k=candidates,
+                                 filters=[build_qdrant_filter(rung) for rung in ladder],
+                                 search_params=search_params or DEFAULT_SEARCH_PARAMS)
+    if bm25 is None:
+        dense, lexical = await dense_search, None
+    else:
+        dense, lexical = await asyncio.gather(
+            dense_search,
+            asyncio.to_thread(_lexical_ladder, bm25, query, candidates, ladder),
+        )
+    result = select_most_specific(k, ladder, dense, lexical)
+    return _finish(query, k, result, search_params)
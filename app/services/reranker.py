@@ -0,0 +1,139 @@
+"""Cross-encoder reranking of retrieved candidates, bounded by the request's latency budget.
+
+Retrieval over-fetches RERANK_CANDIDATES passages; a small CPU cross-encoder
+scores every (query, passage) pair in one batched forward pass and the best
+RERANK_TOP_K are kept. The cost of a pass is learned from previous passes, so
+when the request's remaining budget (minus the time reserved for generation)
+cannot pay for all candidates, fewer are reranked, and below
+RERANK_MIN_CANDIDATES the stage is skipped and retrieval order is kept.
+"""
+import asyncio
+import threading
+import time
+import logging
+from typing import Any, Dict, List, Optional, Union
+
+from langchain_core.documents import Document
+
+from app.services.latency import current_budget, record_stage
+from app.services.registry import Unavailable, registry
+from config.settings import (
+    RERANK, RERANK_MODEL, RERANK_CANDIDATES, RERANK_TOP_K, RERANK_MIN_CANDIDATES, RERANK_MAX_LENGTH,
+    GENERATION_RESERVE_MS,
+)
+
+logger = logging.getLogger(__name__)
+
+class CrossEncoderReranker:
+    """Scores (query, passage) pairs with a cross-encoder model exposing predict(pairs)."""
+
+    def __init__(self, model, min_candidates: int = RERANK_MIN_CANDIDATES, reserve_ms: float = GENERATION_RESERVE_MS):
+        self.model = model
+        self.min_candidates = min_candidates
+        self.reserve_ms = reserve_ms
+        # Cost of one forward pass per pair (moving average; includes the fixed overhead, so it errs high)
+        self.pair_ms: Optional[float] = None
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.reranked = 0
+        self.truncated = 0
+        self.skipped = 0
+        self.pairs = 0
+
+    def affordable(self, candidates: int, remaining_ms: Optional[float]) -> int:
+        """How many candidates fit in the remaining budget (all of them without a budget or cost estimate)."""
+        pair_ms = self.pair_ms  # Read once: concurrent reranks update it
+        if remaining_ms is None or not pair_ms:
+            return candidates
+        spendable = remaining_ms - self.reserve_ms
+        return max(0, min(candidates, int(spendable / pair_ms)))
+
+    def _observe(self, pairs: int, ms: float):
+        with self._lock:
+            per_pair = ms / pairs
+            self.pair_ms = per_pair if self.pair_ms is None else 0.8 * self.pair_ms + 0.2 * per_pair
+            self.reranked += 1
+            self.pairs += pairs
+
+    def rerank(self, query: str, documents: List[Document], top_k: int,
+               remaining_ms: Optional[float] = None) -> List[Document]:
+        """Best top_k documents by cross-encoder score, within the remaining budget."""
+        count = self.affordable(len(documents), remaining_ms)
+        skip = count < min(self.min_candidates, len(documents))
+        # Reranks run concurrently in worker threads
+        with self._lock:
+            self.calls += 1
+            if skip:
+                self.skipped += 1
+            elif count < len(documents):
+                self.truncated += 1
+        if skip:
+            logger.info(f"⏱️ Skipping rerank: {remaining_ms:.0f} ms left cannot pay for {self.min_candidates} pairs")
+            return documents[:top_k]
+
+        head = documents[:count]
+        start_time = time.perf_counter()
+        scores = self.model.predict([(query, doc.page_content) for doc in head], batch_size=max(1, len(head)))
+        self._observe(len(head), (time.perf_counter() - start_time) * 1000)
+
+        ranked = sorted(zip(head, scores), key=lambda pair: float(pair[1]), reverse=True)
+        return [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, "rerank_score": round(float(score), 4)})
+            for doc, score in ranked[:top_k]
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "reranked": self.reranked,
+                "truncated_by_budget": self.truncated,
+                "skipped_by_budget": self.skipped,
+                "avg_pairs": round(self.pairs / self.reranked, 2) if self.reranked else None,
+                "estimated_pair_ms": round(self.pair_ms, 3) if self.pair_ms is not None else None,
+            }
+
+def load_reranker() -> Union[CrossEncoderReranker, Unavailable]:
+    """Cross-encoder on CPU; Unavailable (cached, not retried) when reranking is off or the model cannot load."""
+    if not RERANK:
+        return Unavailable("reranking is off (RERANK=False)", degraded=False)
+    try:
+        from sentence_transformers import CrossEncoder
+
+        model = CrossEncoder(RERANK_MODEL, max_length=RERANK_MAX_LENGTH, device="cpu")
+        reranker = CrossEncoderReranker(model)
+        reranker.rerank("warm up", [Document(page_content="warm up")], top_k=1)  # Also seeds the cost estimate
+        print(f"✅ Cross-encoder reranker loaded ({RERANK_MODEL})")
+        return reranker
+    except Exception as e:
+        print(f"⚠️ Reranker unavailable, keeping retrieval order: {e}")
+        return Unavailable(f"reranker unavailable: {e}")
+
+registry.register("reranker", load_reranker)
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    return registry.get("reranker") if RERANK else None
+
+def candidate_count(k: int) -> int:
+    """Number of candidates to retrieve for a final top-k: over-fetch when reranking."""
+    return max(k, RERANK_CANDIDATES) if get_reranker() is not None else k
+
+def rerank_documents(query: str, documents: List[Document], k: int) -> List[Document]:
+    """Rerank over-fetched candidates down to RERANK_TOP_K; the first k in retrieval order without a reranker."""
+    reranker = get_reranker()
+    if reranker is None or not documents:
+        return documents[:k]
+
+    budget = current_budget()
+    start_time = time.perf_counter()
+    reranked = reranker.rerank(query, documents, min(k, RERANK_TOP_K),
+                               remaining_ms=budget.remaining_ms() if budget is not None else None)
+    record_stage("rerank", (time.perf_counter() - start_time) * 1000)
+    return reranked
+
+async def arerank_documents(query: str, documents: List[Document], k: int) -> List[Document]:
+    """Async rerank: the forward pass runs in a worker thread."""
+    if get_reranker() is None or not documents:
+        return documents[:k]
+    return await asyncio.to_thread(rerank_documents, query, documents, k)
@@ -0,0 +1,108 @@
+"""Single-flight request coalescing.
+
+When the same question arrives many times within seconds, each copy would
+embed, search Qdrant and call the LLM on its own. A SingleFlight lets the
+first caller for a key (the leader) do the work while concurrent callers with
+the same key wait for its result instead. Nothing is kept once the call
+finishes, so unlike the caches no result is ever served stale: a request
+either shares a call that is still running or starts a new one.
+
+Sync callers share a concurrent.futures.Future; async callers share a task,
+shielded so that a leader whose client disconnects does not cancel the work
+the followers are waiting on. Errors are shared too.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+def normalize_text(text: Any) -> str:
+    """Case- and whitespace-insensitive form of a query."""
+    return " ".join(str(text).lower().split())
+
+def normalize_args(args: Dict[str, Any]) -> tuple:
+    """Hashable, order-independent form of tool arguments; unset filters are dropped."""
+    return tuple(sorted(
+        (key, normalize_text(value) if isinstance(value, str) else value)
+        for key, value in args.items()
+        if value not in (None, "")
+    ))
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+        self.leaders = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_waiters = 0
+        self._waiters: Dict[Hashable, int] = {}
+
+    def _join(self, key) -> None:
+        self.coalesced += 1
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        self.max_waiters = max(self.max_waiters, self._waiters[key])
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """fn(), or the result of the identical call already running in another thread."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                self.leaders += 1
+                future = self._calls[key] = Future()
+            else:
+                self._join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            self.errors += 1
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self._waiters.pop(key, None)
+        return future.result()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """await fn(), or share the identical call already running on this event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is not None and task.get_loop() is loop:
+                self._join(key)
+            else:
+                self.leaders += 1
+                task = self._tasks[key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task: asyncio.Task):
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+                self._waiters.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.coalesced
+        return {
+            "calls": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / total, 4) if total else None,
+            "max_waiters": self.max_waiters,
+            "in_flight": len(self._calls) + len(self._tasks),
+            "errors": self.errors,
+        }
+
+retrieval_flight = SingleFlight("retrieval")
+generation_flight = SingleFlight("generation")
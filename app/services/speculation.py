@@ -0,0 +1,238 @@
+"""Speculative retrieval: run the likely tool call while the tool-calling LLM call is in flight.
+
+In tool-calling mode the model usually asks for the retrieval the query
+heuristics would pick anyway (the user's question, with the extracted
+filters pushed down). That call is started next to the LLM call; when the
+model's tool call comes back it is attached to it, and the tools node takes
+the prefetched result if the arguments match exactly, or closely enough (same
+tool and filters, and the model's query terms mostly contained in the
+speculated query). Otherwise the prefetch is cancelled and the tool runs as
+usual. A thread-pool prefetch that already started cannot be interrupted, so
+it runs to completion; those are counted as wasted rather than cancelled.
+Hit rates and the retrieval time hidden behind the LLM are exported by
+/metrics.
+"""
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import SPECULATIVE_MATCH_THRESHOLD
+
+def _terms(text: str) -> set:
+    return {word for word in re.findall(r"\w+", str(text).lower()) if len(word) > 2}
+
+def _filter_args(args: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        key: str(value).strip().lower()
+        for key, value in args.items()
+        if key != "query" and value not in (None, "") and str(value).lower() != "any"
+    }
+
+def match_tool_call(speculated: Dict[str, Any], actual: Dict[str, Any], threshold: float) -> Optional[str]:
+    """"exact" or "close" when the speculated call can stand in for the actual one, else None."""
+    if speculated["name"] != actual["name"]:
+        return None
+    if _filter_args(speculated["args"]) != _filter_args(actual["args"]):
+        return None
+
+    speculated_query = str(speculated["args"].get("query", "")).strip().lower()
+    actual_query = str(actual["args"].get("query", "")).strip().lower()
+    if speculated_query == actual_query:
+        return "exact"
+    actual_terms = _terms(actual_query)
+    if actual_terms and len(actual_terms & _terms(speculated_query)) / len(actual_terms) >= threshold:
+        return "close"
+    return None
+
+class Prefetch:
+    """A speculative tool call and the future (thread) or task (event loop) computing its result."""
+
+    def __init__(self, tool_call: Dict[str, Any]):
+        self.tool_call = tool_call
+        self.future = None
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self.attached_at = time.monotonic()
+        self.cancelled = threading.Event()
+
+    def run(self, tool):
+        # The job may start after the prefetch was already given up
+        if self.cancelled.is_set():
+            return None
+        try:
+            return tool.invoke(self.tool_call["args"])
+        finally:
+            self.finished_at = time.perf_counter()
+
+    async def arun(self, tool):
+        try:
+            return await tool.ainvoke(self.tool_call["args"])
+        finally:
+            self.finished_at = time.perf_counter()
+
+    def hidden_ms(self, waited_since: float) -> float:
+        """Retrieval time that overlapped the LLM call: from start until it finished or was waited for."""
+        end = min(self.finished_at, waited_since) if self.finished_at is not None else waited_since
+        return (end - self.started_at) * 1000
+
+    def cancel(self) -> bool:
+        """Give the prefetch up; False when it already ran or is running and will finish anyway."""
+        self.cancelled.set()
+        if self.future.done():
+            return False
+        # A task is cancelled at its next await; a worker thread that already
+        # picked the job up cannot be interrupted, so this only stops queued jobs
+        return self.future.cancel()
+
+class SpeculativeRetrieval:
+    """Starts prefetches, hands them to the tool calls they match and keeps hit-rate counters."""
+
+    def __init__(self, match_threshold: float = 0.8, ttl_seconds: float = 60, max_workers: int = 4):
+        self.match_threshold = match_threshold
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._pending: Dict[Tuple[Any, str], Prefetch] = {}  # (thread id, tool call id) -> prefetch
+        self._lock = threading.Lock()
+
+        self.started = 0
+        self.hits = 0
+        self.close_hits = 0
+        self.misses = 0
+        self.unused = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.wasted = 0
+        self.hidden_ms = 0.0
+
+    def start(self, tool_call: Optional[Dict[str, Any]], tool) -> Optional[Prefetch]:
+        """Run tool_call in a worker thread (carrying the request's context, e.g. its latency budget)."""
+        if tool_call is None:
+            return None
+        with self._lock:
+            self.started += 1
+        prefetch = Prefetch(tool_call)
+        prefetch.future = self._executor.submit(copy_context().run, prefetch.run, tool)
+        return prefetch
+
+    def astart(self, tool_call: Optional[Dict[str, Any]], tool) -> Optional[Prefetch]:
+        """Run tool_call as a task on the running event loop."""
+        if tool_call is None:
+            return None
+        with self._lock:
+            self.started += 1
+        prefetch = Prefetch(tool_call)
+        prefetch.future = asyncio.ensure_future(prefetch.arun(tool))
+        return prefetch
+
+    def _cancel(self, prefetch: Prefetch):
+        # Called with the lock held
+        # Prefetches that ran (or keep running) to completion are wasted work, not cancelled
+        if prefetch.cancel():
+            self.cancelled += 1
+        else:
+            self.wasted += 1
+
+    def attach(self, prefetch: Optional[Prefetch], response, thread_id=None):
+        """Park the prefetch under the tool calls of the LLM response, or cancel it when there are none.
+
+        Tool call ids are only unique within a conversation, so prefetches are
+        keyed by the graph thread as well.
+        """
+        if prefetch is None:
+            return
+        tool_calls = getattr(response, "tool_calls", None) or []
+        with self._lock:
+            self._expire()
+            if not tool_calls:
+                self.unused += 1
+                self._cancel(prefetch)
+                return
+            prefetch.attached_at = time.monotonic()
+            for tool_call in tool_calls:
+                self._pending[(thread_id, tool_call["id"])] = prefetch
+
+    def _expire(self):
+        # Responses whose tools never ran (e.g. the graph failed in between)
+        now = time.monotonic()
+        for key, prefetch in list(self._pending.items()):
+            if now - prefetch.attached_at > self.ttl_seconds:
+                del self._pending[key]
+                self._cancel(prefetch)
+
+    def take(self, tool_calls: List[Dict[str, Any]], thread_id=None) -> Tuple[Optional[Dict[str, Any]], Optional[Prefetch]]:
+        """The tool call served by a prefetch, and that prefetch; unmatched prefetches are cancelled."""
+        with self._lock:
+            prefetches = []
+            for tool_call in tool_calls:
+                prefetch = self._pending.pop((thread_id, tool_call["id"]), None)
+                if prefetch is not None and prefetch not in prefetches:
+                    prefetches.append(prefetch)
+
+            matched_call = matched_prefetch = None
+            for prefetch in prefetches:
+                if matched_prefetch is None:
+                    for tool_call in tool_calls:
+                        kind = match_tool_call(prefetch.tool_call, tool_call, self.match_threshold)
+                        if kind is not None:
+                            matched_call, matched_prefetch = tool_call, prefetch
+                            if kind == "exact":
+                                self.hits += 1
+                            else:
+                                self.close_hits += 1
+                            break
+                if prefetch is not matched_prefetch:
+                    self.misses += 1
+                    self._cancel(prefetch)
+        return matched_call, matched_prefetch
+
+    def _record_result(self, prefetch: Prefetch, waited_since: float, failed: bool):
+        with self._lock:
+            if failed:
+                self.failures += 1
+            else:
+                self.hidden_ms += prefetch.hidden_ms(waited_since)
+
+    def result(self, prefetch: Prefetch) -> Optional[Any]:
+        """Wait for a prefetch started with start(); None if it failed."""
+        waited_since = time.perf_counter()
+        try:
+            result = prefetch.future.result()
+        except Exception:
+            self._record_result(prefetch, waited_since, failed=True)
+            return None
+        self._record_result(prefetch, waited_since, failed=False)
+        return result
+
+    async def aresult(self, prefetch: Prefetch) -> Optional[Any]:
+        """Await a prefetch started with astart(); None if it failed."""
+        waited_since = time.perf_counter()
+        try:
+            result = await prefetch.future
+        except Exception:
+            self._record_result(prefetch, waited_since, failed=True)
+            return None
+        self._record_result(prefetch, waited_since, failed=False)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            served = self.hits + self.close_hits
+            decided = served + self.misses + self.unused
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "close_hits": self.close_hits,
+                "misses": self.misses,
+                "unused": self.unused,
+                "failures": self.failures,
+                "cancelled": self.cancelled,
+                "wasted": self.wasted,
+                "hit_rate": round(served / decided, 4) if decided else None,
+                "avg_hidden_ms": round(self.hidden_ms / served, 1) if served else None,
+            }
+
+speculative_retrieval = SpeculativeRetrieval(match_threshold=SPECULATIVE_MATCH_THRESHOLD)
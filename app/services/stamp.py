@@ -0,0 +1,41 @@
+"""Cross-process invalidation stamp.
+
+Re-ingestion touches RETRIEVAL_CACHE_STAMP_PATH (see invalidate_retrieval_cache).
+Everything in a running server that was derived from the corpus (the
+retrieval and answer caches, the BM25 and numpy indexes) watches that file
+and refreshes itself when its modification time changes.
+"""
+import os
+import threading
+import time
+from typing import Optional
+
+class StampWatcher:
+    """Notices when the stamp file is touched (checked at most once per interval)."""
+
+    def __init__(self, path: Optional[str], interval: float = 1):
+        self.path = path
+        self.interval = interval
+        self._stamp = self._read()
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if self.path and os.path.exists(self.path):
+            return os.path.getmtime(self.path)
+        return None
+
+    def changed(self) -> bool:
+        """True once for every new stamp."""
+        if time.monotonic() - self._checked_at < self.interval:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at < self.interval:
+                return False
+            self._checked_at = now
+            stamp = self._read()
+            if stamp == self._stamp:
+                return False
+            self._stamp = stamp
+            return True
@@ -0,0 +1,75 @@
+"""Token counting for prompt budgets.
+
+Mistral's tokenizer is not available offline, so counts come from a tiktoken
+encoding (TOKENIZER_ENCODING), which tracks it closely enough for budgeting.
+When the encoding cannot be loaded (tiktoken downloads it on first use), a
+characters-per-token estimate is used instead, so budgets keep working.
+"""
+import math
+from typing import Iterable
+
+from app.services.registry import registry
+from config.settings import TOKENIZER_ENCODING
+
+# Per-message overhead of the chat format (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+class TokenCounter:
+    """Counts tokens with a tiktoken encoding, or estimates them from the text length without one."""
+
+    def __init__(self, encoding=None, chars_per_token: float = 4.0):
+        self.encoding = encoding
+        self.chars_per_token = chars_per_token
+
+    @property
+    def exact(self) -> bool:
+        return self.encoding is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of text within max_tokens."""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max(max_tokens, 0)])
+        return text[:int(max(max_tokens, 0) * self.chars_per_token)]
+
+    def count_messages(self, messages: Iterable) -> int:
+        return sum(self.count(message_text(message)) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+def message_text(message) -> str:
+    """Text of a message whose content may be a string or a list of content blocks."""
+    content = getattr(message, "content", message)
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+    return str(content or "")
+
+def load_token_counter() -> TokenCounter:
+    try:
+        import tiktoken
+
+        counter = TokenCounter(tiktoken.get_encoding(TOKENIZER_ENCODING))
+        print(f"✅ Token counter loaded ({TOKENIZER_ENCODING})")
+        return counter
+    except Exception as e:
+        print(f"⚠️ tiktoken encoding unavailable, estimating tokens from length: {e}")
+        return TokenCounter()
+
+registry.register("token_counter", load_token_counter)
+
+def get_token_counter() -> TokenCounter:
+    return registry.get("token_counter")
+
+def count_tokens(text: str) -> int:
+    return get_token_counter().count(text)
+
+def count_message_tokens(messages: Iterable) -> int:
+    return get_token_counter().count_messages(messages)
@@ -0,0 +1,104 @@
+"""Agent mode benchmark: tool-calling vs direct retrieval, end to end.
+
+Runs the same questions through a graph built in each mode (in process, no
+checkpointer, answer cache not involved) and reports end-to-end latency and
+the number of LLM calls per question. Retrieval uses the configured vector
+store. By default the configured LLM is called; --simulate-llm-ms replaces
+it with a model that sleeps for a fixed time per call (and emits the tool
+call when tools are bound), which isolates the saved round trip from
+provider variance.
+
+Usage:
+    python -m app.test.bench_agent_mode --rounds 3
+    python -m app.test.bench_agent_mode --simulate-llm-ms 800
+"""
+import argparse
+import time
+from typing import List
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.services.embedding_batcher import percentile
+
+QUESTIONS = [
+    "Explain reinforcement learning and its main algorithms",
+    "What is PCA and when should I use it?",
+    "ML engineering technical guides about model deployment",
+    "AI research papers from 2020-2023 about transformers",
+    "How do support vector machines handle non-linear data?",
+]
+
+class SimulatedChatModel(BaseChatModel):
+    """Chat model with a fixed latency: calls the first bound tool on a user turn, answers otherwise."""
+
+    latency_ms: float = 800.0
+    tool_names: List[str] = []
+
+    @property
+    def _llm_type(self):
+        return "simulated"
+
+    def bind_tools(self, tools, **kwargs):
+        return SimulatedChatModel(latency_ms=self.latency_ms, tool_names=[tool.name for tool in tools])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        last = messages[-1]
+        if self.tool_names and last.type == "human":
+            message = AIMessage(content="", tool_calls=[
+                {"name": self.tool_names[0], "args": {"query": last.content}, "id": "simulated_call"}
+            ])
+        else:
+            message = AIMessage(content=f"Simulated answer to: {last.content[:60]}")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+class LLMCallCounter(BaseCallbackHandler):
+    def __init__(self):
+        self.calls = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.calls += 1
+
+def bench_mode(mode, questions, rounds):
+    from app.core.graph import build_graph
+
+    graph = build_graph(mode).compile()
+    graph.invoke({"messages": [HumanMessage(content=questions[0])]})  # Warm-up
+
+    latencies, counter = [], LLMCallCounter()
+    for _ in range(rounds):
+        for question in questions:
+            start = time.perf_counter()
+            graph.invoke({"messages": [HumanMessage(content=question)]}, config={"callbacks": [counter]})
+            latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "llm_calls": counter.calls / len(latencies),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tool-calling vs direct agent mode")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--simulate-llm-ms", type=float, default=None,
+                        help="Replace the LLM with a fixed-latency simulated model")
+    args = parser.parse_args()
+
+    if args.simulate_llm_ms is not None:
+        from app.services.registry import registry
+        registry.register("llm", lambda: SimulatedChatModel(latency_ms=args.simulate_llm_ms))
+
+    results = {mode: bench_mode(mode, QUESTIONS, args.rounds) for mode in ("tool_calling", "direct")}
+
+    print(f"\n{'mode':<14}{'p50 ms':>10}{'p95 ms':>10}{'LLM calls':>11}")
+    for mode, r in results.items():
+        print(f"{mode:<14}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['llm_calls']:>11.2f}")
+    saving = results["tool_calling"]["p50_ms"] - results["direct"]["p50_ms"]
+    print(f"\nDirect mode saves {saving:.1f} ms at p50 "
+          f"({saving / results['tool_calling']['p50_ms']:.0%} of the tool-calling latency)")
+
+if __name__ == "__main__":
+    main()
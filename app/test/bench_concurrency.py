@@ -0,0 +1,77 @@
+"""Concurrency benchmark for the /chat endpoint.
+
+Sends one warm-up request to measure single-request latency, then fires a batch
+of concurrent requests and reports how much they overlapped on the server.
+An endpoint that blocks the event loop shows an effective parallelism close to 1.
+
+Usage:
+    python -m app.test.bench_concurrency --url http://localhost:8000 --requests 8
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+DEFAULT_QUESTION = "Explain reinforcement learning"
+
+async def timed_chat(client, url, index, question):
+    """Send one chat request and record its start/end timestamps."""
+    start = time.perf_counter()
+    response = await client.post(
+        f"{url}/chat",
+        json={"message": question, "thread_id": f"bench_{index}_{int(start * 1000)}"},
+    )
+    end = time.perf_counter()
+    return {"index": index, "start": start, "end": end, "status": response.status_code}
+
+def max_in_flight(results):
+    """Largest number of requests that were open at the same time."""
+    events = []
+    for r in results:
+        events.append((r["start"], 1))
+        events.append((r["end"], -1))
+
+    current = peak = 0
+    for _, delta in sorted(events):
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+async def run_benchmark(url, n_requests, question, timeout):
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        # Warm-up request also gives the single-request baseline latency
+        warmup = await timed_chat(client, url, -1, question)
+        baseline = warmup["end"] - warmup["start"]
+        print(f"🔥 Warm-up latency: {baseline:.2f}s (status {warmup['status']})")
+
+        batch_start = time.perf_counter()
+        results = await asyncio.gather(
+            *(timed_chat(client, url, i, question) for i in range(n_requests))
+        )
+        wall = time.perf_counter() - batch_start
+
+    latencies = sorted(r["end"] - r["start"] for r in results)
+    completions = sorted(r["end"] - batch_start for r in results)
+    ok = sum(1 for r in results if r["status"] == 200)
+
+    print(f"\n📊 {n_requests} concurrent requests ({ok} OK)")
+    print(f"  Wall time:              {wall:.2f}s")
+    print(f"  Serial estimate:        {baseline * n_requests:.2f}s")
+    print(f"  Effective parallelism:  {baseline * n_requests / wall:.2f}x")
+    print(f"  Max in flight (client): {max_in_flight(results)}")
+    print(f"  Latency p50/max:        {latencies[len(latencies) // 2]:.2f}s / {latencies[-1]:.2f}s")
+    print(f"  Completion offsets:     {', '.join(f'{c:.2f}' for c in completions)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent /chat requests")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--question", default=DEFAULT_QUESTION)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.url, args.requests, args.question, args.timeout))
+
+if __name__ == "__main__":
+    main()
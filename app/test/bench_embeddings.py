@@ -0,0 +1,67 @@
+"""Embedding backend benchmark: torch vs int8 ONNX Runtime.
+
+Each backend runs in its own interpreter so the resident memory reported is
+what one worker would pay for that backend alone.
+
+Usage:
+    python -m app.test.bench_embeddings --backends torch onnx --queries 512
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+PROBE = """
+import json, resource, time
+from app.services.llm import create_base_embeddings
+start = time.perf_counter()
+embeddings = create_base_embeddings("{backend}")
+load_seconds = time.perf_counter() - start
+
+texts = ["query number %d about machine learning models and data pipelines" % i for i in range({queries})]
+embeddings.embed_query(texts[0])  # warm-up
+
+start = time.perf_counter()
+for text in texts[:{single}]:
+    embeddings.embed_query(text)
+single_seconds = time.perf_counter() - start
+
+start = time.perf_counter()
+for i in range(0, len(texts), {batch_size}):
+    embeddings.embed_documents(texts[i:i + {batch_size}])
+batch_seconds = time.perf_counter() - start
+
+print(json.dumps({{
+    "backend": type(embeddings).__name__,
+    "load_seconds": load_seconds,
+    "single_per_second": {single} / single_seconds,
+    "batched_per_second": len(texts) / batch_seconds,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+"""
+
+def run_backend(backend, queries, batch_size, single):
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE.format(backend=backend, queries=queries, batch_size=batch_size, single=single)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--single", type=int, default=128, help="Queries embedded one at a time")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    print(f"{'backend':<22}{'load s':>8}{'single/s':>10}{'batched/s':>11}{'peak RSS MB':>13}")
+    for backend in args.backends:
+        r = run_backend(backend, args.queries, args.batch_size, args.single)
+        print(f"{backend + ' (' + r['backend'] + ')':<22}{r['load_seconds']:>8.2f}"
+              f"{r['single_per_second']:>10.1f}{r['batched_per_second']:>11.1f}{r['peak_rss_mb']:>13.0f}")
+
+if __name__ == "__main__":
+    main()
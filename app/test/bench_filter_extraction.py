@@ -0,0 +1,67 @@
+"""Filter extraction micro-benchmark.
+
+Measures the cost of compiling the vocabularies and of extracting filters per
+query (one at a time and batched), over a mix of realistic chat queries.
+
+Usage:
+    python -m app.test.bench_filter_extraction --queries 20000
+"""
+import argparse
+import random
+import time
+
+from app.services.filter_extraction import FilterExtractor, filter_extractor
+
+SAMPLE_QUERIES = [
+    "What is PCA in data science?",
+    "ML engineering technical guides",
+    "Data science best practices 2024",
+    "System design documentation for the platform team",
+    "R&D technical reports from 2022",
+    "AI research papers from 2020-2023 that are confidential",
+    "Explain reinforcement learning please",
+    "latest implementation guide for our API",
+    "internal case studies since 2021",
+    "How do transformers handle long context windows?",
+]
+
+def per_query_us(seconds, count):
+    return seconds / count * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark filter extraction")
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Unique strings (a number appended), so batching cannot just deduplicate them
+    queries = [f"{rng.choice(SAMPLE_QUERIES)} #{i}" for i in range(args.queries)]
+
+    start = time.perf_counter()
+    for _ in range(100):
+        FilterExtractor()
+    compile_ms = (time.perf_counter() - start) / 100 * 1e3
+
+    filter_extractor.extract(queries[0])  # Warm-up
+    start = time.perf_counter()
+    for query in queries:
+        filter_extractor.extract(query)
+    single_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    filter_extractor.extract_batch(queries)
+    batch_seconds = time.perf_counter() - start
+
+    repeated = [rng.choice(SAMPLE_QUERIES) for _ in range(args.queries)]
+    start = time.perf_counter()
+    filter_extractor.extract_batch(repeated)
+    repeated_seconds = time.perf_counter() - start
+
+    print(f"compile:                 {compile_ms:8.3f} ms")
+    print(f"extract (one by one):    {per_query_us(single_seconds, len(queries)):8.2f} µs/query")
+    print(f"extract_batch (unique):  {per_query_us(batch_seconds, len(queries)):8.2f} µs/query")
+    print(f"extract_batch (repeats): {per_query_us(repeated_seconds, len(repeated)):8.2f} µs/query")
+
+if __name__ == "__main__":
+    main()
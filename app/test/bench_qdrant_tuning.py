@@ -0,0 +1,129 @@
+"""Qdrant collection tuning sweep: recall@k against exact search vs latency.
+
+For every collection configuration (HNSW m / ef_construct, int8 scalar
+quantization, on-disk vectors) a throwaway collection is built from a
+synthetic corpus, then the same queries run at each search-time hnsw_ef (and
+with and without rescoring on quantized collections). Recall@k is measured
+against brute-force exact top-k computed with NumPy; latency is p50/p99 of
+single queries with precomputed vectors (embedding cost is excluded).
+
+Random vectors are the hard case for HNSW, so recall on the real corpus is
+usually higher at the same settings. The in-memory client (--qdrant-url
+:memory:) ignores HNSW and quantization and always searches exactly; use a
+local Qdrant server for meaningful numbers.
+
+Usage:
+    python -m app.test.bench_qdrant_tuning --size 50000 --m 8 16 32 --hnsw-ef 16 32 64 128 --quantization
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from app.services.embedding_batcher import percentile
+from app.services.qdrant_store import build_search_params, collection_config
+from app.test.bench_vector_store import synthetic_corpus
+
+COLLECTION = "bench_qdrant_tuning"
+
+def exact_top_k(vectors, queries, k):
+    """Ids of the true top-k neighbours of each query (cosine on unit vectors)."""
+    scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+def build_collection(client, vectors, metadatas, m, ef_construct, quantization, on_disk,
+                     indexing_threshold, batch_size=1000):
+    from qdrant_client.models import OptimizersConfigDiff, PointStruct
+
+    if client.collection_exists(COLLECTION):
+        client.delete_collection(COLLECTION)
+    client.create_collection(
+        COLLECTION,
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=indexing_threshold),
+        **collection_config(vectors.shape[1], m=m, ef_construct=ef_construct, quantization=quantization, on_disk=on_disk),
+    )
+
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch_size):
+        client.upsert(COLLECTION, points=[
+            PointStruct(id=j, vector=vectors[j].tolist(), payload={"page_content": "", "metadata": metadatas[j]})
+            for j in range(i, min(i + batch_size, len(vectors)))
+        ])
+    # Wait for the optimizer to finish building the graph (and the quantized copy)
+    while client.get_collection(COLLECTION).status.value != "green":
+        time.sleep(0.5)
+    return time.perf_counter() - start
+
+def run_queries(client, queries, truth, k, search_params):
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        points = client.query_points(COLLECTION, query=query.tolist(), limit=k, search_params=search_params).points
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(expected & {point.id for point in points})
+    return {
+        "recall": hits / (k * len(queries)),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep Qdrant HNSW, quantization and search-time ef settings")
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", nargs="+", type=int, default=[16])
+    parser.add_argument("--ef-construct", nargs="+", type=int, default=[100])
+    parser.add_argument("--hnsw-ef", nargs="+", type=int, default=[16, 32, 64, 128])
+    parser.add_argument("--quantization", action="store_true", help="Also sweep int8 scalar quantization")
+    parser.add_argument("--on-disk", action="store_true", help="Store the original vectors on disk")
+    parser.add_argument("--oversampling", type=float, default=2.0)
+    parser.add_argument("--indexing-threshold", type=int, default=1000,
+                        help="KB of vectors before Qdrant builds the HNSW graph (small, so the sweep always has one)")
+    parser.add_argument("--qdrant-url", default=None, help="Defaults to QDRANT_URL from settings; ':memory:' for in-process")
+    args = parser.parse_args()
+
+    from qdrant_client import QdrantClient
+    from config.settings import QDRANT_URL
+
+    url = args.qdrant_url or QDRANT_URL
+    client = QdrantClient(":memory:") if url == ":memory:" else QdrantClient(url=url, timeout=300)
+    if url == ":memory:":
+        print("⚠️ The in-memory client always searches exactly: recall is 1.0 and settings have no effect")
+
+    vectors, metadatas = synthetic_corpus(args.size, args.dim)
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_top_k(vectors, queries, args.k)
+
+    print(f"{'m':>4}{'ef_c':>6}{'quant':>7}{'rescore':>9}{'hnsw_ef':>9}{'recall@' + str(args.k):>11}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'build s':>9}")
+    try:
+        for m, ef_construct, quantization in itertools.product(
+            args.m, args.ef_construct, [False, True] if args.quantization else [False]
+        ):
+            build_seconds = build_collection(client, vectors, metadatas, m, ef_construct, quantization, args.on_disk,
+                                             args.indexing_threshold)
+            settings = [(hnsw_ef, False, True) for hnsw_ef in args.hnsw_ef]
+            if quantization:
+                settings += [(hnsw_ef, False, False) for hnsw_ef in args.hnsw_ef]
+            settings.append((None, True, True))  # Exact search, the latency baseline
+
+            for hnsw_ef, exact, rescore in settings:
+                search_params = build_search_params(hnsw_ef, exact, rescore=rescore, oversampling=args.oversampling,
+                                                    quantized=quantization)
+                run_queries(client, queries[:10], truth[:10], args.k, search_params)  # Warm-up
+                r = run_queries(client, queries, truth, args.k, search_params)
+                print(f"{m:>4}{ef_construct:>6}{'int8' if quantization else '-':>7}"
+                      f"{('yes' if rescore else 'no') if quantization else '-':>9}{'exact' if exact else hnsw_ef:>9}"
+                      f"{r['recall']:>11.3f}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}{build_seconds:>9.1f}")
+    finally:
+        if client.collection_exists(COLLECTION):
+            client.delete_collection(COLLECTION)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Cold-start benchmark for the API process.
+
+Runs each measurement in a fresh interpreter so module caches do not hide the
+real cost. Reports the time to import app.api.server (what uvicorn pays before
+it can accept connections) and the per-service warm-up timings.
+
+Usage:
+    python -m app.test.bench_startup --runs 3
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app.api.server
+import_seconds = time.perf_counter() - start
+from app.services.registry import registry
+status = registry.warm_up() if {warm_up} else registry.status()
+print(json.dumps({{"import_seconds": import_seconds, "status": status}}))
+"""
+
+def run_probe(warm_up):
+    """Import the server in a subprocess and return its timing report."""
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE.format(warm_up=warm_up)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # The probe prints its JSON report last, after any service logging
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API cold start")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--no-warmup", action="store_true", help="Only measure the import")
+    args = parser.parse_args()
+
+    reports = [run_probe(not args.no_warmup) for _ in range(args.runs)]
+
+    import_times = [r["import_seconds"] for r in reports]
+    print(f"📦 Import app.api.server: median {statistics.median(import_times):.2f}s "
+          f"(min {min(import_times):.2f}s, max {max(import_times):.2f}s)")
+
+    if args.no_warmup:
+        return
+
+    warmups = [r["status"]["warmup_seconds"] for r in reports]
+    print(f"🔥 Warm-up total:         median {statistics.median(warmups):.2f}s")
+    for name in reports[0]["status"]["services"]:
+        timings = [r["status"]["services"][name]["init_seconds"] or 0 for r in reports]
+        errors = {r["status"]["services"][name]["error"] for r in reports} - {None}
+        suffix = f"  ❌ {errors.pop()}" if errors else ""
+        print(f"   {name:<20} median {statistics.median(timings):.2f}s{suffix}")
+
+if __name__ == "__main__":
+    main()
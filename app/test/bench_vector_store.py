@@ -0,0 +1,130 @@
+"""Vector search benchmark: in-process numpy index vs Qdrant.
+
+Generates a synthetic corpus of random unit vectors with the same metadata
+fields as the real documents, then times unfiltered and filtered top-k
+searches with precomputed query vectors (embedding cost is excluded).
+Qdrant is benchmarked on a throwaway collection at --qdrant-url; pass
+--skip-qdrant to only time the numpy index.
+
+Usage:
+    python -m app.test.bench_vector_store --sizes 1000 100000 1000000 --mmap
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.embedding_batcher import percentile
+from app.services.numpy_store import NumpyVectorStore
+from app.services.payload_schema import ensure_payload_indexes
+from app.services.qdrant_store import build_qdrant_filter
+
+DEPARTMENTS = ["AI Research", "ML Engineering", "Data Science", "Product", "Engineering", "R&D", "Analytics", "Platform"]
+DOC_TYPES = ["Research Paper", "Technical Guide", "API Documentation", "Best Practices", "Tutorial"]
+SECURITY_LEVELS = ["Public", "Internal", "Confidential"]
+FILTER = {"department": "Data Science", "year": 2023}
+
+def synthetic_corpus(size, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((size, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    metadatas = [
+        {
+            "title": f"doc {i}",
+            "department": DEPARTMENTS[i % len(DEPARTMENTS)],
+            "doc_type": DOC_TYPES[i % len(DOC_TYPES)],
+            "year": 2018 + i % 7,
+            "security_level": SECURITY_LEVELS[i % len(SECURITY_LEVELS)],
+        }
+        for i in range(size)
+    ]
+    return vectors, metadatas
+
+def time_searches(search, queries, filter=None):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query, filter)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": percentile(latencies, 50), "p99_ms": percentile(latencies, 99)}
+
+def bench_numpy(vectors, metadatas, queries, k, mmap):
+    start = time.perf_counter()
+    if mmap:
+        tmp = tempfile.TemporaryDirectory()
+        NumpyVectorStore(vectors, [""] * len(metadatas), metadatas, embedding=None).save(tmp.name)
+        store = NumpyVectorStore.load(tmp.name, embedding=None, mmap=True)
+    else:
+        store = NumpyVectorStore(vectors, [""] * len(metadatas), metadatas, embedding=None)
+    load_seconds = time.perf_counter() - start
+
+    search = lambda query, filter: store.similarity_search_by_vector(query, k=k, filter=filter)
+    search(queries[0], None)  # Page in the matrix
+    return {
+        "load_s": load_seconds,
+        "plain": time_searches(search, queries),
+        "filtered": time_searches(search, queries, build_qdrant_filter(FILTER)),
+    }
+
+def bench_qdrant(url, vectors, metadatas, queries, k, batch_size=1000):
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import Distance, PointStruct, VectorParams
+
+    client = QdrantClient(url=url, timeout=120)
+    collection = "bench_vector_store"
+    if client.collection_exists(collection):
+        client.delete_collection(collection)
+    client.create_collection(collection, vectors_config=VectorParams(size=vectors.shape[1], distance=Distance.COSINE))
+    ensure_payload_indexes(client, collection)
+
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch_size):
+        client.upsert(collection, points=[
+            PointStruct(id=j, vector=vectors[j].tolist(), payload={"page_content": "", "metadata": metadatas[j]})
+            for j in range(i, min(i + batch_size, len(vectors)))
+        ])
+    load_seconds = time.perf_counter() - start
+
+    qdrant_filter = build_qdrant_filter(FILTER)
+    search = lambda query, filter: client.query_points(collection, query=query.tolist(), limit=k, query_filter=filter)
+    try:
+        return {
+            "load_s": load_seconds,
+            "plain": time_searches(search, queries),
+            "filtered": time_searches(search, queries, qdrant_filter),
+        }
+    finally:
+        client.delete_collection(collection)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the numpy vector index against Qdrant")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--mmap", action="store_true", help="Load the numpy index memory-mapped from disk")
+    parser.add_argument("--qdrant-url", default=None, help="Defaults to QDRANT_URL from settings")
+    parser.add_argument("--skip-qdrant", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    print(f"{'backend':<8}{'vectors':>10}{'load s':>9}{'p50 ms':>9}{'p99 ms':>9}{'filt p50':>10}{'filt p99':>10}")
+    for size in args.sizes:
+        vectors, metadatas = synthetic_corpus(size, args.dim)
+        results = {"numpy": bench_numpy(vectors, metadatas, queries, args.k, args.mmap)}
+        if not args.skip_qdrant:
+            from config.settings import QDRANT_URL
+            try:
+                results["qdrant"] = bench_qdrant(args.qdrant_url or QDRANT_URL, vectors, metadatas, queries, args.k)
+            except Exception as e:
+                print(f"⚠️ Qdrant benchmark skipped at {size} vectors: {e}")
+
+        for backend, r in results.items():
+            print(f"{backend:<8}{size:>10}{r['load_s']:>9.2f}{r['plain']['p50_ms']:>9.2f}{r['plain']['p99_ms']:>9.2f}"
+                  f"{r['filtered']['p50_ms']:>10.2f}{r['filtered']['p99_ms']:>10.2f}")
+
+if __name__ == "__main__":
+    main()
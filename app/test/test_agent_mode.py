@@ -0,0 +1,31 @@
+from langchain_core.messages import HumanMessage
+
+from app.core.graph import build_graph, direct_tool_call
+
+def test_direct_mode_builds_the_tool_call():
+    """Direct mode emits the retrieval call the LLM would make, with the extracted filters pushed down."""
+    query = "AI Research papers from 2020-2023 about transformers"
+    call = direct_tool_call({"messages": [HumanMessage(content=query)]}).tool_calls[0]
+    assert call["name"] == "retrieve_with_filters"
+    assert call["args"] == {"query": query, "department": "AI Research", "doc_type": "Research Paper",
+                            "year_from": 2020, "year_to": 2023}
+
+    call = direct_tool_call({"messages": [HumanMessage(content="Explain reinforcement learning please")]}).tool_calls[0]
+    assert (call["name"], call["args"]) == ("retrieve", {"query": "Explain reinforcement learning please"})
+    assert direct_tool_call({"messages": [HumanMessage(content="hello there")]}) is None
+    print("✅ Direct tool call:", call)
+
+def test_agent_modes_share_the_graph_shape():
+    """Both modes compile to the same nodes; unknown modes are rejected."""
+    for mode in ("tool_calling", "direct"):
+        assert set(build_graph(mode).nodes) == {"manage_history", "query_or_respond", "tools", "generate", "done"}
+    try:
+        build_graph("unknown")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    print("✅ Agent modes build")
+
+if __name__ == "__main__":
+    test_direct_mode_builds_the_tool_call()
+    test_agent_modes_share_the_graph_shape()
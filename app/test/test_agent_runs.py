@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from app.core import agent
+from app.services.answer_cache import SemanticAnswerCache
+from app.test.test_answer_cache import KeywordEmbeddings
+
+class ScriptedGraph:
+    """Stand-in for the compiled graph: one retrieval and an answer naming the thread's first question."""
+
+    def __init__(self):
+        self.threads = {}
+
+    def _answer(self, thread_id, message):
+        messages = self.threads.setdefault(thread_id, [])
+        topic = next((m.content for m in messages if isinstance(m, HumanMessage)), message.content)
+        messages += [message, ToolMessage(content="passages", tool_call_id="call_1"),
+                     AIMessage(content=f"{message.content} -> about {topic}")]
+        return {"messages": list(messages)}
+
+    async def ainvoke(self, state, config):
+        return self._answer(config["configurable"]["thread_id"], state["messages"][0])
+
+    async def aget_state(self, config):
+        return SimpleNamespace(values={"messages": list(self.threads.get(config["configurable"]["thread_id"], []))})
+
+    async def aupdate_state(self, config, values, as_node=None):
+        self.threads.setdefault(config["configurable"]["thread_id"], []).extend(values["messages"])
+
+def with_stubs(graph, cache, run):
+    originals = agent.get_graph, agent.answer_cache
+    agent.get_graph, agent.answer_cache = (lambda: graph), cache
+    try:
+        return asyncio.run(run())
+    finally:
+        agent.get_graph, agent.answer_cache = originals
+
+def test_follow_ups_bypass_the_answer_cache():
+    """Two threads asking the same follow-up after different first questions get their own answers."""
+    graph = ScriptedGraph()
+    cache = SemanticAnswerCache(threshold=0.8, embeddings=KeywordEmbeddings())
+
+    async def ask(thread_id, question):
+        return (await agent.run_agent_async(HumanMessage(content=question), thread_id=thread_id)).content
+
+    async def run():
+        assert await ask("a", "explain reinforcement learning") == "explain reinforcement learning -> about explain reinforcement learning"
+        assert await ask("a", "tell me more about learning") == "tell me more about learning -> about explain reinforcement learning"
+        assert await ask("b", "what is pca") == "what is pca -> about what is pca"
+        assert await ask("b", "tell me more about learning") == "tell me more about learning -> about what is pca"
+        # A first-turn question is still answered from the cache
+        hit = await agent.run_agent_async(HumanMessage(content="what is rl"), thread_id="c")
+        return hit
+
+    hit = with_stubs(graph, cache, run)
+    assert hit.response_metadata["answer_cache"]["question"] == "explain reinforcement learning"
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"]) == (2, 1)
+    print(f"✅ Follow-ups skip the answer cache: {stats}")
+
+if __name__ == "__main__":
+    test_follow_ups_bypass_the_answer_cache()
@@ -0,0 +1,65 @@
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from app.services.answer_cache import SemanticAnswerCache
+
+class KeywordEmbeddings(Embeddings):
+    """Tiny bag-of-keywords embedding so paraphrases land close together."""
+    VOCAB = ["reinforcement", "learning", "pca", "svm"]
+
+    def embed_query(self, text):
+        words = text.lower().replace("?", "").split()
+        vector = [float(words.count(term)) for term in self.VOCAB]
+        if "rl" in words:
+            vector[0] += 1
+            vector[1] += 1
+        return vector
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+def test_answer_cache_threshold_filters_ttl_and_size():
+    """Paraphrases hit, other filters or topics miss, entries expire and stay bounded."""
+    cache = SemanticAnswerCache(threshold=0.8, ttl_seconds=0.2, max_entries=2, embeddings=KeywordEmbeddings())
+
+    cache.store("explain reinforcement learning", "RL answer")
+    hit = cache.lookup("what is rl")
+    assert hit and hit["answer"] == "RL answer" and hit["similarity"] >= 0.8
+    assert cache.lookup("what is pca") is None
+    assert cache.lookup("explain reinforcement learning", {"department": "AI Research"}) is None
+    assert cache.lookup("explain reinforcement learning", {"department": None}) is not None
+
+    # Answering the same question again replaces the old answer
+    cache.store("explain reinforcement learning", "Newer RL answer")
+    assert cache.stats()["entries"] == 1
+    assert cache.lookup("explain reinforcement learning")["answer"] == "Newer RL answer"
+
+    time.sleep(0.25)
+    assert cache.lookup("what is rl") is None
+    assert cache.stats()["expirations"] == 1
+
+    cache.ttl_seconds = 60
+    for question in ("what is pca", "what is svm", "explain reinforcement learning"):
+        cache.store(question, question.upper())
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    assert cache.lookup("what is pca") is None
+    print(f"✅ Answer cache stats: {stats}")
+
+def test_expired_best_match_does_not_hide_a_fresh_one():
+    """An expired entry scoring higher is dropped before picking the best match."""
+    cache = SemanticAnswerCache(threshold=0.5, ttl_seconds=0.2, embeddings=KeywordEmbeddings())
+    cache.store("what is reinforcement learning", "Old RL answer")
+    time.sleep(0.25)
+    cache.store("reinforcement learning and pca", "Fresh answer")
+
+    hit = cache.lookup("what is reinforcement learning")
+    assert hit and hit["answer"] == "Fresh answer"
+    stats = cache.stats()
+    assert (stats["entries"], stats["expirations"], stats["hits"]) == (1, 1, 1)
+    print(f"✅ Expired entries skipped: {stats}")
+
+if __name__ == "__main__":
+    test_answer_cache_threshold_filters_ttl_and_size()
+    test_expired_best_match_does_not_hide_a_fresh_one()
@@ -0,0 +1,139 @@
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from langchain_core.documents import Document
+
+from app.services.bm25 import META_FILE, BM25Index, tokenize, write_bm25_index
+from app.services.hybrid_search import reciprocal_rank_fusion
+from app.services.registry import ServiceRegistry, Unavailable
+
+DOCS = [
+    Document(page_content="Principal component analysis (PCA) reduces dimensionality.",
+             metadata={"title": "PCA", "department": "Data Science", "year": 2023}),
+    Document(page_content="Support vector machines (SVM) are max-margin classifiers.",
+             metadata={"title": "SVM", "department": "ML Engineering", "year": 2019}),
+    Document(page_content="Reinforcement learning agents learn from rewards and learning signals.",
+             metadata={"title": "RL", "department": "AI Research", "year": 2021}),
+]
+
+def titles(docs):
+    return [doc.metadata["title"] for doc in docs]
+
+def test_bm25_keyword_search_and_rank_fusion():
+    """Acronyms match lexically, filters apply, the index round-trips, and RRF favors agreement."""
+    assert tokenize("What is PCA?") == ["pca"]
+
+    index = BM25Index.from_documents(DOCS)
+    assert titles(index.search("what is pca", k=3)) == ["PCA"]
+    assert titles(index.search("svm classifiers", k=3)) == ["SVM"]
+    assert index.search("svm", k=3, filters={"department": "Data Science"}) == []
+    assert index.search("unknown words", k=3) == []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index.save(tmp)
+        loaded = BM25Index.load(tmp)
+        assert titles(loaded.search("reinforcement learning", k=1)) == ["RL"]
+
+    dense = [DOCS[2], DOCS[0], DOCS[1]]
+    lexical = [DOCS[0]]
+    fused = reciprocal_rank_fusion([dense, lexical], k=60, limit=2)
+    assert titles(fused) == ["PCA", "RL"]
+    print(f"✅ Hybrid fusion ranking: {titles(fused)}")
+
+def test_streamed_build_matches_in_memory_build():
+    """The ingest-time builder streams the JSON file and writes the same index as from_documents."""
+    from config.upload_to_qdrant import iter_chunks, prepare_documents
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([{"content": doc.page_content * 20, "metadata": doc.metadata} for doc in DOCS], f)
+
+        directory = os.path.join(tmp, "bm25")
+        count, _ = write_bm25_index(directory, iter_chunks(path))
+        streamed = BM25Index.load(directory)
+        in_memory = BM25Index.from_documents(prepare_documents(path))
+
+        assert count == len(in_memory) > len(DOCS) and streamed.terms == in_memory.terms
+        assert np.array_equal(streamed.offsets, in_memory.offsets) and np.allclose(streamed.weights, in_memory.weights)
+        assert titles(streamed.search("svm classifiers", k=1)) == ["SVM"]
+        # Rebuilding swaps in a new version; only it and the one it replaced stay on disk
+        write_bm25_index(directory, DOCS[:1])
+        write_bm25_index(directory, DOCS)
+        assert len(BM25Index.load(directory)) == len(DOCS) and len(os.listdir(directory)) == 3  # + meta file
+    print(f"✅ Streamed BM25 build: {count} chunks")
+
+def wait_for_reload(registry, name, reloads, error=False, timeout=5):
+    deadline = time.monotonic() + timeout
+    while registry.reloads.get(name, 0) < reloads or (error and name not in registry.errors):
+        assert time.monotonic() < deadline, f"{name} was not reloaded"
+        time.sleep(0.01)
+    return registry.peek(name)
+
+def test_index_reloads_when_the_stamp_changes():
+    """Re-ingestion (a touched stamp) swaps in the rebuilt index; a failed reload keeps the current one."""
+    with tempfile.TemporaryDirectory() as tmp:
+        directory, stamp = os.path.join(tmp, "bm25"), os.path.join(tmp, "stamp")
+        registry = ServiceRegistry(stamp_path=stamp)
+        registry._stamp.interval = 0
+
+        def load():
+            time.sleep(0.05)  # Long enough for get() to be seen returning the old index
+            return BM25Index.load(directory)
+        registry.register("bm25_index", load, reload_on_stamp=True)
+
+        write_bm25_index(directory, DOCS[:1])
+        assert len(registry.get("bm25_index")) == 1
+        write_bm25_index(directory, DOCS)
+        assert len(registry.get("bm25_index")) == 1  # Not re-ingested as far as the stamp says
+
+        # The reload runs in the background; get() keeps returning the current index meanwhile
+        open(stamp, "w").close()
+        assert len(registry.get("bm25_index")) == 1
+        index = wait_for_reload(registry, "bm25_index", 1)
+        assert len(index) == 3 and titles(index.search("svm", k=1)) == ["SVM"]
+
+        os.remove(os.path.join(directory, META_FILE))
+        os.utime(stamp, (0, 0))
+        registry.get("bm25_index")
+        wait_for_reload(registry, "bm25_index", 1, error=True)
+        assert registry.get("bm25_index") is index
+        assert registry.status()["services"]["bm25_index"]["reloads"] == 1
+    print("✅ BM25 index reload on re-ingestion")
+
+def test_unavailable_index_is_remembered_until_the_stamp_changes():
+    """A missing index is not reloaded on every retrieval, only after re-ingestion, and does not degrade readiness."""
+    with tempfile.TemporaryDirectory() as tmp:
+        directory, stamp = os.path.join(tmp, "bm25"), os.path.join(tmp, "stamp")
+        registry = ServiceRegistry(stamp_path=stamp)
+        registry._stamp.interval = 0
+        calls = []
+
+        def load():
+            calls.append(1)
+            if not os.path.exists(os.path.join(directory, META_FILE)):
+                return Unavailable("no index", degraded=False)
+            return BM25Index.load(directory)
+        registry.register("bm25_index", load, reload_on_stamp=True)
+
+        assert registry.get("bm25_index") is None and registry.get("bm25_index") is None
+        service = registry.status()["services"]["bm25_index"]
+        assert len(calls) == 1 and service["unavailable"] == "no index" and service["error"] is None
+        assert registry.peek("bm25_index") is None and registry.warm_up()["state"] == "ready"
+
+        write_bm25_index(directory, DOCS)
+        open(stamp, "w").close()
+        registry.get("bm25_index")
+        assert len(wait_for_reload(registry, "bm25_index", 1)) == 3
+        assert registry.status()["services"]["bm25_index"]["initialized"]
+    print("✅ Unavailable BM25 index cached until re-ingestion")
+
+if __name__ == "__main__":
+    test_bm25_keyword_search_and_rank_fusion()
+    test_streamed_build_matches_in_memory_build()
+    test_index_reloads_when_the_stamp_changes()
+    test_unavailable_index_is_remembered_until_the_stamp_changes()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import MessagesState, StateGraph
+
+from app.core.checkpointer import SQLiteCheckpointSaver
+
+def build_echo_graph(checkpointer):
+    """Tiny graph that answers every message with an echo."""
+    graph_builder = StateGraph(MessagesState)
+    graph_builder.add_node("echo", lambda state: {"messages": [AIMessage(content=f"echo: {state['messages'][-1].content}")]})
+    graph_builder.set_entry_point("echo")
+    graph_builder.set_finish_point("echo")
+    return graph_builder.compile(checkpointer=checkpointer)
+
+def test_sqlite_checkpointer_shared_between_workers():
+    """State written by one saver is visible to a second saver on the same file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "checkpoints.sqlite")
+        config = {"configurable": {"thread_id": "shared_thread"}}
+
+        worker_a = build_echo_graph(SQLiteCheckpointSaver(db_path))
+        worker_a.invoke({"messages": [HumanMessage(content="hello")]}, config=config)
+        # Long message forces the compressed blob path
+        worker_a.invoke({"messages": [HumanMessage(content="x" * 5000)]}, config=config)
+
+        worker_b_saver = SQLiteCheckpointSaver(db_path)
+        worker_b = build_echo_graph(worker_b_saver)
+        messages = worker_b.get_state(config).values["messages"]
+        assert [m.type for m in messages] == ["human", "ai", "human", "ai"]
+        assert messages[-1].content == "echo: " + "x" * 5000
+        print(f"✅ Second worker sees {len(messages)} messages")
+
+        worker_b_saver.delete_thread("shared_thread")
+        assert worker_a.get_state(config).values.get("messages", []) == []
+        print("✅ Thread cleared for every worker")
+
+def test_checkpoints_store_only_changed_channels():
+    """Each step writes blobs for the channels it changed; checkpoints keep versions only, and history still loads."""
+    with tempfile.TemporaryDirectory() as tmp:
+        saver = SQLiteCheckpointSaver(os.path.join(tmp, "checkpoints.sqlite"))
+        graph = build_echo_graph(saver)
+        config = {"configurable": {"thread_id": "compact_thread"}}
+        for turn in range(5):
+            graph.invoke({"messages": [HumanMessage(content=f"message {turn} " + "y" * 500)]}, config=config)
+
+        checkpoint_sizes = [size for (size,) in saver._execute("SELECT length(checkpoint) FROM checkpoints")]
+        assert max(checkpoint_sizes) < 1024, checkpoint_sizes
+        blob_rows = saver._execute("SELECT count(*) FROM blobs WHERE channel = 'messages'")[0][0]
+        assert blob_rows == 2 * 5  # The human message and the echo of each turn, not one per checkpoint
+
+        history = list(graph.get_state_history(config))
+        assert len(history[0].values["messages"]) == 10 and len(history[2].values["messages"]) == 8
+        assert len(list(saver.list(config, limit=3))) == 3
+        print(f"✅ {len(checkpoint_sizes)} checkpoints, largest {max(checkpoint_sizes)} bytes, {blob_rows} message blobs")
+
+if __name__ == "__main__":
+    test_sqlite_checkpointer_shared_between_workers()
+    test_checkpoints_store_only_changed_channels()
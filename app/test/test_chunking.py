@@ -0,0 +1,35 @@
+from langchain_core.documents import Document
+
+from app.services.chunking import chunk_document, merge_chunks_by_parent, sentence_spans
+from app.tools.qdrant_retrieval import format_basic_results
+
+TEXT = " ".join(f"Sentence number {i} talks about topic {i} in some detail." for i in range(40))
+
+def test_sentence_chunks_overlap_and_merge():
+    """Chunks hold whole sentences within the size limit, overlap, and merge back into the parent."""
+    doc = Document(page_content=TEXT, metadata={"title": "Doc", "department": "AI Research"})
+    spans = sentence_spans(TEXT)
+    assert len(spans) == 40 and TEXT[spans[1][0]:spans[1][1]].startswith("Sentence number 1 ")
+
+    chunks = chunk_document(doc, chunk_size=300, chunk_overlap=80)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        meta = chunk.metadata
+        assert len(chunk.page_content) <= 300 and chunk.page_content.endswith(".")
+        assert TEXT[meta["start"]:meta["end"]] == chunk.page_content
+        assert meta["parent_id"] == chunks[0].metadata["parent_id"] and meta["department"] == "AI Research"
+    assert chunks[1].metadata["start"] < chunks[0].metadata["end"]  # Overlap
+
+    merged = merge_chunks_by_parent(list(reversed(chunks)))
+    assert len(merged) == 1 and merged[0].page_content == TEXT
+
+    gap = merge_chunks_by_parent([chunks[0], chunks[-1]])
+    assert " … " in gap[0].page_content
+
+    # Tools send whole chunks instead of 500-character prefixes
+    formatted = format_basic_results([chunks[-1]])
+    assert chunks[-1].page_content in formatted
+    print(f"✅ {len(chunks)} chunks, merged length {len(merged[0].page_content)}")
+
+if __name__ == "__main__":
+    test_sentence_chunks_overlap_and_merge()
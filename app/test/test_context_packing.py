@@ -0,0 +1,51 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from app.core.graph import build_generation_prompt
+from app.services.context_packing import context_token_budget, pack_context
+from app.services.tokens import TokenCounter
+
+counter = TokenCounter()  # Length estimate, no tiktoken download needed
+
+def passage(title, words):
+    return f"📄 {title}\n🏢 AI Research | 📁 Research Paper | 📅 2023 | 🔒 Public\n📝 {words}"
+
+def test_pack_context_dedupes_and_fills_budget():
+    """Relevant passages first, near-duplicates dropped, oversized passages skipped for smaller ones."""
+    rl = passage("RL", "reinforcement learning trains agents with rewards from an environment over many episodes")
+    long = passage("Survey", "a broad survey of machine learning methods " * 40)
+    small = passage("Note", "agents and rewards")
+    results = ["\n\n".join([long, rl]), "\n\n".join([rl + " today", small])]
+
+    packed = pack_context(results, "How does reinforcement learning use rewards?", budget=60, counter=counter)
+    assert packed.text == "\n\n".join([rl, small])
+    assert (packed.passages, packed.duplicates, packed.skipped, packed.truncated) == (2, 1, 1, False)
+    assert packed.tokens == counter.count(packed.text) <= 60
+
+    packed = pack_context([long], "machine learning survey", budget=30, counter=counter)
+    assert packed.truncated and packed.tokens <= 30
+    print("✅ Packed:", packed.describe())
+
+def test_budget_from_model_window():
+    assert context_token_budget(prompt_tokens=300, max_tokens=512, window=131072, cap=1500) == 1500
+    assert context_token_budget(prompt_tokens=300, max_tokens=512, window=2048, cap=1500) == 1236
+    assert context_token_budget(prompt_tokens=3000, max_tokens=512, window=2048, cap=1500) == 0
+    print("✅ Context budget")
+
+def test_generation_uses_current_turn_only():
+    """Tool results of earlier turns are not packed again."""
+    messages = [
+        HumanMessage(content="What is PCA?"),
+        ToolMessage(content=passage("PCA", "principal component analysis"), tool_call_id="c1"),
+        AIMessage(content="PCA reduces dimensions."),
+        HumanMessage(content="What is an SVM?"),
+        ToolMessage(content=passage("SVM", "support vector machines"), tool_call_id="c2"),
+    ]
+    system = build_generation_prompt({"messages": messages})[0].content
+    assert "support vector machines" in system and "principal component" not in system
+    assert build_generation_prompt({"messages": messages[:4]}) is None
+    print("✅ Turn-scoped context")
+
+if __name__ == "__main__":
+    test_pack_context_dedupes_and_fills_budget()
+    test_budget_from_model_window()
+    test_generation_uses_current_turn_only()
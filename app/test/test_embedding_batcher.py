@@ -0,0 +1,44 @@
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from app.services.embedding_batcher import BatchingEmbeddings
+
+class CountingEmbeddings(Embeddings):
+    """Fake model that records how many forward passes it ran."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(len(texts))
+        time.sleep(0.01)  # Simulate a forward pass
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def test_concurrent_queries_share_forward_pass():
+    """Concurrent embed_query calls are merged into a few batched forward passes."""
+    base = CountingEmbeddings()
+    batcher = BatchingEmbeddings(base, max_batch_size=16, max_wait_ms=20)
+
+    results = {}
+    def worker(i):
+        results[i] = batcher.embed_query("q" * i)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(1, 33)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert all(results[i] == [float(i), 1.0] for i in results)
+    assert len(base.calls) < 32 and max(base.calls) <= 16
+    stats = batcher.stats()
+    assert stats["requests"] == 32
+    print(f"✅ 32 queries embedded in {len(base.calls)} forward passes: {stats}")
+
+if __name__ == "__main__":
+    test_concurrent_queries_share_forward_pass()
@@ -0,0 +1,45 @@
+import tempfile
+
+from langchain_core.embeddings import Embeddings
+
+from app.services.embedding_cache import CachedEmbeddings
+
+class CountingEmbeddings(Embeddings):
+    """Fake model that records every query it embeds."""
+
+    def __init__(self):
+        self.queries = []
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), 0.5, -1.0]
+
+def test_query_cache_memory_and_disk_tiers():
+    """Normalized repeats hit memory; a fresh process reuses the mmap tier."""
+    with tempfile.TemporaryDirectory() as tmp:
+        model = CountingEmbeddings()
+        cache = CachedEmbeddings(model, model_name="fake-model", directory=tmp)
+
+        first = cache.embed_query("What is  RL?")
+        assert cache.embed_query("what is rl?") == first
+        assert model.queries == ["what is rl?"]
+        assert cache.stats()["memory_hits"] == 1
+
+        # Simulate a restart / another worker opening the same store read-only
+        restarted_model = CountingEmbeddings()
+        restarted = CachedEmbeddings(restarted_model, model_name="fake-model", directory=tmp, read_only=True)
+        assert restarted.embed_query("WHAT IS RL?") == first
+        assert restarted_model.queries == []
+        assert restarted.stats()["disk_hits"] == 1
+
+        # A different model name never reuses vectors
+        other = CachedEmbeddings(CountingEmbeddings(), model_name="other-model", directory=tmp)
+        other.embed_query("what is rl?")
+        assert other.stats()["misses"] == 1
+        print(f"✅ Embedding cache stats: {cache.stats()} / {restarted.stats()}")
+
+if __name__ == "__main__":
+    test_query_cache_memory_and_disk_tiers()
@@ -0,0 +1,36 @@
+from app.services.filter_extraction import extract_filters, extract_filters_batch, filter_extractor
+
+def test_most_specific_match_wins():
+    """Multi-word entries beat single words they contain, whole phrases beat partial matches."""
+    assert extract_filters("ml platform engineering")["department"] == "ML Engineering"
+    assert extract_filters("data engineering")["department"] == "Engineering"
+    assert extract_filters("R&D technical reports from 2022") == {
+        "department": "R&D", "doc_type": "Technical Report", "year": 2022,
+    }
+    assert extract_filters("System design documentation")["doc_type"] == "System Design"
+    # Whole words only: "international" is not "internal", "news" is not "new"
+    assert extract_filters("international news") == {}
+    assert extract_filters("latest tutorials")["year"] == 2024
+    assert extract_filters("latest tutorials from 2021")["year"] == 2021
+    # Only "since"/"starting"/"onwards"/"or later" open a range; a bare "from" keeps the exact year
+    assert extract_filters("reports from 2022")["year"] == 2022
+    assert extract_filters("reports starting from 2022")["year"] == {"gte": 2022}
+    assert extract_filters("reports from 2020 to 2022")["year"] == {"gte": 2020, "lte": 2022}
+    print("✅ Most specific filters extracted")
+
+def test_batch_extraction_and_analysis():
+    """Batches match one-by-one extraction and return independent dicts; analyze agrees with extract."""
+    queries = ["AI research papers 2020-2023", "hello", "AI research papers 2020-2023"]
+    results = extract_filters_batch(queries)
+    assert results == [extract_filters(query) for query in queries]
+    results[0]["year"]["gte"] = 1999
+    assert results[2]["year"]["gte"] == 2020
+
+    analysis = filter_extractor.analyze("ml platform engineering")
+    selected = [match for match in analysis["fields"]["department"] if match["selected"]]
+    assert [(match["value"], match["match_type"]) for match in selected] == [("ML Engineering", "partial")]
+    print("✅ Batch extraction and analysis agree")
+
+if __name__ == "__main__":
+    test_most_specific_match_wins()
+    test_batch_extraction_and_analysis()
@@ -0,0 +1,53 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from app.core.history import conversation_messages, extractive_summary, plan_history, split_turns
+from app.services.tokens import TokenCounter
+
+counter = TokenCounter()  # Length estimate, no tiktoken download needed
+
+def turn(i, with_tools=True, answer_words=20):
+    messages = [HumanMessage(content=f"question {i}", id=f"h{i}")]
+    if with_tools:
+        messages += [
+            AIMessage(content="", tool_calls=[{"name": "retrieve", "args": {"query": f"question {i}"}, "id": f"c{i}"}], id=f"t{i}"),
+            ToolMessage(content="document " * 500, tool_call_id=f"c{i}", id=f"r{i}"),
+        ]
+    return messages + [AIMessage(content="answer " * answer_words, id=f"a{i}")]
+
+def ids(messages):
+    return [message.id for message in messages]
+
+def test_stale_tool_payloads_are_dropped():
+    """Older turns lose their tool calls and results; the current turn is untouched."""
+    messages = turn(1) + turn(2) + [HumanMessage(content="question 3", id="h3")]
+    assert len(split_turns(messages)) == 3
+    removed, folded = plan_history(messages, max_turns=6, keep_turns=3, token_budget=2000, counter=counter)
+    assert ids(removed) == ["t1", "r1", "t2", "r2"] and folded == []
+    print("✅ Stale tool payloads dropped")
+
+def test_old_turns_fold_with_hysteresis():
+    """Past max_turns the thread is cut back to keep_turns, and to fewer if over the token budget."""
+    messages = [m for i in range(1, 4) for m in turn(i, with_tools=False)] + [HumanMessage(content="question 4", id="h4")]
+    assert plan_history(messages, max_turns=4, keep_turns=2, token_budget=2000, counter=counter) == ([], [])
+
+    messages += turn(4, with_tools=False)[1:] + [HumanMessage(content="question 5", id="h5")]
+    removed, folded = plan_history(messages, max_turns=4, keep_turns=2, token_budget=2000, counter=counter)
+    assert ids(removed) == ["h1", "a1", "h2", "a2", "h3", "a3"] and len(folded) == 3
+
+    removed, folded = plan_history(messages, max_turns=6, keep_turns=3, token_budget=40, counter=counter)
+    assert ids(removed) == ["h1", "a1", "h2", "a2", "h3", "a3", "h4", "a4"] and len(folded) == 4
+    print("✅ Old turns folded")
+
+def test_summary_is_prepended_and_bounded():
+    state = {"messages": [HumanMessage(content="question 2")], "summary": "We discussed PCA."}
+    assert conversation_messages(state)[0].content.endswith("We discussed PCA.")
+    assert conversation_messages({"messages": state["messages"]}) == state["messages"]
+
+    summary = extractive_summary("We discussed PCA.", [turn(i, with_tools=False, answer_words=100) for i in range(10)], max_tokens=100, counter=counter)
+    assert counter.count(summary) <= 100 and "question 9" in summary
+    print("✅ Summary:", summary[:60])
+
+if __name__ == "__main__":
+    test_stale_tool_payloads_are_dropped()
+    test_old_turns_fold_with_hysteresis()
+    test_summary_is_prepended_and_bounded()
@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import threading
+from functools import partial
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams
+
+from app.services.ingestion import ingest_file, iter_json_records, scan_collection
+
+def write_corpus(path, n_docs, jsonl=False):
+    records = [
+        {"content": " ".join(f"Document {i} sentence {j} is here." for j in range(30)),
+         "metadata": {"title": f"Doc {i}", "department": "AI Research"}}
+        for i in range(n_docs)
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        if jsonl:
+            f.write("\n".join(json.dumps(r) for r in records))
+        else:
+            json.dump(records, f, indent=2)
+    return records
+
+class LockedClient:
+    """In-memory Qdrant client made safe for the pipeline's concurrent upserts (the local mode is not)."""
+
+    def __init__(self, client):
+        self.client = client
+        self._lock = threading.Lock()
+
+    def upsert(self, **kwargs):
+        with self._lock:
+            return self.client.upsert(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+class FlakyClient:
+    """Qdrant client whose upserts start failing after a number of calls."""
+
+    def __init__(self, client, fail_after):
+        self.client = client
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def upsert(self, **kwargs):
+        self.calls += 1
+        if self.calls > self.fail_after:
+            raise ConnectionError("simulated crash")
+        return self.client.upsert(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+def test_streaming_ingestion_resumes_without_duplicates():
+    """Records stream from JSON and JSONL; a crashed run resumes from its checkpoint without duplicate points."""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "docs.json")
+        records = write_corpus(source, 40)
+        assert list(iter_json_records(source, read_size=64)) == records
+        jsonl = os.path.join(tmp, "docs.jsonl")
+        write_corpus(jsonl, 5, jsonl=True)
+        assert len(list(iter_json_records(jsonl, read_size=64))) == 5
+
+        client = LockedClient(QdrantClient(":memory:"))
+        client.create_collection("docs", vectors_config=VectorParams(size=16, distance=Distance.COSINE))
+        options = dict(embed_workers=0, batch_size=20, max_inflight_upserts=2, chunk_size=300, chunk_overlap=50)
+        factory = partial(DeterministicFakeEmbedding, size=16)
+        checkpoints = os.path.join(tmp, "checkpoints")
+
+        try:
+            ingest_file(source, FlakyClient(client, fail_after=3), "docs", factory, checkpoint_dir=checkpoints, **options)
+            raise AssertionError("ingestion should have failed")
+        except ConnectionError:
+            pass
+        assert os.listdir(checkpoints)
+
+        stats = ingest_file(source, client, "docs", factory, checkpoint_dir=checkpoints, **options)
+        assert stats["documents_skipped"] > 0
+        assert stats["documents_skipped"] + stats["documents_read"] == 40
+        assert not os.listdir(checkpoints)
+
+        # Every chunk is stored exactly once
+        full = ingest_file(source, client, "docs", factory, incremental=False, **options)
+        assert client.count("docs").count == full["chunks"]
+        print(f"✅ Ingestion stats: { {k: v for k, v in full.items() if k.endswith('_per_s')} }")
+
+def test_incremental_reindex_touches_only_deltas():
+    """A re-run embeds only new/changed documents and deletes removed ones and leftover chunks."""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "docs.json")
+        records = write_corpus(source, 10)
+        client = LockedClient(QdrantClient(":memory:"))
+        client.create_collection("docs", vectors_config=VectorParams(size=16, distance=Distance.COSINE))
+        options = dict(embed_workers=0, batch_size=20, max_inflight_upserts=2, chunk_size=300, chunk_overlap=50)
+        factory = partial(DeterministicFakeEmbedding, size=16)
+
+        first = ingest_file(source, client, "docs", factory, **options)
+        assert first["documents_new"] == 10
+        points = client.count("docs").count
+
+        unchanged = ingest_file(source, client, "docs", factory, **options)
+        assert unchanged["documents_unchanged"] == 10 and unchanged["chunks"] == 0
+        assert client.count("docs").count == points
+
+        # Shorten one document, edit another, drop one, add one
+        records[0]["content"] = "Now a single short sentence."
+        records[1]["metadata"]["department"] = "Data Science"
+        removed = records.pop(2)
+        records.append({"content": "A brand new document.", "metadata": {"title": "Doc new"}})
+        with open(source, "w", encoding="utf-8") as f:
+            json.dump(records, f)
+
+        delta = ingest_file(source, client, "docs", factory, **options)
+        assert (delta["documents_new"], delta["documents_changed"], delta["documents_unchanged"],
+                delta["documents_removed"]) == (1, 2, 7, 1)
+
+        existing, untracked = scan_collection(client, "docs")
+        assert not untracked and len(existing) == 10
+        titles = [p.payload["metadata"]["title"] for p in client.scroll("docs", limit=1000)[0]]
+        assert titles.count("Doc 0") == 1  # The shortened document left no stale chunks behind
+        assert removed["metadata"]["title"] not in titles and "Doc new" in titles
+        full = ingest_file(source, client, "docs", factory, incremental=False, **options)
+        assert client.count("docs").count == full["chunks"]
+        print(f"✅ Incremental re-index: {delta['documents_new']} new, {delta['documents_changed']} changed, "
+              f"{delta['points_deleted']} points deleted")
+
+if __name__ == "__main__":
+    test_streaming_ingestion_resumes_without_duplicates()
+    test_incremental_reindex_touches_only_deltas()
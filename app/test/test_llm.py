@@ -1,8 +1,11 @@
-from app.services.llm import llm, embeddings
+from app.services.llm import get_llm, get_embeddings
 
 def test_models():
     """Test that both models are working"""
     try:
+        llm = get_llm()
+        embeddings = get_embeddings()
+
         # Test LLM
         test_response = llm.invoke("Hello, are you working?")
         print(f"✅ LLM test: {test_response.content[:100]}...")
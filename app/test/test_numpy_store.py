@@ -0,0 +1,49 @@
+import asyncio
+import os
+import tempfile
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services.numpy_store import NumpyVectorStore
+from app.services.qdrant_store import build_qdrant_filter
+
+DOCS = [
+    Document(page_content="Reinforcement learning trains agents with rewards.",
+             metadata={"title": "RL", "department": "AI Research", "doc_type": "Research Paper", "year": 2021, "tags": ["ai"]}),
+    Document(page_content="PCA is a linear dimensionality reduction technique.",
+             metadata={"title": "PCA", "department": "Data Science", "doc_type": "Tutorial", "year": 2023, "tags": ["data"]}),
+    Document(page_content="Support vector machines are max-margin classifiers.",
+             metadata={"title": "SVM", "department": "ML Engineering", "doc_type": "Technical Guide", "year": 2019, "tags": ["ai"]}),
+]
+
+def titles(docs):
+    return [doc.metadata["title"] for doc in docs]
+
+def test_numpy_store_search_filters_and_persistence():
+    """Exact matches rank first, filters narrow results, and a saved index reloads memory-mapped."""
+    store = NumpyVectorStore.from_documents(DOCS, DeterministicFakeEmbedding(size=64))
+
+    assert titles(store.similarity_search(DOCS[1].page_content, k=1)) == ["PCA"]
+    assert len(store.similarity_search("anything", k=10)) == 3
+    assert titles(store.similarity_search(DOCS[1].page_content, k=3, filter=build_qdrant_filter({"department": "AI Research"}))) == ["RL"]
+    assert titles(store.similarity_search("anything", k=3, filter={"year": 2019, "doc_type": "Technical Guide"})) == ["SVM"]
+    assert sorted(titles(store.similarity_search("anything", k=3, filter={"tags": "ai"}))) == ["RL", "SVM"]
+    assert store.similarity_search("anything", k=3, filter={"department": "Unknown"}) == []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store.save(tmp)
+        loaded = NumpyVectorStore.load(tmp, store.embedding, mmap=True)
+        assert len(loaded) == 3
+        results = asyncio.run(loaded.asimilarity_search(DOCS[2].page_content, k=1))
+        assert titles(results) == ["SVM"]
+
+        # Re-saving swaps in a new version; only it and the one it replaced stay on disk
+        NumpyVectorStore.from_documents(DOCS[:1], store.embedding).save(tmp)
+        NumpyVectorStore.from_documents(DOCS[:2], store.embedding).save(tmp)
+        assert len(NumpyVectorStore.load(tmp, store.embedding)) == 2
+        assert len([name for name in os.listdir(tmp) if os.path.isdir(os.path.join(tmp, name))]) == 2
+        print(f"✅ Numpy vector store returned: {titles(results)}")
+
+if __name__ == "__main__":
+    test_numpy_store_search_filters_and_persistence()
@@ -0,0 +1,67 @@
+import os
+import re
+import tempfile
+
+import numpy as np
+import pytest
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from app.services.onnx_embeddings import INT8_MODEL_FILE, OnnxEmbeddings, export_onnx_model
+from config.settings import EMBEDDING_MODEL_NAME, ONNX_MODEL_DIR
+
+SENTENCES = [
+    "What is machine learning?",
+    "Explain reinforcement learning",
+    "Principal component analysis (PCA) reduces dimensionality.",
+    "Support vector machines find a maximum-margin hyperplane between classes.",
+    "Show me research papers about neural networks from the AI Research department",
+]
+
+def cosine_similarity(a, b):
+    a, b = np.array(a), np.array(b)
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+def save_tiny_encoder(directory: str):
+    """A small random BERT encoder with a vocabulary built from SENTENCES."""
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    words = sorted({word for sentence in SENTENCES for word in re.findall(r"\w+|[^\w\s]", sentence.lower())})
+    vocab_file = os.path.join(directory, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words))
+
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=len(words) + 5, hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64)
+    BertModel(config).eval().save_pretrained(directory)
+    BertTokenizerFast(vocab_file=vocab_file).save_pretrained(directory)
+
+def test_exported_model_parity_with_torch():
+    """Export a small encoder, then compare ONNX (fp32 and int8) vectors with the torch model."""
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir, onnx_dir = os.path.join(tmp, "model"), os.path.join(tmp, "onnx")
+        os.makedirs(model_dir)
+        save_tiny_encoder(model_dir)
+        export_onnx_model(model_dir, onnx_dir)
+
+        torch_vectors = HuggingFaceEmbeddings(model_name=model_dir).embed_documents(SENTENCES)
+        fp32 = cosine_similarity(torch_vectors, OnnxEmbeddings(onnx_dir, quantized=False).embed_documents(SENTENCES))
+        int8 = cosine_similarity(torch_vectors, OnnxEmbeddings(onnx_dir).embed_documents(SENTENCES))
+    print(f"✅ Cosine similarity torch vs ONNX: fp32 min {fp32.min():.6f}, int8 min {int8.min():.4f}")
+    assert fp32.min() > 0.9999
+    assert int8.min() > 0.99
+
+def test_onnx_parity_with_torch():
+    """Quantized ONNX vectors of the configured model stay within cosine 0.99 of the torch model."""
+    if not os.path.exists(os.path.join(ONNX_MODEL_DIR, INT8_MODEL_FILE)):
+        pytest.skip("ONNX model not exported; run `python -m app.services.onnx_embeddings --export`")
+
+    torch_vectors = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME).embed_documents(SENTENCES)
+    cosine = cosine_similarity(torch_vectors, OnnxEmbeddings(ONNX_MODEL_DIR).embed_documents(SENTENCES))
+    print(f"✅ Cosine similarity torch vs int8 ONNX: min {cosine.min():.4f}, mean {cosine.mean():.4f}")
+    assert cosine.min() > 0.99
+
+if __name__ == "__main__":
+    test_exported_model_parity_with_torch()
+    test_onnx_parity_with_torch()
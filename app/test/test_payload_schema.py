@@ -0,0 +1,67 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.messages import AIMessage
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+from app.core.graph import push_down_filters
+from app.services.filter_extraction import extract_year_filter
+from app.services.numpy_store import NumpyVectorStore, filter_to_dict
+from app.services.qdrant_store import build_qdrant_filter
+from app.tools.qdrant_retrieval import extract_filters_from_query
+
+DOCS = [
+    Document(page_content=f"Document about topic {year}.",
+             metadata={"title": f"Doc {year}", "department": "AI Research", "year": year, "tags": ["ai", str(year)]})
+    for year in range(2018, 2025)
+]
+
+def titles(docs):
+    return sorted(doc.metadata["title"] for doc in docs)
+
+def test_filters_push_down_to_qdrant_and_numpy():
+    """Exact, tag and year-range filters select the same documents in Qdrant and in the numpy store."""
+    embedding = DeterministicFakeEmbedding(size=16)
+    client = QdrantClient(":memory:")
+    client.create_collection("docs", vectors_config=VectorParams(size=16, distance=Distance.COSINE))
+    client.upsert("docs", points=[
+        PointStruct(id=i, vector=embedding.embed_query(doc.page_content),
+                    payload={"page_content": doc.page_content, "metadata": doc.metadata})
+        for i, doc in enumerate(DOCS)
+    ])
+    store = NumpyVectorStore.from_documents(DOCS, embedding)
+
+    cases = [
+        ({"department": "AI Research", "year": {"gte": 2020, "lte": 2023}}, ["Doc 2020", "Doc 2021", "Doc 2022", "Doc 2023"]),
+        ({"year": extract_year_filter("since 2023")}, ["Doc 2023", "Doc 2024"]),
+        ({"tags": "2019"}, ["Doc 2019"]),
+        ({"year": 2018}, ["Doc 2018"]),
+    ]
+    for filters, expected in cases:
+        qdrant_filter = build_qdrant_filter(filters)
+        assert all(condition.key.startswith("metadata.") for condition in qdrant_filter.must)
+        assert filter_to_dict(qdrant_filter) == filters
+        points = client.query_points("docs", query=embedding.embed_query("topic"), limit=10,
+                                     query_filter=qdrant_filter).points
+        assert sorted(p.payload["metadata"]["title"] for p in points) == expected
+        assert titles(store.similarity_search("topic", k=10, filter=qdrant_filter)) == expected
+    print("✅ Filters pushed down identically to Qdrant and numpy")
+
+def test_extracted_filters_reach_the_tool_call():
+    """Filters the LLM omitted from its tool call are filled in from the query."""
+    query = "AI Research papers from 2020-2023 that are confidential"
+    filters = extract_filters_from_query(query)
+    assert filters["year"] == {"gte": 2020, "lte": 2023}
+    assert filters["security_level"] == "Confidential"
+
+    response = AIMessage(content="", tool_calls=[
+        {"name": "retrieve_with_filters", "args": {"query": "AI papers", "department": "AI Research"}, "id": "call_1"},
+    ])
+    args = push_down_filters(response, filters).tool_calls[0]["args"]
+    assert args["department"] == "AI Research"
+    assert (args["year_from"], args["year_to"], args["security_level"]) == (2020, 2023, "Confidential")
+    print(f"✅ Tool call arguments: {args}")
+
+if __name__ == "__main__":
+    test_filters_push_down_to_qdrant_and_numpy()
+    test_extracted_filters_reach_the_tool_call()
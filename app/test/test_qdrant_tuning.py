@@ -0,0 +1,77 @@
+from qdrant_client import QdrantClient
+from qdrant_client.models import Disabled, ScalarType
+
+from app.services.cache import RetrievalCache
+from app.services.qdrant_store import (
+    build_search_params, collection_config, collection_config_update, current_search_params, request_search_params,
+)
+
+def test_collection_config():
+    """HNSW parameters, int8 quantization and on-disk vectors reach create_collection."""
+    config = collection_config(384, m=32, ef_construct=200, quantization=True, on_disk=True, quantile=0.95)
+    assert (config["hnsw_config"].m, config["hnsw_config"].ef_construct) == (32, 200)
+    assert config["vectors_config"].size == 384 and config["vectors_config"].on_disk
+    scalar = config["quantization_config"].scalar
+    assert (scalar.type, scalar.quantile, scalar.always_ram) == (ScalarType.INT8, 0.95, True)
+    assert collection_config(384, quantization=False)["quantization_config"] is None
+    print("✅ Collection config:", config)
+
+def test_per_query_search_params():
+    """Per-query hnsw_ef/exact build search params, rescoring only applies to quantized collections,
+    and overridden searches are cached apart from default ones."""
+    assert build_search_params(hnsw_ef=0, exact=False, quantized=False) is None
+    params = build_search_params(hnsw_ef=128, exact=False, quantized=False)
+    assert (params.hnsw_ef, params.exact, params.quantization) == (128, False, None)
+    quantized = build_search_params(hnsw_ef=0, exact=False, rescore=True, oversampling=3.0, quantized=True)
+    assert quantized.hnsw_ef is None
+    assert (quantized.quantization.rescore, quantized.quantization.oversampling) == (True, 3.0)
+
+    exact = build_search_params(exact=True, quantized=False)
+    keys = {RetrievalCache.make_key("what is rl", None, 3, search_params=p) for p in (None, params, exact)}
+    assert len(keys) == 3
+    print("✅ Search params:", params, exact)
+
+def test_existing_collection_config_update():
+    """An existing collection gets only the settings that differ from its config."""
+    client = QdrantClient(":memory:")
+    client.create_collection("docs", **collection_config(8, m=16, ef_construct=100, quantization=False, on_disk=False))
+    current = client.get_collection("docs").config
+
+    assert collection_config_update(current, m=16, ef_construct=100, quantization=False, on_disk=False) == {}
+    update = collection_config_update(current, m=32, ef_construct=100, quantization=True, on_disk=True, quantile=0.95)
+    assert (update["hnsw_config"].m, update["hnsw_config"].ef_construct) == (32, 100)
+    assert update["quantization_config"].scalar.quantile == 0.95
+    assert update["vectors_config"][""].on_disk is True
+
+    current.quantization_config = update["quantization_config"]
+    assert collection_config_update(current, m=16, ef_construct=100, quantization=False, on_disk=False) == {
+        "quantization_config": Disabled.DISABLED
+    }
+    print("✅ Collection config update:", sorted(update))
+
+def test_request_search_params_reach_the_tools():
+    """Chat requests set hnsw_ef/exact for the retrieval tools through the request context."""
+    from app.tools import qdrant_retrieval
+
+    seen = []
+    def fake_search(query, k=4, filters=None, search_params=None):
+        seen.append(search_params)
+        return []
+
+    params = build_search_params(hnsw_ef=256, exact=False, quantized=False)
+    original = qdrant_retrieval.cached_similarity_search
+    qdrant_retrieval.cached_similarity_search = fake_search
+    try:
+        with request_search_params(params):
+            qdrant_retrieval.retrieve.invoke({"query": "what is rl"})
+        qdrant_retrieval.retrieve.invoke({"query": "what is rl"})
+    finally:
+        qdrant_retrieval.cached_similarity_search = original
+    assert seen == [params, None] and current_search_params() is None
+    print("✅ Request search params reach the retrieve tool")
+
+if __name__ == "__main__":
+    test_collection_config()
+    test_per_query_search_params()
+    test_existing_collection_config_update()
+    test_request_search_params_reach_the_tools()
@@ -0,0 +1,99 @@
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_qdrant import QdrantVectorStore
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams
+
+from app.services.bm25 import BM25Index
+from app.services.numpy_store import NumpyVectorStore
+from app.services.qdrant_store import build_qdrant_filter, search_batch, asearch_batch
+from app.services.relaxation import RelaxationStats, RelaxedResult, relaxation_ladder, select_most_specific
+
+DOCS = [
+    Document(page_content=f"Transformer attention notes from {year}.",
+             metadata={"title": f"{department} {year}", "department": department, "doc_type": "Research Paper",
+                       "year": year, "security_level": "Internal"})
+    for department, year in [("AI Research", 2021), ("AI Research", 2022), ("Engineering", 2024)]
+]
+
+def test_ladder_drops_least_reliable_filters_first():
+    """Year goes first, then security level and doc type; the last rung is unfiltered."""
+    filters = {"department": "AI Research", "doc_type": "Research Paper", "year": 2024,
+               "security_level": "Internal", "tags": None}
+    ladder = relaxation_ladder(filters)
+    assert [sorted(rung) for rung in ladder] == [
+        ["department", "doc_type", "security_level", "year"],
+        ["department", "doc_type", "security_level"],
+        ["department", "doc_type"],
+        ["department"],
+        [],
+    ]
+    assert relaxation_ladder({}) == [{}]
+    print("✅ Relaxation ladder:", ladder)
+
+def test_most_specific_non_empty_rung_wins():
+    """One batched search over the ladder picks the strictest rung with results, on Qdrant and numpy."""
+    embedding = DeterministicFakeEmbedding(size=16)
+    client = QdrantClient(":memory:")
+    client.create_collection("docs", vectors_config=VectorParams(size=16, distance=Distance.COSINE))
+    qdrant = QdrantVectorStore(client=client, collection_name="docs", embedding=embedding)
+    qdrant.add_documents(DOCS)
+    numpy_store = NumpyVectorStore.from_documents(DOCS, embedding)
+
+    # No AI Research paper from 2024: dropping the year is enough
+    ladder = relaxation_ladder({"department": "AI Research", "doc_type": "Research Paper", "year": 2024})
+    qdrant_filters = [build_qdrant_filter(rung) for rung in ladder]
+    stats = RelaxationStats()
+    for dense in (
+        search_batch(qdrant, "attention", k=5, filters=qdrant_filters),
+        search_batch(numpy_store, "attention", k=5, filters=qdrant_filters),
+        asyncio.run(asearch_batch(numpy_store, "attention", k=5, filters=qdrant_filters)),
+    ):
+        assert [len(results) for results in dense] == [0, 2, 2, 3]
+        result = select_most_specific(3, ladder, dense, lexical=None)
+        assert (result.level, result.dropped) == (1, ["year"])
+        assert sorted(doc.metadata["title"] for doc in result.documents) == ["AI Research 2021", "AI Research 2022"]
+        assert "year" in result.note()
+        stats.record(result)
+
+    # Fused with BM25, the strict rung wins when it has matches
+    ladder = relaxation_ladder({"department": "Engineering", "year": 2024})
+    qdrant_filters = [build_qdrant_filter(rung) for rung in ladder]
+    bm25 = BM25Index.from_documents(DOCS)
+    lexical = [bm25.search("attention", 5, rung) for rung in ladder]
+    result = select_most_specific(3, ladder, search_batch(qdrant, "attention", k=5, filters=qdrant_filters), lexical)
+    assert (result.level, result.note()) == (0, "")
+    stats.record(result)
+
+    assert stats.stats()["levels"] == {"0": 1, "1": 3}
+    assert stats.stats()["dropped_fields"] == {"year": 3}
+    print(f"✅ Relaxed search: {stats.stats()}")
+
+def test_unformatted_results_report_the_relaxation():
+    """API callers of enhanced_retrieval see which filters were dropped next to the documents."""
+    from app.tools import qdrant_retrieval
+
+    strict = {"department": "AI Research", "year": 2024}
+    relaxed = RelaxedResult(DOCS[:2], 1, {"department": "AI Research"}, strict)
+    patched = {
+        "get_vector_store": lambda: object(),
+        "filtered_retrieval": lambda query, filters=None, k=5, search_params=None: (relaxed.documents, relaxed),
+    }
+    originals = {name: getattr(qdrant_retrieval, name) for name in patched}
+    for name, value in patched.items():
+        setattr(qdrant_retrieval, name, value)
+    try:
+        result = qdrant_retrieval.enhanced_retrieval("attention", filters=strict)
+    finally:
+        for name, value in originals.items():
+            setattr(qdrant_retrieval, name, value)
+    assert result == {"documents": DOCS[:2], "relaxation": {"level": 1, "dropped": ["year"]}}
+    assert qdrant_retrieval.relaxation_info(None) == {"level": 0, "dropped": []}
+    print(f"✅ Unformatted relaxation: {result['relaxation']}")
+
+if __name__ == "__main__":
+    test_ladder_drops_least_reliable_filters_first()
+    test_most_specific_non_empty_rung_wins()
+    test_unformatted_results_report_the_relaxation()
@@ -0,0 +1,76 @@
+import time
+
+from langchain_core.documents import Document
+
+from app.services.latency import request_budget, stage_timings, timed_stage
+from app.services import reranker as reranker_module
+from app.services.registry import ServiceRegistry
+from app.services.reranker import CrossEncoderReranker, load_reranker
+
+class KeywordCrossEncoder:
+    """Stand-in cross-encoder: scores a pair by how often the query's words occur in the passage."""
+
+    def __init__(self, delay_ms=0.0):
+        self.delay_ms = delay_ms
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32):
+        self.batches.append(len(pairs))
+        time.sleep(self.delay_ms * len(pairs) / 1000)
+        return [sum(passage.lower().count(word) for word in query.lower().split()) for query, passage in pairs]
+
+DOCS = [Document(page_content=text, metadata={"title": str(i)}) for i, text in enumerate([
+    "Gradient boosting builds an ensemble of trees.",
+    "PCA projects data onto principal components.",
+    "PCA and SVD: PCA is computed from the SVD of centered data.",
+    "Reinforcement learning optimizes rewards.",
+])]
+
+def test_rerank_orders_candidates_in_one_batch():
+    """All candidates are scored in a single forward pass and the best top_k are kept."""
+    model = KeywordCrossEncoder()
+    reranker = CrossEncoderReranker(model, min_candidates=2, reserve_ms=0)
+    results = reranker.rerank("pca", DOCS, top_k=2)
+    assert [doc.metadata["title"] for doc in results] == ["2", "1"]
+    assert results[0].metadata["rerank_score"] == 2
+    assert model.batches == [4]
+    print("✅ Reranked:", [doc.page_content[:30] for doc in results])
+
+def test_latency_budget_truncates_or_skips_rerank():
+    """A nearly spent budget reranks fewer candidates, then none; stage timings reach the request."""
+    reranker = CrossEncoderReranker(KeywordCrossEncoder(delay_ms=2), min_candidates=2, reserve_ms=100)
+    reranker.rerank("pca", DOCS, top_k=2)  # Learns the per-pair cost
+    assert reranker.affordable(4, remaining_ms=None) == 4
+
+    pair_ms = reranker.pair_ms
+    assert reranker.affordable(4, remaining_ms=100 + 2.5 * pair_ms) == 2
+    results = reranker.rerank("pca", DOCS, top_k=2, remaining_ms=100 + pair_ms)
+    assert [doc.metadata["title"] for doc in results] == ["0", "1"]  # Retrieval order kept
+    assert reranker.stats()["skipped_by_budget"] == 1
+
+    with request_budget(50) as budget:
+        with timed_stage("retrieve"):
+            time.sleep(0.01)
+    assert budget.timings["retrieve"] >= 10 and budget.remaining_ms() < 40
+    assert stage_timings.stats()["retrieve"]["count"] >= 1
+    print(f"✅ Budget-aware rerank: {reranker.stats()}")
+
+def test_warm_up_is_ready_with_reranking_off():
+    """A reranker that is switched off is not a failed service: warm-up still reaches "ready"."""
+    rerank = reranker_module.RERANK
+    reranker_module.RERANK = False
+    try:
+        registry = ServiceRegistry()
+        registry.register("reranker", load_reranker)
+        status = registry.warm_up()
+    finally:
+        reranker_module.RERANK = rerank
+    assert status["state"] == "ready"
+    assert not status["services"]["reranker"]["initialized"] and status["services"]["reranker"]["error"] is None
+    assert registry.get("reranker") is None
+    print(f"✅ Warm-up with reranking off: {status['state']}")
+
+if __name__ == "__main__":
+    test_rerank_orders_candidates_in_one_batch()
+    test_latency_budget_truncates_or_skips_rerank()
+    test_warm_up_is_ready_with_reranking_off()
@@ -1,7 +1,8 @@
-from app.services.qdrant_store import qdrant_vector_store as qdrant_store
+from app.services.qdrant_store import get_vector_store
 
 def test_qdrant_retrieval():
     """Test Qdrant retrieval functionality"""
+    qdrant_store = get_vector_store()
     if not qdrant_store:
         print("❌ Qdrant store not available")
         return
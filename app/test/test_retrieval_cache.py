@@ -0,0 +1,37 @@
+import os
+import tempfile
+import time
+
+from app.services.cache import RetrievalCache
+
+def test_retrieval_cache_ttl_lru_and_stamp():
+    """Entries expire after the TTL, the LRU stays bounded, and stamp bumps invalidate."""
+    with tempfile.TemporaryDirectory() as tmp:
+        stamp_path = os.path.join(tmp, "stamp")
+        cache = RetrievalCache(max_entries=2, ttl_seconds=0.2, stamp_path=stamp_path)
+
+        plain = cache.make_key("what is rl", None, 3)
+        filtered = cache.make_key("what is rl", {"department": "AI Research", "doc_type": None}, 3)
+        assert plain != filtered
+        assert filtered == cache.make_key(" what is rl ", {"department": "AI Research"}, 3)
+
+        cache.set(plain, ["doc"])
+        assert cache.get(plain) == (True, ["doc"])
+        time.sleep(0.25)
+        assert cache.get(plain) == (False, None)
+        assert cache.stats()["expirations"] == 1
+
+        cache.ttl_seconds = 60
+        for i in range(3):
+            cache.set(cache.make_key(f"q{i}", None, 3), [i])
+        assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
+
+        # Another process (e.g. the upload script) touches the stamp file
+        with open(stamp_path, "w") as f:
+            f.write("1")
+        cache._stamp._checked_at -= 1
+        assert cache.get(cache.make_key("q2", None, 3)) == (False, None)
+        print(f"✅ Retrieval cache stats: {cache.stats()}")
+
+if __name__ == "__main__":
+    test_retrieval_cache_ttl_lru_and_stamp()
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+
+from langchain_core.tools import StructuredTool
+
+from app.core.graph import coalesced_tool
+from app.services.single_flight import SingleFlight, normalize_args
+
+def test_sync_callers_share_one_call():
+    """Threads asking for the same key while it runs get the leader's result; later calls run again."""
+    flight, calls, results = SingleFlight("test"), [], []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.1)
+        return "answer"
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", work))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["answer"] * 5 and len(calls) == 1
+
+    assert flight.do("key", work) == "answer" and len(calls) == 2
+    stats = flight.stats()
+    assert (stats["calls"], stats["coalesced"], stats["in_flight"]) == (2, 4, 0)
+    print("✅ Sync single-flight:", stats)
+
+def test_async_callers_share_results_and_errors():
+    flight, calls = SingleFlight("test"), []
+
+    async def work(fail=False):
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        if fail:
+            raise ValueError("boom")
+        return "answer"
+
+    async def run():
+        results = await asyncio.gather(*[flight.ado("key", work) for _ in range(5)])
+        errors = await asyncio.gather(*[flight.ado("bad", lambda: work(fail=True)) for _ in range(3)], return_exceptions=True)
+        return results, errors
+
+    results, errors = asyncio.run(run())
+    assert results == ["answer"] * 5 and len(calls) == 2
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert flight.stats()["coalesced"] == 6 and flight.stats()["errors"] == 1
+    print("✅ Async single-flight:", flight.stats())
+
+def test_keys_ignore_case_whitespace_and_unset_filters():
+    assert normalize_args({"query": "Explain  PCA ", "department": None}) == normalize_args({"query": "explain pca"})
+    assert normalize_args({"query": "pca", "year_from": 2020}) != normalize_args({"query": "pca"})
+    print("✅ Coalescing keys")
+
+def _search(query: str, department: str = None, year: int = None):
+    """Stand-in with the retrieval tools' optional filter arguments."""
+    time.sleep(0.05)
+    return f"{query} | {department} | {year}"
+
+async def _asearch(query: str, department: str = None, year: int = None):
+    """Stand-in with the retrieval tools' optional filter arguments."""
+    await asyncio.sleep(0.05)
+    return f"{query} | {department} | {year}"
+
+def test_coalesced_tool_accepts_omitted_filters():
+    """The wrapped tool takes calls that leave optional filters out, sync and async."""
+    tool = coalesced_tool(StructuredTool.from_function(func=_search, coroutine=_asearch, name="search"))
+    assert tool.invoke({"query": "pca", "department": "Data Science"}) == "pca | Data Science | None"
+
+    async def burst():
+        return await asyncio.gather(*[tool.ainvoke({"query": "PCA "}) for _ in range(3)])
+    assert asyncio.run(burst()) == ["PCA  | None | None"] * 3
+    print("✅ Coalesced tool")
+
+if __name__ == "__main__":
+    test_sync_callers_share_one_call()
+    test_async_callers_share_results_and_errors()
+    test_keys_ignore_case_whitespace_and_unset_filters()
+    test_coalesced_tool_accepts_omitted_filters()
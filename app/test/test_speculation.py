@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from app.services.speculation import SpeculativeRetrieval, match_tool_call
+
+def _search(query: str, department: str = None):
+    """Slow stand-in for a retrieval tool."""
+    time.sleep(0.05)
+    return f"results for {query} in {department}"
+
+async def _asearch(query: str, department: str = None):
+    """Slow stand-in for a retrieval tool."""
+    await asyncio.sleep(0.05)
+    return f"results for {query} in {department}"
+
+search = StructuredTool.from_function(func=_search, coroutine=_asearch, name="search")
+
+def call(query, call_id="call_1", **filters):
+    return {"name": "search", "args": {"query": query, **filters}, "id": call_id}
+
+def test_match_tool_call():
+    """Same tool and filters; the model's query terms must be (mostly) in the speculated query."""
+    speculated = call("Explain reinforcement learning please", department="AI Research")
+    assert match_tool_call(speculated, call("explain reinforcement learning please ", department="AI Research"), 0.8) == "exact"
+    assert match_tool_call(speculated, call("reinforcement learning", department="AI Research"), 0.8) == "close"
+    assert match_tool_call(speculated, call("reinforcement learning", department="Data Science"), 0.8) is None
+    assert match_tool_call(speculated, call("policy gradient methods", department="AI Research"), 0.8) is None
+    print("✅ Tool call matching")
+
+def test_prefetch_hit_miss_and_unused():
+    """A matching prefetch serves the tool call after hiding its latency; others are cancelled."""
+    speculation = SpeculativeRetrieval(match_threshold=0.8)
+
+    prefetch = speculation.start(call("reinforcement learning basics"), search)
+    time.sleep(0.06)  # The LLM call
+    speculation.attach(prefetch, AIMessage(content="", tool_calls=[call("reinforcement learning", "call_1")]))
+    served, taken = speculation.take([call("reinforcement learning", "call_1")])
+    assert served["id"] == "call_1" and speculation.result(taken) == "results for reinforcement learning basics in None"
+
+    prefetch = speculation.start(call("reinforcement learning"), search)
+    speculation.attach(prefetch, AIMessage(content="", tool_calls=[call("support vector machines", "call_2")]))
+    assert speculation.take([call("support vector machines", "call_2")]) == (None, None)
+
+    speculation.attach(speculation.start(call("hello there"), search), AIMessage(content="Hi!"))
+
+    async def async_hit():
+        prefetch = speculation.astart(call("pca tutorial", department="Data Science"), search)
+        speculation.attach(prefetch, AIMessage(content="", tool_calls=[call("pca tutorial", "call_3", department="Data Science")]))
+        _, taken = speculation.take([call("pca tutorial", "call_3", department="Data Science")])
+        return await speculation.aresult(taken)
+    assert asyncio.run(async_hit()) == "results for pca tutorial in Data Science"
+
+    stats = speculation.stats()
+    assert (stats["hits"], stats["close_hits"], stats["misses"], stats["unused"]) == (1, 1, 1, 1)
+    assert stats["hit_rate"] == 0.5 and stats["avg_hidden_ms"] >= 20
+    print(f"✅ Speculation: {stats}")
+
+def test_threads_and_cancellation():
+    """Tool call ids repeat across threads; a queued prefetch is cancelled, a running one is counted as wasted."""
+    speculation = SpeculativeRetrieval(match_threshold=0.8, max_workers=1)
+    calls = []
+    counting = StructuredTool.from_function(func=lambda query: calls.append(query) or _search(query), name="search",
+                                            description="Counting stand-in for a retrieval tool.")
+
+    running = speculation.start(call("reinforcement learning"), counting)
+    queued = speculation.start(call("support vector machines"), counting)
+    time.sleep(0.01)
+    speculation.attach(running, AIMessage(content="", tool_calls=[call("reinforcement learning")]), "thread-a")
+    speculation.attach(queued, AIMessage(content="", tool_calls=[call("decision trees")]), "thread-b")
+
+    assert speculation.take([call("decision trees")], "thread-b") == (None, None)
+    served, taken = speculation.take([call("reinforcement learning")], "thread-a")
+    assert taken is running and speculation.result(taken) == "results for reinforcement learning in None"
+
+    wasted = speculation.start(call("pca tutorial"), counting)
+    time.sleep(0.01)
+    speculation.attach(wasted, AIMessage(content="", tool_calls=[call("k-means clustering")]), "thread-a")
+    assert speculation.take([call("k-means clustering")], "thread-a") == (None, None)
+    wasted.future.result()
+
+    assert calls == ["reinforcement learning", "pca tutorial"]
+    stats = speculation.stats()
+    assert (stats["hits"], stats["misses"], stats["cancelled"], stats["wasted"]) == (1, 2, 1, 1)
+    print(f"✅ Per-thread prefetches and cancellation: {stats}")
+
+if __name__ == "__main__":
+    test_match_tool_call()
+    test_prefetch_hit_miss_and_unused()
+    test_threads_and_cancellation()
@@ -1,249 +1,365 @@
-from langchain_core.tools import tool
-from qdrant_client.models import Filter, FieldCondition, MatchValue
-from app.services.qdrant_store import get_qdrant_vector_store
-from app.services.cache import cached_similarity_search
+from langchain_core.tools import StructuredTool
+from app.services.qdrant_store import get_vector_store, get_async_vector_store, current_search_params
+from app.services.cache import cached_similarity_search, acached_similarity_search
+from app.services.chunking import merge_chunks_by_parent
+from app.services.filter_extraction import extract_filters
+from app.services.latency import timed_stage
+from app.services.relaxation import relaxed_similarity_search, arelaxed_similarity_search
+from app.services.reranker import candidate_count, rerank_documents, arerank_documents
+from config.settings import MERGE_CHUNKS_PER_PARENT, FILTER_RELAXATION
 import time
-import re
-
-# Initialize Qdrant vector store
-try:
-    qdrant_store = get_qdrant_vector_store()
-    print("✅ Vector store initialized in retrieval")
-except Exception as e:
-    print(f"❌ Failed to initialize Qdrant vector store: {e}")
-    qdrant_store = None
-
-@tool
-def retrieve(query: str):
+import logging
+
+logger = logging.getLogger(__name__)
+
+def prepare_passages(retrieved_docs):
+    """Merge retrieved chunks of the same source document when enabled."""
+    return merge_chunks_by_parent(retrieved_docs) if MERGE_CHUNKS_PER_PARENT else retrieved_docs
+
+def passage_text(doc, max_chars: int = 500):
+    """Chunks are sent whole; unchunked (legacy) documents are cut to a prefix."""
+    if "parent_id" in doc.metadata:
+        return doc.page_content
+    return f"{doc.page_content[:max_chars]}..."
+
+def format_basic_results(retrieved_docs):
+    """Format documents returned by the basic retrieve tool."""
+    results = []
+    retrieved_docs = prepare_passages(retrieved_docs)
+    for doc in retrieved_docs:
+        source = doc.metadata.get('source', 'Unknown')
+        title = doc.metadata.get('title', 'No title')
+        department = doc.metadata.get('department', 'N/A')
+        doc_type = doc.metadata.get('doc_type', 'N/A')
+
+        results.append(
+            f"📄 Title: {title}\n"
+            f"🏢 Department: {department} | Type: {doc_type}\n"
+            f"🔗 Source: {source}\n"
+            f"📝 Content: {passage_text(doc)}"
+        )
+    return "\n\n".join(results)
+
+def format_filtered_results(retrieved_docs):
+    """Format documents returned by the filtered retrieve tool."""
+    results = []
+    retrieved_docs = prepare_passages(retrieved_docs)
+    for doc in retrieved_docs:
+        title = doc.metadata.get('title', 'No title')
+        dept = doc.metadata.get('department', 'N/A')
+        doc_type = doc.metadata.get('doc_type', 'N/A')
+        year = doc.metadata.get('year', 'N/A')
+        security = doc.metadata.get('security_level', 'N/A')
+
+        results.append(
+            f"📄 {title}\n"
+            f"🏢 {dept} | 📁 {doc_type} | 📅 {year} | 🔒 {security}\n"
+            f"📝 {passage_text(doc)}"
+        )
+    return "\n\n".join(results)
+
+def relaxation_info(relaxation) -> dict:
+    """Relaxation level and dropped filter fields for API responses (level 0 when the filters held)."""
+    if relaxation is None or not relaxation.documents:
+        return {"level": 0, "dropped": []}
+    return {"level": relaxation.level, "dropped": list(relaxation.dropped)}
+
+def documents_with_relaxation(documents, relaxation=None) -> dict:
+    """Unformatted retrieval result: the documents and how far the filters were relaxed to find them."""
+    return {"documents": documents, "relaxation": relaxation_info(relaxation)}
+
+def with_relaxation_note(formatted: str, relaxation) -> str:
+    """Prefix results with the filters that were dropped to find them, if any."""
+    note = relaxation.note() if relaxation is not None else ""
+    return f"{note}\n\n{formatted}" if note else formatted
+
+def format_enhanced_results(retrieved_docs):
+    """Format documents returned by enhanced retrieval with full content."""
+    results = []
+    retrieved_docs = prepare_passages(retrieved_docs)
+    for doc in retrieved_docs:
+        source = doc.metadata.get('source', 'Unknown')
+        title = doc.metadata.get('title', 'No title')
+        department = doc.metadata.get('department', 'N/A')
+        doc_type = doc.metadata.get('doc_type', 'N/A')
+
+        results.append(
+            f"📄 Title: {title}\n"
+            f"🏢 Department: {department} | Type: {doc_type}\n"
+            f"🔗 Source: {source}\n"
+            f"📝 Content: {doc.page_content}"
+        )
+    return "\n\n".join(results)
+
+def _format_fallback_results(retrieved_docs):
+    result = ""
+    for doc in prepare_passages(retrieved_docs):
+        title = doc.metadata.get('title', 'No title')
+        result += f"📄 {title}:\n{passage_text(doc)}\n\n"
+    return result
+
+def _retrieve(query: str):
     """Retrieve information related to a query with caching using Qdrant."""
     start_time = time.time()
     
     try:
-        # Use cached search results
-        retrieved_docs = cached_similarity_search(query, k=3)
+        # Use cached search results (over-fetched when a reranker narrows them down)
+        with timed_stage("retrieve"):
+            retrieved_docs = cached_similarity_search(query, k=candidate_count(3), search_params=current_search_params())
+        retrieved_docs = rerank_documents(query, retrieved_docs, k=3)
         
         if not retrieved_docs:
             return "No relevant information found."
         
-        # Format results efficiently
-        results = []
-        for doc in retrieved_docs:
-            source = doc.metadata.get('source', 'Unknown')
-            title = doc.metadata.get('title', 'No title')
-            department = doc.metadata.get('department', 'N/A')
-            doc_type = doc.metadata.get('doc_type', 'N/A')
-            
-            results.append(
-                f"📄 Title: {title}\n"
-                f"🏢 Department: {department} | Type: {doc_type}\n"
-                f"🔗 Source: {source}\n"
-                f"📝 Content: {doc.page_content[:500]}..."
-            )
-        
         end_time = time.time()
         print(f"🔍 Basic retrieval took {end_time - start_time:.2f} seconds")
         
-        return "\n\n".join(results)
+        return format_basic_results(retrieved_docs)
         
     except Exception as e:
         print(f"❌ Retrieval error: {e}")
         # Fallback to direct search without cache
         try:
+            qdrant_store = get_vector_store()
             if qdrant_store:
                 retrieved_docs = qdrant_store.similarity_search(query, k=2)
                 if retrieved_docs:
-                    result = ""
-                    for doc in retrieved_docs:
-                        title = doc.metadata.get('title', 'No title')
-                        result += f"📄 {title}:\n{doc.page_content[:500]}...\n\n"
-                    return result
+                    return _format_fallback_results(retrieved_docs)
             return "Error during search. Please try again."
         except Exception as fallback_error:
             print(f"❌ Fallback search failed: {fallback_error}")
             return "Search service unavailable. Please try again later."
 
-def enhanced_retrieval(query: str, filters: dict = None, k: int = 5, return_formatted: bool = False):
+async def _aretrieve(query: str):
+    """Retrieve information related to a query with caching using Qdrant."""
+    start_time = time.time()
+
+    try:
+        with timed_stage("retrieve"):
+            retrieved_docs = await acached_similarity_search(query, k=candidate_count(3),
+                                                             search_params=current_search_params())
+        retrieved_docs = await arerank_documents(query, retrieved_docs, k=3)
+
+        if not retrieved_docs:
+            return "No relevant information found."
+
+        end_time = time.time()
+        print(f"🔍 Basic retrieval took {end_time - start_time:.2f} seconds")
+
+        return format_basic_results(retrieved_docs)
+
+    except Exception as e:
+        print(f"❌ Retrieval error: {e}")
+        try:
+            async_store = get_async_vector_store()
+            if async_store:
+                retrieved_docs = await async_store.asimilarity_search(query, k=2)
+                if retrieved_docs:
+                    return _format_fallback_results(retrieved_docs)
+            return "Error during search. Please try again."
+        except Exception as fallback_error:
+            print(f"❌ Fallback search failed: {fallback_error}")
+            return "Search service unavailable. Please try again later."
+
+retrieve = StructuredTool.from_function(
+    func=_retrieve,
+    coroutine=_aretrieve,
+    name="retrieve",
+)
+
+def _log_relaxation(query: str, relaxation):
+    if relaxation is not None and relaxation.relaxed and relaxation.documents:
+        logger.info(f"Relaxed filters for '{query}' to level {relaxation.level} (dropped {relaxation.dropped})")
+
+def filtered_retrieval(query: str, filters: dict = None, k: int = 5, search_params=None):
+    """Top-k documents for a query and the filter relaxation that produced them (None without relaxation).
+
+    With filters, the strict search and its relaxations go out as one batch and
+    the most specific non-empty result is kept (see app/services/relaxation.py).
+    search_params overrides the configured hnsw_ef/exact for this query.
+    """
+    with timed_stage("retrieve"):
+        if filters and FILTER_RELAXATION:
+            relaxation = relaxed_similarity_search(query, k=candidate_count(k), filters=filters,
+                                                   search_params=search_params)
+            retrieved_docs = relaxation.documents
+        else:
+            relaxation = None
+            retrieved_docs = cached_similarity_search(query, k=candidate_count(k), filters=filters,
+                                                      search_params=search_params)
+    _log_relaxation(query, relaxation)
+    return rerank_documents(query, retrieved_docs, k=k), relaxation
+
+async def afiltered_retrieval(query: str, filters: dict = None, k: int = 5, search_params=None):
+    """Async filtered_retrieval."""
+    with timed_stage("retrieve"):
+        if filters and FILTER_RELAXATION:
+            relaxation = await arelaxed_similarity_search(query, k=candidate_count(k), filters=filters,
+                                                          search_params=search_params)
+            retrieved_docs = relaxation.documents
+        else:
+            relaxation = None
+            retrieved_docs = await acached_similarity_search(query, k=candidate_count(k), filters=filters,
+                                                             search_params=search_params)
+    _log_relaxation(query, relaxation)
+    return await arerank_documents(query, retrieved_docs, k=k), relaxation
+
+def enhanced_retrieval(query: str, filters: dict = None, k: int = 5, return_formatted: bool = False,
+                       search_params=None):
     """Enhanced retrieval with metadata filtering for Qdrant"""
     start_time = time.time()
 
     try:
+        qdrant_store = get_vector_store()
         if not qdrant_store:
-            return [] if not return_formatted else "Vector store not available"
-        
-        # Build search parameters
-        search_kwargs = {"k": k}
-        
-        # Add metadata filtering if provided
-        if filters:
-            conditions = []
-            
-            for key, value in filters.items():
-                if value:  # Only add non-empty filters
-                    conditions.append(
-                        FieldCondition(key=key, match=MatchValue(value=value))
-                    )
-            
-            if conditions:
-                search_kwargs["filter"] = Filter(must=conditions)
+            return documents_with_relaxation([]) if not return_formatted else "Vector store not available"
         
-        # Perform search
-        retrieved_docs = qdrant_store.similarity_search(query, **search_kwargs)
+        # Perform (cached) search with metadata filtering if provided
+        retrieved_docs, relaxation = filtered_retrieval(query, filters=filters, k=k, search_params=search_params)
         
         # Return formatted string if requested
         if return_formatted:
             if not retrieved_docs:
                 return "No relevant information found."
 
-            # Format results efficiently
-            results = []
-            for doc in retrieved_docs:
-                source = doc.metadata.get('source', 'Unknown')
-                title = doc.metadata.get('title', 'No title')
-                department = doc.metadata.get('department', 'N/A')
-                doc_type = doc.metadata.get('doc_type', 'N/A')
-                
-                results.append(
-                    f"📄 Title: {title}\n"
-                    f"🏢 Department: {department} | Type: {doc_type}\n"
-                    f"🔗 Source: {source}\n"
-                    f"📝 Content: {doc.page_content}"
-                )
-        
             end_time = time.time()
             print(f"🔍 Enhanced retrieval took {end_time - start_time:.2f} seconds")
         
-            return "\n\n".join(results)
+            return with_relaxation_note(format_enhanced_results(retrieved_docs), relaxation)
         else:
-            # Return raw document objects for API endpoints
+            # Return raw document objects for API endpoints, with the filters that had to be dropped
             end_time = time.time()
             print(f"🔍 Qdrant retrieval took {end_time - start_time:.2f} seconds")
-            return retrieved_docs
+            return documents_with_relaxation(retrieved_docs, relaxation)
         
     except Exception as e:
         print(f"❌ Enhanced retrieval error: {e}")
-        return []
+        return [] if return_formatted else documents_with_relaxation([])
 
-@tool
-def retrieve_with_filters(query: str, department: str = None, doc_type: str = None):
-    """Retrieve information with metadata filtering."""
+async def aenhanced_retrieval(query: str, filters: dict = None, k: int = 5, return_formatted: bool = False,
+                              search_params=None):
+    """Async enhanced retrieval with metadata filtering for Qdrant"""
     start_time = time.time()
-    
+
     try:
-        # Build filters
-        filters = {}
-        if department and department.lower() != "any":
-            filters["department"] = department
-        if doc_type and doc_type.lower() != "any":
-            filters["doc_type"] = doc_type
+        async_store = get_async_vector_store()
+        if not async_store:
+            return documents_with_relaxation([]) if not return_formatted else "Vector store not available"
 
+        retrieved_docs, relaxation = await afiltered_retrieval(query, filters=filters, k=k,
+                                                               search_params=search_params)
+
+        if return_formatted:
+            if not retrieved_docs:
+                return "No relevant information found."
+
+            end_time = time.time()
+            print(f"🔍 Enhanced retrieval took {end_time - start_time:.2f} seconds")
+
+            return with_relaxation_note(format_enhanced_results(retrieved_docs), relaxation)
+        else:
+            end_time = time.time()
+            print(f"🔍 Qdrant retrieval took {end_time - start_time:.2f} seconds")
+            return documents_with_relaxation(retrieved_docs, relaxation)
+
+    except Exception as e:
+        print(f"❌ Enhanced retrieval error: {e}")
+        return [] if return_formatted else documents_with_relaxation([])
+
+# Filterable fields the retrieve_with_filters tool exposes as arguments (besides the year range)
+TOOL_FILTER_FIELDS = ("department", "doc_type", "security_level", "project")
+
+def tool_args_to_filters(department: str = None, doc_type: str = None, security_level: str = None,
+                         project: str = None, year: int = None, year_from: int = None, year_to: int = None):
+    """Metadata filters for retrieve_with_filters arguments ("any" and unset arguments are dropped)."""
+    filters = {}
+    for field, value in zip(TOOL_FILTER_FIELDS, (department, doc_type, security_level, project)):
+        if value and value.lower() != "any":
+            filters[field] = value
+    if year:
+        filters["year"] = int(year)
+    elif year_from or year_to:
+        filters["year"] = {
+            bound: int(value) for bound, value in (("gte", year_from), ("lte", year_to)) if value
+        }
+    return filters
+
+def filters_to_tool_args(filters: dict) -> dict:
+    """Inverse of tool_args_to_filters: retrieve_with_filters arguments for extracted filters."""
+    args = {field: filters[field] for field in TOOL_FILTER_FIELDS if filters.get(field)}
+    year = filters.get("year")
+    if isinstance(year, dict):
+        if "gte" in year or "gt" in year:
+            args["year_from"] = year["gte"] if "gte" in year else year["gt"] + 1
+        if "lte" in year or "lt" in year:
+            args["year_to"] = year["lte"] if "lte" in year else year["lt"] - 1
+    elif year:
+        args["year"] = year
+    return args
+
+def _retrieve_with_filters(query: str, department: str = None, doc_type: str = None, security_level: str = None,
+                           project: str = None, year: int = None, year_from: int = None, year_to: int = None):
+    """Retrieve information with metadata filtering.
+
+    Filter by department, doc_type, security_level, project, an exact year,
+    or a year range (year_from and/or year_to, inclusive).
+    """
+    start_time = time.time()
+    
+    try:
         # Perform filtered search
-        retrieved_docs = enhanced_retrieval(query, filters=filters, k=3, return_formatted=False)
+        filters = tool_args_to_filters(department, doc_type, security_level, project, year, year_from, year_to)
+        retrieved_docs, relaxation = filtered_retrieval(query, filters=filters, k=3, search_params=current_search_params())
         
         if not retrieved_docs:
             return "No relevant information found with the specified filters."
         
-        # Format results
-        results = []
-        for doc in retrieved_docs:
-            title = doc.metadata.get('title', 'No title')
-            dept = doc.metadata.get('department', 'N/A')
-            doc_type = doc.metadata.get('doc_type', 'N/A')
-            year = doc.metadata.get('year', 'N/A')
-            security = doc.metadata.get('security_level', 'N/A')
-            
-            results.append(
-                f"📄 {title}\n"
-                f"🏢 {dept} | 📁 {doc_type} | 📅 {year} | 🔒 {security}\n"
-                f"📝 {doc.page_content[:500]}..."
-            )
-        
         end_time = time.time()
         print(f"🔍 Filtered retrieval took {end_time - start_time:.2f} seconds")
         
-        return "\n\n".join(results)
+        return with_relaxation_note(format_filtered_results(retrieved_docs), relaxation)
         
     except Exception as e:
         print(f"❌ Filtered retrieval error: {e}")
         return "Error during filtered search. Please try again."
 
-def extract_filters_from_query(query: str):
-    """Extract potential filters from user query with improved matching"""
-    filters = {}
-    query_lower = query.lower().strip()
-    
-    # Department filters with better matching
-    departments = {
-        "ai research": "AI Research",
-        "ml engineering": "ML Engineering", 
-        "data science": "Data Science",
-        "product": "Product",
-        "engineering": "Engineering",
-        "r&d": "R&D",
-        "analytics": "Analytics",
-        "platform": "Platform"
-    }
-    
-    for dept_key, dept_value in departments.items():
-        if dept_key in query_lower:
-            filters["department"] = dept_value
-            break
-        # Also check for partial matches
-        elif any(word in query_lower.split() for word in dept_key.split()):
-            filters["department"] = dept_value
-            break
-    
-    # Document type filters with better matching
-    doc_types = {
-        "research paper": "Research Paper",
-        "technical guide": "Technical Guide",
-        "api documentation": "API Documentation",
-        "best practices": "Best Practices",
-        "implementation guide": "Implementation Guide",
-        "technical report": "Technical Report",
-        "system design": "System Design",
-        "tutorial": "Tutorial",
-        "paper": "Research Paper",
-        "guide": "Technical Guide",
-        "documentation": "API Documentation",
-        "report": "Technical Report",
-        "design": "System Design"
-    }
-    
-    for doc_key, doc_value in doc_types.items():
-        if doc_key in query_lower:
-            filters["doc_type"] = doc_value
-            break
-        # Check for individual words
-        elif any(word in query_lower.split() for word in doc_key.split()):
-            filters["doc_type"] = doc_value
-            break
-    
-    # Year filters (looking for years 2018-2025)
-    year_pattern = r'\b(20[1-2][0-9])\b'
-    year_matches = re.findall(year_pattern, query)
-    if year_matches:
-        filters["year"] = int(year_matches[0])
-    
-    # Additional context-based filters
-    words = query_lower.split()
-    
-    # Check for time-related words
-    time_words = ["recent", "latest", "new", "current", "old", "previous", "past"]
-    for word in time_words:
-        if word in query_lower:
-            if word in ["recent", "latest", "new", "current"]:
-                filters["year"] = 2024  # Default to current year
-            break
-    
-    # Check for security level hints
-    security_words = ["confidential", "secret", "internal", "public", "restricted"]
-    for word in security_words:
-        if word in query_lower:
-            filters["security_level"] = word.title()
-            break
-    
-    print(f"🔍 Extracted filters from query '{query}': {filters}")
+async def _aretrieve_with_filters(query: str, department: str = None, doc_type: str = None,
+                                  security_level: str = None, project: str = None, year: int = None,
+                                  year_from: int = None, year_to: int = None):
+    """Retrieve information with metadata filtering.
+
+    Filter by department, doc_type, security_level, project, an exact year,
+    or a year range (year_from and/or year_to, inclusive).
+    """
+    start_time = time.time()
 
+    try:
+        filters = tool_args_to_filters(department, doc_type, security_level, project, year, year_from, year_to)
+        retrieved_docs, relaxation = await afiltered_retrieval(query, filters=filters, k=3,
+                                                               search_params=current_search_params())
+
+        if not retrieved_docs:
+            return "No relevant information found with the specified filters."
+
+        end_time = time.time()
+        print(f"🔍 Filtered retrieval took {end_time - start_time:.2f} seconds")
+
+        return with_relaxation_note(format_filtered_results(retrieved_docs), relaxation)
+
+    except Exception as e:
+        print(f"❌ Filtered retrieval error: {e}")
+        return "Error during filtered search. Please try again."
+
+retrieve_with_filters = StructuredTool.from_function(
+    func=_retrieve_with_filters,
+    coroutine=_aretrieve_with_filters,
+    name="retrieve_with_filters",
+)
+
+def extract_filters_from_query(query: str):
+    """Extract metadata filters from a user query (compiled single-pass matcher)."""
+    filters = extract_filters(query)
+    logger.debug(f"Extracted filters from query '{query}': {filters}")
     return filters
 
 def needs_retrieval(state):
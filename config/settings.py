@@ -15,4 +15,119 @@ DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 # Qdrant Configuration
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME")
\ No newline at end of file
+QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME")
+
+# Batch chat configuration
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# Conversation checkpointer: "memory" (single process) or "sqlite" (shared by all workers)
+CHECKPOINTER_BACKEND = os.getenv("CHECKPOINTER_BACKEND", "memory").lower()
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "data/checkpoints.sqlite")
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Build models and connections in the background at startup instead of on the first request
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "True").lower() == "true"
+
+# Embedding model: "torch" (sentence-transformers) or "onnx" (int8 ONNX Runtime, see app/services/onnx_embeddings.py)
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/paraphrase-MiniLM-L3-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "models/paraphrase-MiniLM-L3-v2-onnx")
+
+# Query embedding micro-batching
+EMBEDDING_BATCHING = os.getenv("EMBEDDING_BATCHING", "True").lower() == "true"
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "32"))
+EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+
+# Query embedding cache: in-memory LRU plus a memory-mapped on-disk tier shared by workers
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "True").lower() == "true"
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "data/embedding_cache")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_READ_ONLY = os.getenv("EMBEDDING_CACHE_READ_ONLY", "False").lower() == "true"
+
+# Vector store backend: "qdrant" or "numpy" (in-process index, see app/services/numpy_store.py)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "qdrant").lower()
+NUMPY_INDEX_DIR = os.getenv("NUMPY_INDEX_DIR", "data/numpy_index")
+NUMPY_INDEX_MMAP = os.getenv("NUMPY_INDEX_MMAP", "True").lower() == "true"
+
+# Ingest chunking (characters); retrieved chunks of one document are merged into one passage
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "800"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "150"))
+MERGE_CHUNKS_PER_PARENT = os.getenv("MERGE_CHUNKS_PER_PARENT", "True").lower() == "true"
+
+# Bulk ingestion pipeline (config/upload_to_qdrant.py)
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+INGEST_MAX_INFLIGHT_UPSERTS = int(os.getenv("INGEST_MAX_INFLIGHT_UPSERTS", "4"))
+INGEST_CHECKPOINT_DIR = os.getenv("INGEST_CHECKPOINT_DIR", "data/ingest_checkpoints")
+
+# Hybrid retrieval: BM25 keyword search fused with dense search (reciprocal rank fusion)
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "True").lower() == "true"
+BM25_INDEX_DIR = os.getenv("BM25_INDEX_DIR", "data/bm25_index")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Retrieval result cache (keyed by query, filters, k and collection)
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1000"))
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "300"))
+RETRIEVAL_CACHE_STAMP_PATH = os.getenv("RETRIEVAL_CACHE_STAMP_PATH", "data/.retrieval_cache_stamp")
+
+# Semantic answer cache: reuse answers for near-duplicate first-turn questions under the same filters
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "True").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+
+# Cross-encoder reranking of over-fetched candidates (see app/services/reranker.py)
+RERANK = os.getenv("RERANK", "False").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "12"))
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "2"))
+RERANK_MIN_CANDIDATES = int(os.getenv("RERANK_MIN_CANDIDATES", "4"))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+
+# Per-request latency budget; optional stages only spend what is left beyond the generation reserve
+REQUEST_LATENCY_BUDGET_MS = float(os.getenv("REQUEST_LATENCY_BUDGET_MS", "8000"))
+GENERATION_RESERVE_MS = float(os.getenv("GENERATION_RESERVE_MS", "3000"))
+
+# Filtered retrieval also searches progressively relaxed filter sets in the same round trip
+FILTER_RELAXATION = os.getenv("FILTER_RELAXATION", "True").lower() == "true"
+
+# Qdrant collection tuning, applied when a collection is created: HNSW graph, int8 scalar quantization, on-disk vectors
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "False").lower() == "true"
+QDRANT_QUANTIZATION_QUANTILE = float(os.getenv("QDRANT_QUANTIZATION_QUANTILE", "0.99"))
+QDRANT_ON_DISK_VECTORS = os.getenv("QDRANT_ON_DISK_VECTORS", "False").lower() == "true"
+
+# Qdrant search-time precision (per query overridable); 0 keeps the collection's default ef
+QDRANT_SEARCH_HNSW_EF = int(os.getenv("QDRANT_SEARCH_HNSW_EF", "0"))
+QDRANT_SEARCH_EXACT = os.getenv("QDRANT_SEARCH_EXACT", "False").lower() == "true"
+QDRANT_RESCORE = os.getenv("QDRANT_RESCORE", "True").lower() == "true"
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+
+# Agent graph mode: "tool_calling" (the LLM emits the retrieval call, then answers) or
+# "direct" (retrieval runs from the extracted filters, then a single generation call)
+AGENT_MODE = os.getenv("AGENT_MODE", "tool_calling")
+
+# Tool-calling mode: start the heuristic retrieval while the tool-calling LLM call runs (see app/services/speculation.py)
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "True").lower() == "true"
+SPECULATIVE_MATCH_THRESHOLD = float(os.getenv("SPECULATIVE_MATCH_THRESHOLD", "0.8"))
+
+# Token counting for prompt budgets (tiktoken encoding; estimated from length when unavailable)
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+
+# Conversation history sent to the LLM: the last turns verbatim within a token budget, older turns
+# folded into a rolling summary (down to HISTORY_KEEP_TURNS, so summarizing happens every few turns)
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "6"))
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "3"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "256"))
+
+# Generation context: retrieved passages of the current turn packed into a token budget, the
+# smaller of CONTEXT_TOKEN_BUDGET and what the model window leaves after the prompt and max_tokens
+LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "131072"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+
+# Single-flight: concurrent identical retrievals and generations share one in-flight call
+REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "True").lower() == "true"
\ No newline at end of file
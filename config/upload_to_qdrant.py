@@ -1,11 +1,17 @@
-import json
 import os
 from langchain_qdrant import QdrantVectorStore
-from langchain_core.documents import Document
-from app.services.llm import embeddings
-from config.settings import QDRANT_URL, QDRANT_API_KEY, QDRANT_COLLECTION_NAME
+from app.services.llm import get_embeddings, create_base_embeddings
+from app.services.cache import invalidate_retrieval_cache
+from app.services.chunking import chunk_document
+from app.services.ingestion import ingest_file, iter_json_records, iter_source_documents
+from app.services.payload_schema import ensure_payload_indexes
+from app.services.qdrant_store import apply_collection_config, collection_config
+from config.settings import (
+    QDRANT_URL, QDRANT_API_KEY, QDRANT_COLLECTION_NAME, VECTOR_STORE_BACKEND, NUMPY_INDEX_DIR, BM25_INDEX_DIR,
+    CHUNK_SIZE, CHUNK_OVERLAP, INGEST_EMBED_WORKERS, INGEST_BATCH_SIZE, INGEST_MAX_INFLIGHT_UPSERTS,
+    INGEST_CHECKPOINT_DIR, RETRIEVAL_CACHE_STAMP_PATH
+)
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,21 +33,23 @@ def get_qdrant_client():
 
 def load_documents_from_json(json_file_path):
     """Load documents from the generated JSON file"""
-    with open(json_file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    documents = []
-    for doc_data in data:
-        # Create LangChain Document objects
-        document = Document(
-            page_content=doc_data["content"],
-            metadata=doc_data["metadata"]
-        )
-        documents.append(document)
+    # Create LangChain Document objects (with the same doc_id as the Qdrant ingestion)
+    documents = list(iter_source_documents(iter_json_records(json_file_path)))
     
     print(f"📁 Loaded {len(documents)} documents from {json_file_path}")
     return documents
 
+def iter_chunks(json_file_path):
+    """Stream the corpus as sentence-aware, overlapping chunks, one source document at a time"""
+    for document in iter_source_documents(iter_json_records(json_file_path)):
+        yield from chunk_document(document, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+def prepare_documents(json_file_path):
+    """Load the corpus and split it into sentence-aware, overlapping chunks"""
+    chunks = list(iter_chunks(json_file_path))
+    print(f"✂️ Split {json_file_path} into {len(chunks)} chunks")
+    return chunks
+
 def create_qdrant_collection(client, collection_name, vector_size=384):
     """Create Qdrant collection if it doesn't exist"""
     try:
@@ -51,12 +59,14 @@ def create_qdrant_collection(client, collection_name, vector_size=384):
         
         if collection_name in collection_names:
             print(f"✅ Collection '{collection_name}' already exists")
+            # Bring HNSW, quantization and on-disk settings changed since creation up to date
+            apply_collection_config(client, collection_name)
             return False
         else:
-            # Create new collection
+            # Create new collection (HNSW, quantization and on-disk settings from config/settings.py)
             client.create_collection(
                 collection_name=collection_name,
-                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE)
+                **collection_config(vector_size)
             )
             print(f"✅ Created new collection: '{collection_name}'")
             return True
@@ -64,30 +74,40 @@ def create_qdrant_collection(client, collection_name, vector_size=384):
         print(f"❌ Error creating collection: {e}")
         raise
 
-def upload_documents_to_qdrant(documents, batch_size=50):
-    """Upload documents to Qdrant vector store"""
+def upload_documents_to_qdrant(json_file_path, embed_workers=INGEST_EMBED_WORKERS, batch_size=INGEST_BATCH_SIZE):
+    """Sync a JSON/JSONL file into Qdrant: only new or changed documents are chunked, embedded and upserted,
+    and documents removed from the file are deleted"""
     client = get_qdrant_client()
     
-    # Create collection (if needed)
+    # Create collection (if needed) and its payload indexes, before the points arrive
     create_qdrant_collection(client, QDRANT_COLLECTION_NAME)
+    ensure_payload_indexes(client, QDRANT_COLLECTION_NAME)
     
-    # Initialize Qdrant vector store
-    vector_store = QdrantVectorStore(
+    print(f"🔄 Uploading documents from {json_file_path} to Qdrant...")
+    stats = ingest_file(
+        json_file_path,
+        client,
+        QDRANT_COLLECTION_NAME,
+        create_base_embeddings,
+        checkpoint_dir=INGEST_CHECKPOINT_DIR,
+        embed_workers=embed_workers,
+        batch_size=batch_size,
+        max_inflight_upserts=INGEST_MAX_INFLIGHT_UPSERTS,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+    )
+    print(f"🎉 Successfully synced {stats['documents_read']} documents to Qdrant!")
+
+    if stats["documents_new"] or stats["documents_changed"] or stats["documents_removed"] or stats["points_deleted"]:
+        # Cached retrievals (in any running server) no longer reflect the collection
+        invalidate_retrieval_cache(QDRANT_COLLECTION_NAME)
+
+    # Vector store over the same collection, used for the test search
+    return QdrantVectorStore(
         client=client,
         collection_name=QDRANT_COLLECTION_NAME,
-        embedding=embeddings,
+        embedding=get_embeddings(),
     )
-    
-    print(f"🔄 Uploading {len(documents)} documents to Qdrant...")
-    
-    # Upload in batches to avoid memory issues
-    for i in range(0, len(documents), batch_size):
-        batch = documents[i:i + batch_size]
-        vector_store.add_documents(batch)
-        print(f"✅ Uploaded batch {i//batch_size + 1}/{(len(documents)-1)//batch_size + 1} - {len(batch)} documents")
-    
-    print(f"🎉 Successfully uploaded {len(documents)} documents to Qdrant!")
-    return vector_store
 
 def find_latest_json_file(data_folder="data"):
     """Find the most recent JSON file in data folder"""
@@ -102,6 +122,12 @@ def find_latest_json_file(data_folder="data"):
     latest_file = max(json_files, key=lambda f: os.path.getctime(os.path.join(data_folder, f)))
     return os.path.join(data_folder, latest_file)
 
+def stamp_mtime():
+    """Modification time of the invalidation stamp file (None if it does not exist)."""
+    if RETRIEVAL_CACHE_STAMP_PATH and os.path.exists(RETRIEVAL_CACHE_STAMP_PATH):
+        return os.path.getmtime(RETRIEVAL_CACHE_STAMP_PATH)
+    return None
+
 def main():
     """Main function to upload documents to Qdrant"""
     try:
@@ -109,11 +135,26 @@ def main():
         json_file_path = find_latest_json_file()
         print(f"📂 Using file: {json_file_path}")
         
-        # Load documents
-        documents = load_documents_from_json(json_file_path)
+        from app.services.bm25 import META_FILE as BM25_META_FILE, write_bm25_index
+        bm25_existed = os.path.exists(os.path.join(BM25_INDEX_DIR, BM25_META_FILE))
+        stamp_before = stamp_mtime()
+        
+        if VECTOR_STORE_BACKEND == "numpy":
+            # Rebuild the in-process index instead of uploading to Qdrant (it holds every vector anyway)
+            from app.services.numpy_store import build_numpy_index
+            vector_store = build_numpy_index(NUMPY_INDEX_DIR, get_embeddings(), prepare_documents(json_file_path))
+            invalidate_retrieval_cache(QDRANT_COLLECTION_NAME)
+        else:
+            # Stream the file into Qdrant
+            vector_store = upload_documents_to_qdrant(json_file_path)
         
-        # Upload to Qdrant
-        vector_store = upload_documents_to_qdrant(documents)
+        # Keyword index used next to the dense search (hybrid retrieval), built
+        # while streaming the file so memory holds only its postings. Written
+        # only once the dense index is in place, so a failed upload leaves both as they were
+        write_bm25_index(BM25_INDEX_DIR, iter_chunks(json_file_path))
+        if stamp_mtime() != stamp_before or not bm25_existed:
+            # Touch the stamp again so running servers reload the keyword index along with the dense one
+            invalidate_retrieval_cache(QDRANT_COLLECTION_NAME)
         
         # Test retrieval
         print("\n🧪 Testing retrieval...")
@@ -1,10 +1,21 @@
 from app.api.server import app
+from config.settings import CHECKPOINTER_BACKEND, WEB_CONCURRENCY
 import uvicorn
 import os
 
 def main():
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = WEB_CONCURRENCY
+
+    # In-process memory cannot be shared, so more workers would split conversations
+    if workers > 1 and CHECKPOINTER_BACKEND == "memory":
+        print("⚠️ WEB_CONCURRENCY > 1 requires CHECKPOINTER_BACKEND=sqlite; running a single worker")
+        workers = 1
+
+    if workers > 1:
+        uvicorn.run("app.api.server:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
 
 if __name__ == "__main__":
     main()